@@ -2,6 +2,8 @@
 ASGI config for epicevents_project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+The requests are resolved with asgi_urls.py, where the API views run concurrently in a thread pool. To serve it:
+    uvicorn epicevents_project.asgi:application --workers 4
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
@@ -9,8 +11,57 @@ https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIHandler, ASGIRequest
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'epicevents_project.settings')
 
-application = get_asgi_application()
+
+class APIASGIRequest(ASGIRequest):
+    urlconf = 'epicevents_project.asgi_urls'
+
+
+def read_parts(iterator, size):
+    """Return the next parts of `iterator` joined, at least `size` bytes unless at its end (then empty)."""
+    parts = []
+    length = 0
+    for part in iterator:
+        parts.append(part)
+        length += len(part)
+        if length >= size:
+            break
+    return b''.join(parts)
+
+
+class APIASGIHandler(ASGIHandler):
+    request_class = APIASGIRequest
+
+    async def send_response(self, response, send):
+        """As ASGIHandler, but a synchronous stream (e.g. an export, reading the database as it streams) is read in
+        the thread of the synchronous views, where Django 3.2 would iterate over it in the event loop.
+        """
+        if not response.streaming or getattr(response, 'is_async', False):
+            return await super(APIASGIHandler, self).send_response(response, send)
+
+        iterator = iter(response)
+        response.streaming_content = ()
+        read = sync_to_async(read_parts, thread_sensitive=True)
+
+        async def send_stream(message):
+            # Before the final closing message.
+            if message['type'] == 'http.response.body' and not message.get('more_body'):
+                while True:
+                    content = await read(iterator, self.chunk_size)
+                    if not content:
+                        break
+                    for chunk, last in self.chunk_bytes(content):
+                        await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send(message)
+
+        await super(APIASGIHandler, self).send_response(response, send_stream)
+
+
+# As get_asgi_application(), with the handler above.
+django.setup(set_prefix=False)
+application = APIASGIHandler()
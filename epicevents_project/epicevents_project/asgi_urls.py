@@ -0,0 +1,9 @@
+"""URL configuration of the ASGI application: the same url patterns as urls.py, with the API views running in a
+thread pool (see events/async_views.py).
+"""
+
+from events.async_views import wrap_urlpatterns
+
+from .urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = wrap_urlpatterns(sync_urlpatterns)
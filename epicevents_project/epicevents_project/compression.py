@@ -0,0 +1,140 @@
+"""Compression of the response bodies: brotli (if installed) or gzip, as accepted by the client.
+
+Only the bodies of at least COMPRESSION_MIN_SIZE bytes are compressed, and the streaming ones (exports) chunk by
+chunk, from a sync or an async iterator. CompressionMiddleware is sync and async (as Django's MiddlewareMixin), so that
+it does not make Django serve the ASGI requests one at a time.
+As Django's GZipMiddleware, it adds `Vary: Accept-Encoding` and turns the strong ETags into weak ones, still matched
+by the response cache (see events/response_cache.py).
+"""
+
+import asyncio
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Quality 5 is about as fast as gzip -6, and smaller (11, the default, is for static files).
+BROTLI_QUALITY = 5
+
+
+def get_min_size():
+    return getattr(settings, 'COMPRESSION_MIN_SIZE', 1024)
+
+
+def get_accepted_encodings(request):
+    """Return the codings of the Accept-Encoding header of `request`, without the refused ones (q=0)."""
+    encodings = set()
+    for item in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        coding, *params = [part.strip() for part in item.split(';')]
+        try:
+            refused = any(float(param[2:]) == 0 for param in params if param.startswith('q='))
+        except ValueError:
+            refused = False
+        if coding and not refused:
+            encodings.add(coding.lower())
+    return encodings
+
+
+def choose_encoding(request):
+    encodings = get_accepted_encodings(request)
+    if brotli is not None and 'br' in encodings:
+        return 'br'
+    if 'gzip' in encodings:
+        return 'gzip'
+    return None
+
+
+def gzip_compressor():
+    """Return the functions (compress a chunk, finish) of an incremental gzip compression, as compress_string()."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress, compressor.flush
+
+
+def brotli_compressor():
+    compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+    return compressor.process, compressor.finish
+
+
+# encoding: (compression of a body, incremental compression of a stream)
+COMPRESSORS = {
+    'br': (lambda content: brotli.compress(content, quality=BROTLI_QUALITY), brotli_compressor),
+    'gzip': (compress_string, gzip_compressor),
+}
+
+
+def compress_stream(compressor, sequence):
+    compress, finish = compressor()
+    for item in sequence:
+        data = compress(item)
+        if data:
+            yield data
+    yield finish()
+
+
+async def acompress_stream(compressor, sequence):
+    compress, finish = compressor()
+    async for item in sequence:
+        data = compress(item)
+        if data:
+            yield data
+    yield finish()
+
+
+class CompressionMiddleware:
+    """Compress the large responses with the best encoding accepted by the client."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(self.get_response):
+            # Mark the instance as a coroutine function, for Django to await it.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.process_response(request, await self.get_response(request))
+
+    def process_response(self, request, response):
+        if response.has_header('Content-Encoding') or response.status_code in (204, 304):
+            return response
+        if not response.streaming and len(response.content) < get_min_size():
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = choose_encoding(request)
+        if encoding is None:
+            return response
+        compress, compressor = COMPRESSORS[encoding]
+
+        if response.streaming:
+            # The compressed size is not known before the end of the stream. The content is not read here: the
+            # compression runs as the server iterates over it, asynchronously for an async iterator (Django 4.2+).
+            if getattr(response, 'is_async', False):
+                response.streaming_content = acompress_stream(compressor, response.streaming_content)
+            else:
+                response.streaming_content = compress_stream(compressor, response.streaming_content)
+            del response.headers['Content-Length']
+        else:
+            content = compress(response.content)
+            if len(content) >= len(response.content):
+                return response
+            response.content = content
+            response.headers['Content-Length'] = str(len(content))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
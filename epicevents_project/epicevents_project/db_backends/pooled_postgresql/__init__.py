@@ -0,0 +1 @@
+"""PostgreSQL backend taking its connections from a per-process pool (see pool.py)."""
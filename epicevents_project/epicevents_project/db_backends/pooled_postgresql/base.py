@@ -0,0 +1,49 @@
+"""PostgreSQL database backend whose connections come from a pool (see pool.py). Usage in settings.py:
+
+    DATABASES = {
+        'default': {
+            'ENGINE': 'epicevents_project.db_backends.pooled_postgresql',
+            ...
+            'POOL': {'MIN_SIZE': 2, 'MAX_SIZE': 20, 'TIMEOUT': 10, 'HEALTH_CHECK_INTERVAL': 30},
+        }
+    }
+
+CONN_MAX_AGE should stay 0: closing a connection gives it back to the pool.
+"""
+
+import psycopg2.extras
+from django.db.backends.postgresql import base
+
+from .creation import DatabaseCreation
+from .pool import get_pool
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    def __init__(self, *args, **kwargs):
+        super(DatabaseWrapper, self).__init__(*args, **kwargs)
+        self.pool = None
+
+    def get_new_connection(self, conn_params):
+        """As the postgresql backend, with a connection from the pool instead of a new one."""
+        self.pool = get_pool(self.alias, conn_params, self.settings_dict.get('POOL', {}))
+        connection = self.pool.getconn()
+
+        options = self.settings_dict['OPTIONS']
+        try:
+            self.isolation_level = options['isolation_level']
+        except KeyError:
+            self.isolation_level = connection.isolation_level
+        else:
+            if self.isolation_level != connection.isolation_level:
+                connection.set_session(isolation_level=self.isolation_level)
+        psycopg2.extras.register_default_jsonb(conn_or_curs=connection, loads=lambda x: x)
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                # Closed inside an atomic block, Django keeps its reference to the connection: it must not be used
+                # by another thread.
+                self.pool.putconn(self.connection, close=self.in_atomic_block)
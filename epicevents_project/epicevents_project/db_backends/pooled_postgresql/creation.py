@@ -0,0 +1,11 @@
+from django.db.backends.postgresql import creation
+
+from .pool import close_pools
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # The idle connections of the pool would prevent DROP DATABASE.
+        close_pools(database=test_database_name)
+        super(DatabaseCreation, self)._destroy_test_db(test_database_name, verbosity)
@@ -0,0 +1,173 @@
+"""Pools of PostgreSQL connections, one per worker process and per database.
+
+A Django connection takes a connection from the pool when it connects and gives it back when it closes (at the end
+of each request with CONN_MAX_AGE = 0), instead of opening a new TCP connection, authenticating and starting a server
+backend each time. Settings, in the "POOL" entry of the database settings:
+- MIN_SIZE: connections opened when the pool is created and kept open,
+- MAX_SIZE: maximum number of connections in use at once; a thread asking for more waits,
+- TIMEOUT: seconds to wait for a connection before raising OperationalError,
+- HEALTH_CHECK_INTERVAL: a connection idle for more than these seconds is checked (SELECT 1) before being used,
+  None to never check. The closed and broken connections are always replaced.
+"""
+
+import os
+import threading
+import time
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import ThreadedConnectionPool
+
+DEFAULT_POOL_SETTINGS = {
+    'MIN_SIZE': 1,
+    'MAX_SIZE': 20,
+    'TIMEOUT': 10,
+    'HEALTH_CHECK_INTERVAL': 30,
+}
+
+pools = {}
+pools_lock = threading.Lock()
+
+
+class ConnectionPool:
+    """A ThreadedConnectionPool bounded by a semaphore (waiting instead of failing when exhausted), with health
+    checks and statistics.
+    """
+
+    def __init__(self, alias, conn_params, min_size, max_size, timeout, health_check_interval):
+        self.alias = alias
+        self.database = conn_params.get('database')
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self._pool = ThreadedConnectionPool(min_size, max_size, **conn_params)
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        # Last time each connection was given back, by id(): the connections not in it were never used.
+        self._last_used = {}
+        self.stats = {
+            'checkouts': 0,
+            'connections_opened': 0,
+            'health_checks': 0,
+            'connections_discarded': 0,
+            'timeouts': 0,
+            'wait_seconds': 0.0,
+        }
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.stats[name] += value
+
+    def getconn(self):
+        start = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            self.count('timeouts')
+            raise psycopg2.OperationalError(
+                f'No connection available in the pool of "{self.alias}" after {self.timeout} seconds'
+            )
+        self.count('wait_seconds', time.monotonic() - start)
+
+        try:
+            while True:
+                connection = self._pool.getconn()
+                if self.is_usable(connection):
+                    break
+                self.count('connections_discarded')
+                self._pool.putconn(connection, close=True)
+        except Exception:
+            self._slots.release()
+            raise
+
+        self.count('checkouts')
+        return connection
+
+    def is_usable(self, connection):
+        if connection.closed:
+            return False
+
+        with self._lock:
+            last_used = self._last_used.get(id(connection))
+        if last_used is None:
+            self.count('connections_opened')
+            return True
+
+        if self.health_check_interval is not None and time.monotonic() - last_used >= self.health_check_interval:
+            self.count('health_checks')
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+                if not connection.autocommit:
+                    connection.rollback()
+            except psycopg2.Error:
+                return False
+        return True
+
+    def putconn(self, connection, close=False):
+        """Give back a connection, rolled back if it is in a transaction, closed if its state is unknown."""
+        try:
+            if not close and not connection.closed:
+                status = connection.info.transaction_status
+                if status in (extensions.TRANSACTION_STATUS_INTRANS, extensions.TRANSACTION_STATUS_INERROR):
+                    connection.rollback()
+                elif status != extensions.TRANSACTION_STATUS_IDLE:
+                    close = True
+        except psycopg2.Error:
+            close = True
+
+        close = close or bool(connection.closed)
+        with self._lock:
+            if close:
+                self._last_used.pop(id(connection), None)
+            else:
+                self._last_used[id(connection)] = time.monotonic()
+        if close:
+            self.count('connections_discarded')
+        try:
+            self._pool.putconn(connection, close=close)
+        finally:
+            self._slots.release()
+
+    def closeall(self):
+        self._pool.closeall()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        # ThreadedConnectionPool keeps the idle connections in _pool and the connections in use in _used.
+        stats.update({
+            'alias': self.alias,
+            'pid': os.getpid(),
+            'idle': len(self._pool._pool),
+            'in_use': len(self._pool._used),
+        })
+        return stats
+
+
+def get_pool(alias, conn_params, pool_settings):
+    """Return the pool of this process for these connection parameters, created on first use."""
+    # Pools are not shared with forked worker processes: a child gets its own.
+    key = (os.getpid(), alias, repr(sorted(conn_params.items())))
+    with pools_lock:
+        pool = pools.get(key)
+        if pool is None:
+            options = {**DEFAULT_POOL_SETTINGS, **pool_settings}
+            pool = pools[key] = ConnectionPool(
+                alias, conn_params, options['MIN_SIZE'], options['MAX_SIZE'], options['TIMEOUT'],
+                options['HEALTH_CHECK_INTERVAL'],
+            )
+        return pool
+
+
+def get_pool_stats():
+    """Return the statistics of the pools of this process."""
+    pid = os.getpid()
+    with pools_lock:
+        return [pool.get_stats() for key, pool in pools.items() if key[0] == pid]
+
+
+def close_pools(database=None):
+    """Close all the connections of the pools of this process (to `database` only, if given)."""
+    with pools_lock:
+        for key, pool in list(pools.items()):
+            if database is None or pool.database == database:
+                pool.closeall()
+                del pools[key]
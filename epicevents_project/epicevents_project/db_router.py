@@ -0,0 +1,158 @@
+"""Routing of the reads to the replica databases.
+
+ReplicaRoutingMiddleware marks the requests with a safe method (GET, HEAD, OPTIONS: the lists, filters, exports and
+the admin changelists) and ReplicaRouter sends their reads to one of the DATABASE_REPLICAS aliases. All the other
+queries go to the primary ("default"):
+- the writes, and the reads of the requests with another method,
+- the reads done before the user of the request is known (e.g. the authentication itself),
+- the reads of a user during REPLICA_PIN_SECONDS after one of their writes, so that they read their own writes even
+  if the replicas are late. The pins are kept in the Django cache, shared by the worker processes if it is Redis.
+"""
+
+import asyncio
+import contextvars
+import random
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.functional import SimpleLazyObject, empty
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PIN_CACHE_PREFIX = 'replica_pin'
+
+# The request being served, when its reads may go to a replica.
+replica_request = contextvars.ContextVar('replica_request', default=None)
+
+
+def get_replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def get_pin_seconds():
+    return getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+
+
+def get_request_user(request):
+    """The authenticated user of the request if already known, without loading it (nor the session)."""
+    user = request.__dict__.get('user')
+    if isinstance(user, SimpleLazyObject):
+        # Set by AuthenticationMiddleware, not evaluated yet (DRF replaces it once the token is checked).
+        user = None if user._wrapped is empty else user._wrapped
+    if user is None or not user.is_authenticated:
+        return None
+    return user
+
+
+def pin_to_primary(user):
+    """Send the reads of `user` to the primary for the next REPLICA_PIN_SECONDS."""
+    cache.set(f'{PIN_CACHE_PREFIX}:{user.pk}', True, get_pin_seconds())
+
+
+def is_pinned(request, user):
+    """Memoized on the request: the answer does not change while it is served."""
+    pinned = getattr(request, '_replica_pinned', None)
+    if pinned is None:
+        pinned = request._replica_pinned = bool(cache.get(f'{PIN_CACHE_PREFIX}:{user.pk}'))
+    return pinned
+
+
+def use_replica():
+    """Return True if the reads of the current request can go to a replica."""
+    request = replica_request.get()
+    if request is None or not get_replicas():
+        return False
+    user = get_request_user(request)
+    return user is not None and not is_pinned(request, user)
+
+
+class ReplicaRouter:
+    """Send the reads to a replica when use_replica() allows it, everything else to the primary."""
+
+    def db_for_read(self, model, **hints):
+        if use_replica():
+            return random.choice(get_replicas())
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replicas hold the same data as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replicas get the schema by replication.
+        return db not in get_replicas()
+
+
+class ReplicaRoutingMiddleware:
+    """Let the reads of the safe requests go to the replicas, and pin the users who write to the primary.
+
+    Sync and async, as Django's MiddlewareMixin: under ASGI, a sync-only middleware would make Django run all the
+    requests one at a time in a single thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(self.get_response):
+            # Mark the instance as a coroutine function, for Django to await it.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        safe = request.method in SAFE_METHODS
+        token = replica_request.set(request if safe else None)
+        try:
+            response = self.get_response(request)
+        finally:
+            replica_request.reset(token)
+
+        user = self.get_user_to_pin(request, response)
+        if user is not None:
+            pin_to_primary(user)
+        return response
+
+    async def __acall__(self, request):
+        safe = request.method in SAFE_METHODS
+        token = replica_request.set(request if safe else None)
+        try:
+            response = await self.get_response(request)
+        finally:
+            replica_request.reset(token)
+
+        user = self.get_user_to_pin(request, response)
+        if user is not None:
+            # The cache may be Redis: not in the event loop.
+            await sync_to_async(pin_to_primary, thread_sensitive=False)(user)
+        return response
+
+    def get_user_to_pin(self, request, response):
+        if request.method in SAFE_METHODS or response.status_code >= 400:
+            return None
+        return get_request_user(request)
+
+
+def get_replica_lag(alias):
+    """Return the replication lag of a PostgreSQL replica in seconds (0 if the database is not a replica), None if
+    it cannot be measured.
+    """
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT CASE WHEN pg_is_in_recovery() '
+            'THEN COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) ELSE 0 END'
+        )
+        return float(cursor.fetchone()[0])
+
+
+def get_replicas_lag():
+    """Return {alias: lag in seconds or None} for all the replicas."""
+    return {alias: get_replica_lag(alias) for alias in get_replicas()}
@@ -0,0 +1,364 @@
+"""Measure the requests in process and export the measures in the Prometheus text format at /metrics/.
+
+InstrumentationMiddleware times every request, by route (the name of its url pattern, e.g. "clients-list" or
+"users:login"). A sample of the requests is also measured in detail: number and time of the SQL queries, time spent in
+the serializers and in the permission checks. The sample is adaptive: each route gets up to
+INSTRUMENTATION_SAMPLES_PER_SECOND detailed measures per second and per process, so the rare routes are always
+measured and the cost stays bounded on the busy ones.
+
+The measures are kept in memory by each worker process: Prometheus scrapes each of them, or a single process with
+`python manage.py runserver`. `/metrics/?format=json` gives a summary per route for a quick look.
+"""
+
+import asyncio
+import contextvars
+import functools
+import hmac
+import json
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+
+from .db_backends.pooled_postgresql.pool import get_pool_stats
+from .db_router import get_replicas_lag
+
+# Upper bounds of the latency histogram buckets, in seconds.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+TIMED_KINDS = ('serializer', 'permission')
+LOCAL_ADDRESSES = ('127.0.0.1', '::1')
+
+# Measures of the request being served.
+current_metrics = contextvars.ContextVar('current_metrics', default=None)
+
+
+class RequestMetrics:
+    """Detailed measures of one request, filled only if it is sampled."""
+
+    __slots__ = ('sampled', 'queries', 'query_time', 'timings', 'running')
+
+    def __init__(self):
+        self.sampled = False
+        self.queries = 0
+        self.query_time = 0.0
+        self.timings = dict.fromkeys(TIMED_KINDS, 0.0)
+        # Kinds being timed, so that the nested calls (e.g. nested serializers) are counted once.
+        self.running = set()
+
+
+def timed(kind):
+    """Decorator adding the time of the calls to the `kind` timing of the sampled requests."""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            metrics = current_metrics.get()
+            if metrics is None or not metrics.sampled or kind in metrics.running:
+                return func(*args, **kwargs)
+            metrics.running.add(kind)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                metrics.timings[kind] += time.perf_counter() - start
+                metrics.running.discard(kind)
+
+        return wrapper
+
+    return decorator
+
+
+def query_wrapper(execute, sql, params, many, context):
+    """Execute wrapper (see connection.execute_wrapper) counting the queries of the sampled requests."""
+    metrics = current_metrics.get()
+    if metrics is None or not metrics.sampled:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.query_time += time.perf_counter() - start
+
+
+def install_query_wrapper(connection):
+    if query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_wrapper)
+
+
+def on_connection_created(sender, connection, **kwargs):
+    # The connections are per thread: the views run in other threads under ASGI (see events/async_views.py).
+    install_query_wrapper(connection)
+
+
+connection_created.connect(on_connection_created, dispatch_uid='instrumentation_query_wrapper')
+
+
+class InstrumentedViewMixin:
+    """Time the permission checks of an API view."""
+
+    @timed('permission')
+    def check_permissions(self, request):
+        super(InstrumentedViewMixin, self).check_permissions(request)
+
+    @timed('permission')
+    def check_object_permissions(self, request, obj):
+        super(InstrumentedViewMixin, self).check_object_permissions(request, obj)
+
+
+class InstrumentedSerializerMixin:
+    """Time the validation and the representation of a serializer."""
+
+    @timed('serializer')
+    def run_validation(self, *args, **kwargs):
+        return super(InstrumentedSerializerMixin, self).run_validation(*args, **kwargs)
+
+    @timed('serializer')
+    def to_representation(self, instance):
+        return super(InstrumentedSerializerMixin, self).to_representation(instance)
+
+
+class AdaptiveSampler:
+    """A token bucket per route: up to `rate` sampled requests per second, `burst` at once."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = max(1, rate) if burst is None else burst
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def sample(self, key):
+        now = time.monotonic()
+        with self.lock:
+            tokens, last = self.buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            sampled = tokens >= 1
+            self.buckets[key] = (tokens - 1 if sampled else tokens, now)
+        return sampled
+
+
+class MetricsRegistry:
+    """The measures of this process: counters, latency histograms and sums of the detailed measures, by route."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = defaultdict(int)
+            # route: [count of each bucket (not cumulative) and of +Inf, sum of the durations]
+            self.latency = {}
+            # route: sums of the detailed measures of the sampled requests
+            self.sampled = {}
+
+    def observe(self, route, method, status, duration, metrics=None):
+        index = next((i for i, bound in enumerate(self.buckets) if duration <= bound), len(self.buckets))
+        with self.lock:
+            self.requests[route, method, status] += 1
+            histogram = self.latency.setdefault(route, [0] * (len(self.buckets) + 1) + [0.0])
+            histogram[index] += 1
+            histogram[-1] += duration
+            if metrics is not None and metrics.sampled:
+                sums = self.sampled.setdefault(route, defaultdict(float))
+                sums['count'] += 1
+                sums['queries'] += metrics.queries
+                sums['query_time'] += metrics.query_time
+                for kind, value in metrics.timings.items():
+                    sums[kind] += value
+
+    def snapshot(self):
+        with self.lock:
+            return (
+                dict(self.requests),
+                {route: list(histogram) for route, histogram in self.latency.items()},
+                {route: dict(sums) for route, sums in self.sampled.items()},
+            )
+
+    def quantile(self, histogram, q):
+        """Upper bound of the bucket holding the `q` quantile, None if above the last bucket."""
+        counts = histogram[:-2]
+        rank = q * sum(histogram[:-1])
+        cumulative = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            if count and cumulative >= rank:
+                return bound
+        return None
+
+
+registry = MetricsRegistry()
+sampler = AdaptiveSampler(getattr(settings, 'INSTRUMENTATION_SAMPLES_PER_SECOND', 10))
+
+
+class InstrumentationMiddleware:
+    """Time the requests and measure a sample of them in detail. To be put first in MIDDLEWARE.
+
+    Sync and async as Django's MiddlewareMixin, for the ASGI requests to be served concurrently.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(self.get_response):
+            # Mark the instance as a coroutine function, for Django to await it.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        metrics = request._metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        self.observe(request, response, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        metrics = request._metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        self.observe(request, response, time.perf_counter() - start)
+        return response
+
+    def observe(self, request, response, duration):
+        # A streaming response (e.g. an export) is timed until its first byte.
+        match = request.resolver_match
+        route = match.view_name if match is not None else 'unmatched'
+        registry.observe(route, request.method, response.status_code, duration, request._metrics)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # The route is known from here on.
+        if sampler.sample(request.resolver_match.view_name):
+            for connection in connections.all():
+                install_query_wrapper(connection)
+            request._metrics.sampled = True
+
+
+def format_labels(**labels):
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def get_database_gauges():
+    """Return the lines of the connection pool and replication lag gauges."""
+    lines = [
+        '# HELP epicevents_db_pool_connections Connections of the pools of this process.',
+        '# TYPE epicevents_db_pool_connections gauge',
+    ]
+    for stats in get_pool_stats():
+        for state in ('idle', 'in_use'):
+            lines.append(
+                f'epicevents_db_pool_connections{format_labels(alias=stats["alias"], state=state)} {stats[state]}'
+            )
+    lines += [
+        '# HELP epicevents_db_replica_lag_seconds Replication lag of the read replicas.',
+        '# TYPE epicevents_db_replica_lag_seconds gauge',
+    ]
+    try:
+        lags = get_replicas_lag()
+    except DatabaseError:
+        lags = {}
+    for alias, lag in lags.items():
+        if lag is not None:
+            lines.append(f'epicevents_db_replica_lag_seconds{format_labels(alias=alias)} {lag}')
+    return lines
+
+
+def render_prometheus():
+    """Return all the measures in the Prometheus text exposition format."""
+    requests, latency, sampled = registry.snapshot()
+    lines = [
+        '# HELP epicevents_http_requests_total Requests served.',
+        '# TYPE epicevents_http_requests_total counter',
+    ]
+    for (route, method, status), count in sorted(requests.items()):
+        labels = format_labels(route=route, method=method, status=status)
+        lines.append(f'epicevents_http_requests_total{labels} {count}')
+
+    lines += [
+        '# HELP epicevents_http_request_duration_seconds Time to serve the requests.',
+        '# TYPE epicevents_http_request_duration_seconds histogram',
+    ]
+    for route, histogram in sorted(latency.items()):
+        cumulative = 0
+        for bound, count in zip(registry.buckets + ('+Inf',), histogram[:-1]):
+            cumulative += count
+            labels = format_labels(route=route, le=bound)
+            lines.append(f'epicevents_http_request_duration_seconds_bucket{labels} {cumulative}')
+        lines.append(f'epicevents_http_request_duration_seconds_sum{format_labels(route=route)} {histogram[-1]}')
+        lines.append(f'epicevents_http_request_duration_seconds_count{format_labels(route=route)} {cumulative}')
+
+    summaries = (
+        ('epicevents_db_queries', 'queries', 'SQL queries per request (sampled requests).'),
+        ('epicevents_db_query_duration_seconds', 'query_time', 'Time in the SQL queries (sampled requests).'),
+        ('epicevents_serializer_duration_seconds', 'serializer', 'Time in the serializers (sampled requests).'),
+        ('epicevents_permission_duration_seconds', 'permission', 'Time in the permission checks (sampled requests).'),
+    )
+    for name, key, description in summaries:
+        lines += [f'# HELP {name} {description}', f'# TYPE {name} summary']
+        for route, sums in sorted(sampled.items()):
+            lines.append(f'{name}_sum{format_labels(route=route)} {sums[key]}')
+            lines.append(f'{name}_count{format_labels(route=route)} {int(sums["count"])}')
+
+    lines += get_database_gauges()
+    return '\n'.join(lines) + '\n'
+
+
+def to_ms(seconds):
+    return None if seconds is None else seconds * 1000
+
+
+def summarize():
+    """Return a summary per route: requests, latency quantiles and means of the detailed measures in ms."""
+    requests, latency, sampled = registry.snapshot()
+    summary = {}
+    for route, histogram in sorted(latency.items()):
+        count = sum(histogram[:-1])
+        sums = sampled.get(route)
+        summary[route] = {
+            'requests': count,
+            'errors': sum(n for (r, _, status), n in requests.items() if r == route and status >= 500),
+            'mean_ms': histogram[-1] / count * 1000,
+            **{f'p{int(q * 100)}_ms_at_most': to_ms(registry.quantile(histogram, q)) for q in (0.5, 0.95, 0.99)},
+            'sampled': int(sums['count']) if sums else 0,
+        }
+        if sums:
+            summary[route].update({
+                'mean_queries': sums['queries'] / sums['count'],
+                'mean_query_ms': sums['query_time'] / sums['count'] * 1000,
+                **{f'mean_{kind}_ms': sums[kind] / sums['count'] * 1000 for kind in TIMED_KINDS},
+            })
+    return summary
+
+
+def is_metrics_request_allowed(request):
+    """With METRICS_TOKEN set, the scraper sends `Authorization: Bearer <token>`; without, only local requests."""
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token:
+        return hmac.compare_digest(request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}')
+    return request.META.get('REMOTE_ADDR') in LOCAL_ADDRESSES
+
+
+def metrics_view(request):
+    if not is_metrics_request_allowed(request):
+        return HttpResponseForbidden()
+    if request.GET.get('format') == 'json':
+        return HttpResponse(json.dumps(summarize(), indent=2), content_type='application/json')
+    return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
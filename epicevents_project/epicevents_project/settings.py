@@ -7,6 +7,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
+import importlib.util
+import os
 from pathlib import Path
 from datetime import timedelta
 import sentry_sdk
@@ -16,10 +18,9 @@ sentry_sdk.init(
     dsn="https://4df3825b219046d0aba9b56f89f232b5@o949854.ingest.sentry.io/5898555",
     integrations=[DjangoIntegration()],
 
-    # Set traces_sample_rate to 1.0 to capture 100%
-    # of transactions for performance monitoring.
-    # We recommend adjusting this value in production.
-    traces_sample_rate=1.0,
+    # Share of the transactions traced for performance monitoring. The latency and the queries of every route are
+    # measured in process anyway (see instrumentation.py and /metrics/).
+    traces_sample_rate=float(os.environ.get('SENTRY_TRACES_SAMPLE_RATE', 0.01)),
 
     # If you wish to associate users to errors (assuming you are using
     # django.contrib.auth) you may enable sending PII data.
@@ -61,22 +62,35 @@ INSTALLED_APPS = [
     'rest_framework.authtoken',
     'drf_yasg',
     'rest_framework_simplejwt',
+    'rest_framework_simplejwt.token_blacklist',
     'users',
     'events',
 ]
 
 MIDDLEWARE = [
+    'epicevents_project.instrumentation.InstrumentationMiddleware',
+    'epicevents_project.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'epicevents_project.db_router.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
 ROOT_URLCONF = 'epicevents_project.urls'
 
+# Bodies from this size (in bytes) are compressed with brotli (if installed) or gzip (see compression.py).
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+
+# Detailed measures (queries, serializers, permissions) of at most this many requests per second, per route and per
+# process (see instrumentation.py). /metrics/ requires `Authorization: Bearer <METRICS_TOKEN>` if set, else it is only
+# served to local requests.
+INSTRUMENTATION_SAMPLES_PER_SECOND = int(os.environ.get('INSTRUMENTATION_SAMPLES_PER_SECOND', 10))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -95,6 +109,10 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'epicevents_project.wsgi.application'
 
+# Number of threads running the API views under ASGI, so at most this many database connections per worker process
+# (see events/async_views.py).
+ASYNC_DB_WORKERS = int(os.environ.get('ASYNC_DB_WORKERS', 16))
+
 
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
@@ -109,6 +127,43 @@ DATABASES = {
         'PORT': '5432',
     }
 }
+# With DATABASE_POOL=on, the connections are taken from a pool of each worker process (see
+# db_backends/pooled_postgresql).
+if os.environ.get('DATABASE_POOL') == 'on':
+    DATABASES['default']['ENGINE'] = 'epicevents_project.db_backends.pooled_postgresql'
+    DATABASES['default']['POOL'] = {
+        'MIN_SIZE': int(os.environ.get('DATABASE_POOL_MIN_SIZE', 2)),
+        'MAX_SIZE': int(os.environ.get('DATABASE_POOL_MAX_SIZE', 20)),
+        'TIMEOUT': 10,
+        'HEALTH_CHECK_INTERVAL': 30,
+    }
+
+# Read replicas (comma separated hosts, e.g. DATABASE_REPLICA_HOSTS=10.0.0.2,10.0.0.3): the reads of the safe requests
+# go to them, see db_router.py. In the tests, a replica is the same database as the primary.
+DATABASE_REPLICAS = []
+for index, host in enumerate(filter(None, os.environ.get('DATABASE_REPLICA_HOSTS', '').split(',')), start=1):
+    DATABASES[f'replica_{index}'] = {**DATABASES['default'], 'HOST': host.strip(), 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(f'replica_{index}')
+DATABASE_ROUTERS = ['epicevents_project.db_router.ReplicaRouter']
+# Reads of a user sent to the primary after he writes, longer than the usual replication lag.
+REPLICA_PIN_SECONDS = 5
+
+# Cache of the API responses (see events/response_cache.py) and of the stats: local memory by default. Set REDIS_URL
+# (with the django-redis package installed) to share it between the worker processes.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -128,6 +183,32 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Argon2 with tuned parameters is preferred when argon2-cffi is installed: the existing PBKDF2 hashes are upgraded at
+# the next login of each user (see users/hashers.py).
+if importlib.util.find_spec('argon2') is not None:
+    PASSWORD_HASHERS = [
+        'users.hashers.TunedArgon2PasswordHasher',
+        'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+        'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+        'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    ]
+    # The OWASP minimum (19 MiB, 2 iterations, 1 lane): cheaper than PBKDF2 with 260000 iterations, and memory-hard.
+    ARGON2_TIME_COST = int(os.environ.get('ARGON2_TIME_COST', 2))
+    ARGON2_MEMORY_COST = int(os.environ.get('ARGON2_MEMORY_COST', 19 * 1024))
+    ARGON2_PARALLELISM = int(os.environ.get('ARGON2_PARALLELISM', 1))
+
+# Change feeds of the contracts and events (see events/changes.py): how far behind now they stop, in seconds, and how
+# long the tombstones of the deleted objects are kept (python manage.py prune_tombstones).
+CHANGE_FEED_DELAY = 5
+CHANGE_FEED_RETENTION_DAYS = 30
+
+# The counts of the lists (?with_count=true) and of the admin changelists are exact up to this number of rows, and
+# estimated by PostgreSQL above (see events/counts.py).
+COUNT_EXACT_THRESHOLD = int(os.environ.get('COUNT_EXACT_THRESHOLD', 10000))
+
+# The last login dates are written in bulk every LAST_LOGIN_FLUSH_INTERVAL seconds (see users/last_login.py).
+LAST_LOGIN_FLUSH_INTERVAL = 30
+
 # Internationalization
 # https://docs.djangoproject.com/en/3.2/topics/i18n/
 
@@ -154,14 +235,24 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_USE_JWT = True
 ACCOUNT_LOGOUT_ON_GET = True
+# JSON encoded with orjson and MessagePack (`Accept: application/msgpack`) when installed (see renderers.py).
+API_RENDERER_CLASSES = [
+    'epicevents_project.renderers.ORJSONRenderer' if importlib.util.find_spec('orjson') is not None
+    else 'rest_framework.renderers.JSONRenderer',
+]
+if importlib.util.find_spec('msgpack') is not None:
+    API_RENDERER_CLASSES.append('epicevents_project.renderers.MessagePackRenderer')
+API_RENDERER_CLASSES.append('rest_framework.renderers.BrowsableAPIRenderer')
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.RoleJWTAuthentication',
     ),
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
+    'DEFAULT_RENDERER_CLASSES': API_RENDERER_CLASSES,
 }
 
 
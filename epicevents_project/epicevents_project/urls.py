@@ -15,6 +15,8 @@ from rest_framework_simplejwt import views as jwt_views
 
 from drf_yasg import openapi
 
+from .instrumentation import metrics_view
+
 schema_view = get_schema_view(
     openapi.Info(
         title="Snippets API",
@@ -44,6 +46,7 @@ urlpatterns = [
     ),
     path("redoc/", schema_view.with_ui("redoc", cache_timeout=0), name="schema-redoc"),
 
+    path('metrics/', metrics_view, name='metrics'),
     path('admin/', admin.site.urls),
     path('', include('users.urls')),
     path('', include('events.urls')),
@@ -0,0 +1,225 @@
+"""Maintain the access index: which users are related to which clients, contracts and events, and how.
+
+- client: its main sales contact, the sales contacts of its contracts and the support contacts of its events,
+- contract: its sales contact and the main sales contact of its client,
+- event: its support contact, the sales contact of its contract and the main sales contact of its client.
+
+A seller or a supporter can see an object if he has at least one row for it, so the visibility querysets are a
+single semi-join on the index. The rows of an object are rebuilt (see signals.py) each time a contact of the object or
+of its parents changes, and all the index can be rebuilt with the "rebuild_access_index" management command, a batch
+of objects at a time.
+
+For the change feeds of the contracts and events (see changes.py), the accesses lost when the rows are rebuilt or
+removed are logged as tombstones, and the objects that become visible to a new user get a new date_updated.
+"""
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import (
+    AccessIndex,
+    Client,
+    Contract,
+    Event,
+    Tombstone
+)
+
+CLIENT = AccessIndex.ObjectType.CLIENT
+CONTRACT = AccessIndex.ObjectType.CONTRACT
+EVENT = AccessIndex.ObjectType.EVENT
+MAIN_SALES_CONTACT = AccessIndex.Relation.MAIN_SALES_CONTACT
+SALES_CONTACT = AccessIndex.Relation.SALES_CONTACT
+SUPPORT_CONTACT = AccessIndex.Relation.SUPPORT_CONTACT
+
+# Models having a change feed, by object type.
+FEED_MODELS = {CONTRACT: Contract, EVENT: Event}
+
+
+def accessible_ids(user, object_type):
+    """Subquery of the ids of the objects of `object_type` related to `user`."""
+    return AccessIndex.objects.filter(user_id=user.pk, object_type=object_type).values('object_id')
+
+
+def get_client_rows(**filters):
+    """Return the rows (user_id, object_type, object_id, relation) of the clients matching `filters`."""
+    clients = Client.objects.filter(**filters)
+    contracts = Contract.objects.filter(**{'client__' + lookup: value for lookup, value in filters.items()})
+    events = Event.objects.filter(**{'contract__client__' + lookup: value for lookup, value in filters.items()})
+
+    rows = set()
+    for client_id, user_id in clients.values_list('id', 'main_sales_contact_id'):
+        rows.add((user_id, CLIENT, client_id, MAIN_SALES_CONTACT))
+    for client_id, user_id in contracts.values_list('client_id', 'sales_contact_id'):
+        rows.add((user_id, CLIENT, client_id, SALES_CONTACT))
+    for client_id, user_id in events.values_list('contract__client_id', 'support_contact_id'):
+        rows.add((user_id, CLIENT, client_id, SUPPORT_CONTACT))
+    return rows
+
+
+def get_contract_rows(**filters):
+    """Return the rows (user_id, object_type, object_id, relation) of the contracts matching `filters`."""
+    rows = set()
+    contracts = Contract.objects.filter(**filters).values_list(
+        'id', 'sales_contact_id', 'client__main_sales_contact_id'
+    )
+    for contract_id, sales_contact_id, main_sales_contact_id in contracts:
+        rows.add((sales_contact_id, CONTRACT, contract_id, SALES_CONTACT))
+        rows.add((main_sales_contact_id, CONTRACT, contract_id, MAIN_SALES_CONTACT))
+    return rows
+
+
+def get_event_rows(**filters):
+    """Return the rows (user_id, object_type, object_id, relation) of the events matching `filters`."""
+    rows = set()
+    events = Event.objects.filter(**filters).values_list(
+        'pk', 'support_contact_id', 'contract__sales_contact_id', 'contract__client__main_sales_contact_id'
+    )
+    for event_id, support_contact_id, sales_contact_id, main_sales_contact_id in events:
+        rows.add((support_contact_id, EVENT, event_id, SUPPORT_CONTACT))
+        rows.add((sales_contact_id, EVENT, event_id, SALES_CONTACT))
+        rows.add((main_sales_contact_id, EVENT, event_id, MAIN_SALES_CONTACT))
+    return rows
+
+
+def write_rows(rows, batch_size=None):
+    AccessIndex.objects.bulk_create(
+        [
+            AccessIndex(user_id=user_id, object_type=object_type, object_id=object_id, relation=relation)
+            for user_id, object_type, object_id, relation in rows
+            if user_id is not None
+        ],
+        batch_size=batch_size,
+        # A concurrent refresh of the same object may have written the same rows.
+        ignore_conflicts=True,
+    )
+
+
+def get_feed_accesses(ids_by_type):
+    """Return the current (user_id, object_type, object_id) of the objects of the change feeds, in one query."""
+    condition = Q()
+    for object_type, ids in ids_by_type.items():
+        if object_type in FEED_MODELS and ids:
+            condition |= Q(object_type=object_type, object_id__in=ids)
+    if not condition:
+        return set()
+    return set(AccessIndex.objects.filter(condition).values_list('user_id', 'object_type', 'object_id'))
+
+
+def write_tombstones(accesses):
+    """Log (user_id or None for the managers, object_type, object_id) as no longer visible."""
+    now = timezone.now()
+    Tombstone.objects.bulk_create([
+        Tombstone(user_id=user_id, object_type=object_type, object_id=object_id, date_deleted=now)
+        for user_id, object_type, object_id in accesses
+    ])
+
+
+def refresh_access(client_ids=(), contract_ids=(), event_ids=(), created=False):
+    """Rebuild the rows of the given clients, contracts and events (`created`: just created, nothing to log for the
+    change feeds).
+    """
+    client_ids, contract_ids, event_ids = [
+        {object_id for object_id in ids if object_id is not None} for ids in (client_ids, contract_ids, event_ids)
+    ]
+
+    with transaction.atomic():
+        previous = set() if created else get_feed_accesses({CONTRACT: contract_ids, EVENT: event_ids})
+        rows = set()
+        for object_type, ids, get_rows in (
+            (CLIENT, client_ids, get_client_rows),
+            (CONTRACT, contract_ids, get_contract_rows),
+            (EVENT, event_ids, get_event_rows),
+        ):
+            if ids:
+                AccessIndex.objects.filter(object_type=object_type, object_id__in=ids).delete()
+                rows |= get_rows(pk__in=ids)
+        write_rows(rows)
+
+        if previous:
+            current = {row[:3] for row in rows if row[0] is not None and row[1] in FEED_MODELS}
+            write_tombstones(previous - current)
+            # The objects just created have no previous rows and a new date_updated already.
+            indexed = {(object_type, object_id) for _, object_type, object_id in previous}
+            gained = {(object_type, object_id) for _, object_type, object_id in current - previous}
+            for object_type, model in FEED_MODELS.items():
+                ids = [object_id for row_type, object_id in gained & indexed if row_type == object_type]
+                if ids:
+                    model.objects.filter(pk__in=ids).update(date_updated=timezone.now())
+
+
+def remove_access(object_type, object_ids):
+    """Delete the rows of deleted objects, logging the tombstones of the contracts and events."""
+    rows = AccessIndex.objects.filter(object_type=object_type, object_id__in=object_ids)
+    if object_type in FEED_MODELS:
+        accesses = set(rows.values_list('user_id', 'object_type', 'object_id'))
+        write_tombstones(accesses | {(None, object_type, object_id) for object_id in object_ids})
+    rows.delete()
+
+
+def refresh_client_tree(client_ids):
+    """Rebuild the rows of clients and of their contracts and events, which depend on the main sales contact."""
+    contract_ids = list(Contract.objects.filter(client_id__in=client_ids).values_list('id', flat=True))
+    event_ids = list(Event.objects.filter(contract_id__in=contract_ids).values_list('pk', flat=True))
+    refresh_access(client_ids=client_ids, contract_ids=contract_ids, event_ids=event_ids)
+
+
+def rebuild_access_index(batch_size=5000):
+    """Rebuild all the index from the clients, contracts and events. Return the number of rows written.
+
+    The objects are read by keyset batches of `batch_size` pks, and the rows of each batch are replaced in their own
+    transaction: the memory and the locks do not depend on the size of the tables, and the readers see the previous
+    rows of the objects until their batch is committed. The rows of the deleted objects go with the range of pks of
+    their batch.
+    """
+    count = 0
+    for model, object_type, get_rows in (
+        (Client, CLIENT, get_client_rows),
+        (Contract, CONTRACT, get_contract_rows),
+        (Event, EVENT, get_event_rows),
+    ):
+        last = None
+        while True:
+            pks = model.objects.order_by('pk')
+            if last is not None:
+                pks = pks.filter(pk__gt=last)
+            batch = list(pks.values_list('pk', flat=True)[:batch_size])
+
+            with transaction.atomic():
+                previous = AccessIndex.objects.filter(object_type=object_type)
+                if last is not None:
+                    previous = previous.filter(object_id__gt=last)
+                if len(batch) == batch_size:
+                    previous = previous.filter(object_id__lte=batch[-1])
+                # Else the last batch: all the rows left, up to the end.
+                previous.delete()
+                if batch:
+                    rows = get_rows(pk__in=batch)
+                    write_rows(rows, batch_size=batch_size)
+                    count += sum(1 for row in rows if row[0] is not None)
+
+            if len(batch) < batch_size:
+                break
+            last = batch[-1]
+    return count
+
+
+def refresh_objects_access(objects, created=False):
+    """Rebuild the rows of objects of the same model written without the signals (bulk_create, bulk_update)."""
+    if not objects:
+        return
+    model = type(objects[0])
+    pks = [obj.pk for obj in objects]
+
+    if model is Client:
+        refresh_client_tree(pks)
+    elif model is Contract:
+        client_ids = [obj.client_id for obj in objects]
+        client_ids += [getattr(obj, '_tracked_values', {}).get('client_id') for obj in objects]
+        refresh_access(client_ids=client_ids, contract_ids=pks, event_ids=pks, created=created)
+    elif model is Event:
+        client_ids = Contract.objects.filter(pk__in=pks).values_list('client_id', flat=True)
+        refresh_access(client_ids=list(client_ids), event_ids=pks, created=created)
+
+    for obj in objects:
+        obj.remember_tracked_fields()
@@ -1,19 +1,22 @@
 """Configuration setup for admin page in order to allow who can access and perform CRUD operators on Client model."""
 
-from django.db.models import Q
 from django.contrib import admin
 from ..models import (
     Client,
 )
 
+from .permissions_changelist import ObjectPermissionsAdminMixin
+from ..counts import EstimatedCountPaginator
+from ..access_index import CLIENT, accessible_ids
 from ..user_role import (
     is_superuser_or_manager,
     is_seller,
+    is_supporter,
     superuser_or_manager_permission
 )
 
 
-class ClientAdminConfig(admin.ModelAdmin):
+class ClientAdminConfig(ObjectPermissionsAdminMixin, admin.ModelAdmin):
     """Set view and CRUD permissions over the Client module for an authenticated user in the admin page.
     A superuser or a manager has all permissions.
     Any seller can create (add) a client but only the main sales contact (main seller of this client) can update and
@@ -21,18 +24,29 @@ class ClientAdminConfig(admin.ModelAdmin):
     """
 
     model = Client
+    list_display = (
+        'first_name', 'last_name', 'email', 'company_name', 'main_sales_contact', 'is_official_client', 'can_edit',
+        'can_delete',
+    )
+    # The columns of a page are read by one query, whatever the number of rows.
+    list_select_related = ('main_sales_contact',)
+    # Prefix searches (istartswith), served by the trigram indexes on PostgreSQL (see migration 0004_search_indexes).
+    search_fields = ('^first_name', '^last_name', '^email')
+    list_filter = ('is_official_client',)
+    # No count of all the rows visible to the user besides the count of the filtered ones.
+    show_full_result_count = False
+    # Exact count of the filtered rows up to COUNT_EXACT_THRESHOLD, estimated above (see counts.py).
+    paginator = EstimatedCountPaginator
 
     def get_queryset(self, request):
         """Sellers, supporters can see theirs own clients."""
         user = request.user
         if is_superuser_or_manager(user):
-            return super(ClientAdminConfig, self).get_queryset(request)
+            # Not super().get_queryset(): this method is shared with the viewsets of the API (self is a viewset).
+            return Client.objects.all()
 
-        return Client.objects.filter(
-            Q(main_sales_contact=user)
-            | Q(contracts__sales_contact=user)
-            | Q(contracts__event__support_contact=user)
-        ).distinct()
+        # Related through the main sales contact, the sales contacts or the support contacts (see access_index.py).
+        return Client.objects.filter(pk__in=accessible_ids(user, CLIENT))
 
     @superuser_or_manager_permission
     def has_add_permission(self, request):
@@ -73,6 +87,6 @@ class ClientAdminConfig(admin.ModelAdmin):
         """Superuser, member of Managers group can see the Client model.
         Member of Sellers group and Supporters group also can see this.
         """
-        if request.user.groups.filter(name__in=['Sellers', 'Supporters']).exists():
+        if is_seller(request.user) or is_supporter(request.user):
             return True
         return False
@@ -1,11 +1,13 @@
 """Configuration setup for admin page in order to allow who can access and perform CRUD operators on Contract model."""
 
-from django.db.models import Q
 from django.contrib import admin
 from ..models import (
     Contract,
 )
 
+from .permissions_changelist import ObjectPermissionsAdminMixin
+from ..counts import EstimatedCountPaginator
+from ..access_index import CONTRACT, accessible_ids
 from ..user_role import (
     is_superuser_or_manager,
     is_seller,
@@ -13,13 +15,30 @@ from ..user_role import (
 )
 
 
-class ContractAdminConfig(admin.ModelAdmin):
+class ContractAdminConfig(ObjectPermissionsAdminMixin, admin.ModelAdmin):
     """Set view and CRUD permissions over the Client module for an authenticated user in the admin page.
     A superuser or a manager has all permissions.
     Sales group can create a contract. Only the main seller can delete this contract.
     The seller signs the contract and the main seller can view and update the contract.
     """
 
+    list_display = (
+        'id', 'client_company_name', 'sales_contact', 'amount', 'is_signed', 'payment_due', 'can_edit', 'can_delete',
+    )
+    # The columns of a page are read by one query, whatever the number of rows.
+    list_select_related = ('client', 'sales_contact')
+    # Prefix searches on the client, served by the trigram indexes on PostgreSQL (see migration 0004_search_indexes).
+    search_fields = ('^client__first_name', '^client__last_name', '^client__email')
+    # Date ranges on an indexed column, without the date queries of date_hierarchy.
+    list_filter = (('payment_due', admin.DateFieldListFilter), 'is_signed')
+    show_full_result_count = False
+    # Exact count of the filtered rows up to COUNT_EXACT_THRESHOLD, estimated above (see counts.py).
+    paginator = EstimatedCountPaginator
+
+    @admin.display(description='client', ordering='client__company_name')
+    def client_company_name(self, contract):
+        return contract.client.company_name if contract.client else None
+
     def get_form(self, request, obj=None, **kwargs):
         """Allow to disable some fields which should not be modified."""
 
@@ -34,12 +53,11 @@ class ContractAdminConfig(admin.ModelAdmin):
         """Sellers can see only theirs own contracts."""
         user = request.user
         if is_superuser_or_manager(user):
-            return super(ContractAdminConfig, self).get_queryset(request)
+            # Not super().get_queryset(): this method is shared with the viewsets of the API (self is a viewset).
+            return Contract.objects.all()
 
-        return Contract.objects.filter(
-            Q(sales_contact=user)
-            | Q(client__main_sales_contact=user)
-        ).distinct()
+        # Related as sales contact or as main sales contact of the client (see access_index.py).
+        return Contract.objects.filter(pk__in=accessible_ids(user, CONTRACT))
 
     @superuser_or_manager_permission
     def has_add_permission(self, request):
@@ -79,6 +97,6 @@ class ContractAdminConfig(admin.ModelAdmin):
         """Superuser, member of Managers group can see the Contract model.
         Member of Sellers group also can this.
         """
-        if request.user.groups.filter(name__in=['Sellers']).exists():
+        if is_seller(request.user):
             return True
         return False
@@ -1,25 +1,52 @@
 """Configuration setup for admin page in order to allow who can access and perform CRUD operators on Event model."""
 
-from django.db.models import Q
 from django.contrib import admin
 from ..models import (
     Event
 )
 
+from .permissions_changelist import ObjectPermissionsAdminMixin
+from ..counts import EstimatedCountPaginator
+from ..access_index import EVENT, accessible_ids
 from ..user_role import (
     is_superuser_or_manager,
     is_seller,
+    is_supporter,
     superuser_or_manager_permission
 )
 
 
-class EventAdminConfig(admin.ModelAdmin):
+class EventAdminConfig(ObjectPermissionsAdminMixin, admin.ModelAdmin):
     """Set view and CRUD permissions over the Client module for an authenticated user in the admin page.
     A superuser or a manager has all permissions.
     Sales group can create an event. Only the main seller can delete this event.
     The seller signs the contract, the main seller and the supporter of the event can view and update the event.
     """
 
+    list_display = (
+        'event_id', 'client_company_name', 'support_contact', 'status', 'attendees', 'event_date', 'can_edit',
+        'can_delete',
+    )
+    # The columns of a page are read by one query, whatever the number of rows.
+    list_select_related = ('contract__client', 'support_contact')
+    # Prefix searches on the client, served by the trigram indexes on PostgreSQL (see migration 0004_search_indexes).
+    search_fields = ('^contract__client__first_name', '^contract__client__last_name', '^contract__client__email')
+    # Date ranges on an indexed column, without the date queries of date_hierarchy.
+    list_filter = (('event_date', admin.DateFieldListFilter), 'status')
+    show_full_result_count = False
+    # Exact count of the filtered rows up to COUNT_EXACT_THRESHOLD, estimated above (see counts.py).
+    paginator = EstimatedCountPaginator
+
+    @admin.display(description='event', ordering='contract')
+    def event_id(self, event):
+        # Not the contract column: Contract.__str__ reads the client and the users.
+        return event.pk
+
+    @admin.display(description='client', ordering='contract__client__company_name')
+    def client_company_name(self, event):
+        client = event.contract.client
+        return client.company_name if client else None
+
     def get_form(self, request, obj=None, **kwargs):
         """Allow to disable some fields which should not be modified."""
 
@@ -34,13 +61,11 @@ class EventAdminConfig(admin.ModelAdmin):
         """Sellers and supporters can see only theirs own events."""
         user = request.user
         if is_superuser_or_manager(user):
-            return super(EventAdminConfig, self).get_queryset(request)
+            # Not super().get_queryset(): this method is shared with the viewsets of the API (self is a viewset).
+            return Event.objects.all()
 
-        return Event.objects.filter(
-            Q(support_contact=user)
-            | Q(contract__sales_contact=user)
-            | Q(contract__client__main_sales_contact=user)
-        ).distinct()
+        # Related through the main sales contact, the sales contacts or the support contacts (see access_index.py).
+        return Event.objects.filter(pk__in=accessible_ids(user, EVENT))
 
     @superuser_or_manager_permission
     def has_add_permission(self, request):
@@ -83,6 +108,6 @@ class EventAdminConfig(admin.ModelAdmin):
         """Superuser, member of Managers group can see the Event model.
         Member of Sellers group and Supporters group also can see this.
         """
-        if request.user.groups.filter(name__in=['Sellers', 'Supporters']).exists():
+        if is_seller(request.user) or is_supporter(request.user):
             return True
         return False
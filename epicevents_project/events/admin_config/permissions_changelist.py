@@ -0,0 +1,31 @@
+"""Changelist showing the permissions of the user on each row, evaluated for the whole page at once."""
+
+from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
+
+from ..object_permissions import get_object_permissions
+
+
+class PermissionsChangeList(ChangeList):
+    """Evaluate the permissions of the user on the rows of the page with a fixed number of queries."""
+
+    def get_results(self, request):
+        super(PermissionsChangeList, self).get_results(request)
+        permissions = get_object_permissions(request.user, self.result_list)
+        for obj in self.result_list:
+            obj.object_permissions = permissions[obj.pk]
+
+
+class ObjectPermissionsAdminMixin:
+    """Add the "can edit" and "can delete" columns to the changelist of a model admin."""
+
+    def get_changelist(self, request, **kwargs):
+        return PermissionsChangeList
+
+    @admin.display(boolean=True, description='can edit')
+    def can_edit(self, obj):
+        return obj.object_permissions['change']
+
+    @admin.display(boolean=True, description='can delete')
+    def can_delete(self, obj):
+        return obj.object_permissions['delete']
@@ -0,0 +1,80 @@
+"""Run the API views concurrently under ASGI.
+
+Django 3.2 has no async ORM, and under ASGI it runs all the synchronous views of all the requests one at a time, in
+a single thread. The API views are wrapped here in async views which run them in a pool of ASYNC_DB_WORKERS threads:
+up to that many requests are served at once, the others wait in the event loop without holding a thread. Each thread
+has its own database connection, kept between requests with CONN_MAX_AGE > 0, so the pool is also the bound on the
+number of connections opened by a worker process.
+
+The ASGI application (see asgi.py) serves the url patterns of asgi_urls.py, where the DRF views are wrapped; the WSGI
+application is unchanged.
+"""
+
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.urls import URLPattern, URLResolver
+
+executor = ThreadPoolExecutor(max_workers=getattr(settings, 'ASYNC_DB_WORKERS', 16), thread_name_prefix='api')
+
+
+def run_view(view, request, *args, **kwargs):
+    """Run a view in a thread of the pool, as Django does for a request: the connection of the thread is closed if
+    it is broken or older than CONN_MAX_AGE, before and after the view.
+    """
+    close_old_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+def async_view(view):
+    """Wrap a synchronous view in an async view running it in the pool."""
+
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(
+            executor, functools.partial(context.run, run_view, view, request, *args, **kwargs)
+        )
+
+    return wrapper
+
+
+def is_pool_view(callback):
+    """The DRF views, except the actions streaming their response (see ExportViewSetMixin): a stream is read after
+    the view returns, it must stay with the connection of the thread that Django gives to the synchronous views (see
+    APIASGIHandler in asgi.py).
+    """
+    cls = getattr(callback, 'cls', None)
+    if cls is None:
+        return False
+    actions = set((getattr(callback, 'actions', None) or {}).values())
+    return not actions & set(getattr(cls, 'streaming_actions', ()))
+
+
+def wrap_urlpatterns(patterns):
+    """Return a copy of `patterns` where the views run in the pool."""
+    wrapped = []
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            wrapped.append(URLResolver(
+                pattern.pattern, wrap_urlpatterns(pattern.url_patterns), pattern.default_kwargs,
+                pattern.app_name, pattern.namespace,
+            ))
+        elif isinstance(pattern, URLPattern) and is_pool_view(pattern.callback):
+            wrapped.append(URLPattern(
+                pattern.pattern, async_view(pattern.callback), pattern.default_args, pattern.name,
+            ))
+        else:
+            wrapped.append(pattern)
+    return wrapped
@@ -0,0 +1,266 @@
+"""Helpers shared by the benchmark management commands: generate the benchmark data, call the API views in process
+and time them.
+"""
+
+import csv
+import io
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group
+from django.db import connection, transaction
+from django.db.models import F
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from .access_index import rebuild_access_index
+from .models import User, Client, Contract, Event
+
+BENCHMARK_DOMAIN = '@bench.example'
+FIRST_NAMES = ['Anna', 'Louis', 'Emma', 'Hugo', 'Chloe', 'Jules', 'Lea', 'Adam', 'Manon', 'Paul', 'Ines', 'Tom']
+LAST_NAMES = ['Martin', 'Bernard', 'Dubois', 'Thomas', 'Robert', 'Richard', 'Petit', 'Durand', 'Leroy', 'Moreau']
+# Share of the benchmark users in each group, the others are supporters.
+ROLE_GROUPS = (('manager', 'Managers', 0.1), ('seller', 'Sellers', 0.45), ('supporter', 'Supporters', None))
+# Number of contracts of a client: 1 to 4, most clients have one.
+CONTRACTS_PER_CLIENT = ((1, 2, 3, 4), (50, 30, 15, 5))
+SIGNED_SHARE = 0.6
+# Share of the signed contracts having their event.
+EVENT_SHARE = 0.8
+# A contract is created a year before its payment is due.
+CONTRACT_AGE = timedelta(days=365)
+COPY_NULL = r'\N'
+
+# The host must be in ALLOWED_HOSTS, the views build absolute urls (pagination links).
+request_factory = APIRequestFactory(SERVER_NAME='127.0.0.1')
+
+
+def call_view(view, user, path, method='get', data=None, **kwargs):
+    """Call a view (from as_view()) as `user` and return the rendered response."""
+    request = getattr(request_factory, method)(path, data=data, format='json' if method != 'get' else None)
+    force_authenticate(request, user=user)
+    response = view(request, **kwargs)
+    if hasattr(response, 'render'):
+        response.render()
+    return response
+
+
+def count_queries(func):
+    """Return the result of `func()` and the number of queries it ran."""
+    with CaptureQueriesContext(connection) as context:
+        result = func()
+    return result, len(context.captured_queries)
+
+
+def time_calls(func, repeat):
+    """Call `func` `repeat` times and return latency statistics in milliseconds."""
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append((time.perf_counter() - start) * 1000)
+    durations.sort()
+    return {
+        'min': durations[0],
+        'mean': statistics.mean(durations),
+        'median': statistics.median(durations),
+        'p95': durations[min(len(durations) - 1, int(len(durations) * 0.95))],
+        'max': durations[-1],
+    }
+
+
+def zipf_weights(count):
+    """A few users have most of the objects, as with real portfolios."""
+    return [1 / rank for rank in range(1, count + 1)]
+
+
+class DataGenerator:
+    """Create the benchmark users, split across the groups, and clients with their contracts and events.
+
+    The data of each client is drawn from its own random generator seeded with (seed, client index), so the same
+    data is generated whatever the batch size, and more clients can be added to an existing data set. On PostgreSQL
+    the rows are written with COPY (unless `use_copy` is False), elsewhere with bulk_create().
+    """
+
+    def __init__(self, seed=12, batch_size=5000, use_copy=True):
+        self.seed = seed
+        self.batch_size = batch_size
+        self.use_copy = use_copy and connection.vendor == 'postgresql'
+
+    def get_users(self, count):
+        """Create the missing benchmark users. Return {role: [users ordered by pk]}."""
+        users = {}
+        for role, group_name, share in ROLE_GROUPS:
+            if share is None:
+                role_count = max(1, count - sum(len(role_users) for role_users in users.values()))
+            else:
+                role_count = max(1, int(count * share))
+            existing = list(User.objects.filter(username__startswith=f'bench_{role}_').order_by('pk'))
+            missing = [
+                User(
+                    username=f'bench_{role}_{number}', email=f'{role}{number}{BENCHMARK_DOMAIN}',
+                    first_name='Bench', last_name=role.capitalize(), password=make_password(None),
+                    is_staff=True, is_superuser=False,
+                )
+                for number in range(len(existing), role_count)
+            ]
+            if missing:
+                User.objects.bulk_create(missing, batch_size=self.batch_size)
+                new_users = list(User.objects.filter(username__in=[user.username for user in missing]).order_by('pk'))
+                group = Group.objects.get(name=group_name)
+                User.groups.through.objects.bulk_create([
+                    User.groups.through(user_id=user.pk, group_id=group.pk) for user in new_users
+                ], batch_size=self.batch_size)
+                existing += new_users
+            users[role] = existing[:role_count]
+        return users
+
+    def generate(self, users, clients, rebuild_index=True, progress=None):
+        """Create `users` users and `clients` clients (less the ones already there), then rebuild the access index.
+        Call `progress(counts)` after each batch. Return the number of rows created by model.
+        """
+        role_users = self.get_users(users)
+        sellers = [user.pk for user in role_users['seller']]
+        supporters = [user.pk for user in role_users['supporter']]
+        seller_weights, supporter_weights = zipf_weights(len(sellers)), zipf_weights(len(supporters))
+
+        existing = Client.objects.filter(email__endswith=BENCHMARK_DOMAIN).count()
+        counts = {'clients': 0, 'contracts': 0, 'events': 0}
+        now = timezone.now()
+        for start in range(existing, clients, self.batch_size):
+            plans = {}
+            for index in range(start, min(start + self.batch_size, clients)):
+                rng = random.Random(f'{self.seed}-{index}')
+                seller = rng.choices(sellers, seller_weights)[0]
+                client = Client(
+                    first_name=rng.choice(FIRST_NAMES), last_name=rng.choice(LAST_NAMES),
+                    email=f'client{index}{BENCHMARK_DOMAIN}', phone='0102030405', mobile='0602030405',
+                    company_name=f'Company {index}', main_sales_contact_id=seller,
+                    is_official_client=rng.random() < SIGNED_SHARE,
+                )
+                contracts = []
+                for _ in range(rng.choices(*CONTRACTS_PER_CLIENT)[0]):
+                    signed = rng.random() < SIGNED_SHARE
+                    contract = Contract(
+                        # Mostly signed by the main sales contact of the client.
+                        sales_contact_id=seller if rng.random() < 0.8 else rng.choice(sellers),
+                        amount=rng.randint(100, 10000), is_signed=signed,
+                        payment_due=now + timedelta(days=rng.randint(0, 365)),
+                    )
+                    event = None
+                    if signed and rng.random() < EVENT_SHARE:
+                        event = Event(
+                            support_contact_id=rng.choices(supporters, supporter_weights)[0],
+                            attendees=rng.randint(10, 500), notes='Notes',
+                            event_date=now + timedelta(days=rng.randint(0, 365), minutes=rng.randint(0, 1440)),
+                            status=rng.choice(Event.StatusChoice.values),
+                        )
+                    contracts.append((contract, event))
+                plans[client.email] = (client, contracts)
+
+            with transaction.atomic():
+                batch_counts = self.copy_batch(plans) if self.use_copy else self.write_batch(plans)
+            for name, count in batch_counts.items():
+                counts[name] += count
+            if progress is not None:
+                progress(counts)
+
+        if rebuild_index:
+            # Neither bulk_create() nor COPY send the signals maintaining the access index.
+            rebuild_access_index(batch_size=self.batch_size)
+        return counts
+
+    def write_batch(self, plans):
+        """Insert the clients of `plans` {email: (client, [(contract, event or None)])}, then their contracts and
+        events, with bulk_create(). Return the number of rows created by model.
+        """
+        Client.objects.bulk_create([client for client, _ in plans.values()])
+        client_ids = dict(Client.objects.filter(email__in=list(plans)).values_list('email', 'id'))
+
+        contracts = []
+        for email, (_, client_contracts) in plans.items():
+            for contract, _ in client_contracts:
+                contract.client_id = client_ids[email]
+                contracts.append(contract)
+        Contract.objects.bulk_create(contracts)
+        # date_created is set by auto_now_add, spread it over the year before the payment.
+        Contract.objects.filter(client_id__in=client_ids.values()).update(
+            date_created=F('payment_due') - CONTRACT_AGE
+        )
+
+        # The primary keys are not set by bulk_create() on all the databases: the contracts of each client are read
+        # back in the order of their insertion.
+        contract_ids = {}
+        rows = Contract.objects.filter(client_id__in=client_ids.values()).order_by('client_id', 'id')
+        for client_id, contract_id in rows.values_list('client_id', 'id'):
+            contract_ids.setdefault(client_id, []).append(contract_id)
+        events = []
+        for email, (_, client_contracts) in plans.items():
+            for contract_id, (_, event) in zip(contract_ids[client_ids[email]], client_contracts):
+                if event is not None:
+                    event.contract_id = contract_id
+                    events.append(event)
+        Event.objects.bulk_create(events)
+        return {'clients': len(plans), 'contracts': len(contracts), 'events': len(events)}
+
+    def copy_batch(self, plans):
+        """Same as write_batch() with COPY on PostgreSQL, the primary keys being taken from the sequences first."""
+        clients = [client for client, _ in plans.values()]
+        for client, pk in zip(clients, reserve_ids(Client, len(clients))):
+            client.pk = pk
+
+        contracts, events = [], []
+        for client, client_contracts in plans.values():
+            for contract, event in client_contracts:
+                contract.client_id = client.pk
+                contracts.append(contract)
+                if event is not None:
+                    events.append((contract, event))
+        for contract, pk in zip(contracts, reserve_ids(Contract, len(contracts))):
+            contract.pk = pk
+        for contract, event in events:
+            event.contract_id = contract.pk
+
+        copy_rows(Client, clients)
+        copy_rows(Contract, contracts, {'date_created': lambda contract: contract.payment_due - CONTRACT_AGE})
+        copy_rows(Event, [event for _, event in events])
+        return {'clients': len(clients), 'contracts': len(contracts), 'events': len(events)}
+
+
+def reserve_ids(model, count):
+    """Take `count` values of the sequence of the primary key of `model` (PostgreSQL)."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)',
+            [model._meta.db_table, model._meta.pk.column, count],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def copy_rows(model, objects, overrides=None):
+    """Write `objects` (primary keys set) with COPY, as bulk_create() would (defaults, auto_now...), with the
+    values of `overrides` {field name: function(obj)}.
+    """
+    overrides = overrides or {}
+    fields = model._meta.concrete_fields
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for obj in objects:
+        row = []
+        for field in fields:
+            value = overrides[field.name](obj) if field.name in overrides else field.pre_save(obj, add=True)
+            value = field.get_db_prep_save(value, connection)
+            row.append(COPY_NULL if value is None else value)
+        writer.writerow(row)
+    buffer.seek(0)
+
+    columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+    with connection.cursor() as cursor:
+        cursor.cursor.copy_expert(
+            f"COPY {connection.ops.quote_name(model._meta.db_table)} ({columns}) FROM STDIN "
+            f"WITH (FORMAT csv, NULL '{COPY_NULL}')",
+            buffer,
+        )
@@ -0,0 +1,219 @@
+"""Bulk create and update of clients, contracts and events: POST/PUT/PATCH on /clients/bulk/, /contracts/bulk/ and
+/events/bulk/ with an array of objects.
+
+The related objects given as {"id": ...} (or any other lookup, as for a single object) are resolved with one `IN`
+query per model, all items are validated before writing, then they are written with `bulk_create`/`bulk_update` in a
+single transaction. If any item is invalid, nothing is written and the errors of each item are returned.
+"""
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError as DjangoValidationError
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from .access_index import refresh_objects_access
+from .object_permissions import get_object_permissions
+from .response_cache import bump_versions
+
+
+def to_lookup_value(model, field, value):
+    return model._meta.get_field(model._meta.pk.name if field == 'pk' else field).to_python(value)
+
+
+def resolve_references(model, references):
+    """Fetch the objects described by a list of lookups (dicts such as {"id": 3}, or None), with one query per set
+    of lookup fields. Return the list of the objects found, None where not found.
+    """
+    groups = {}
+    for index, lookups in enumerate(references):
+        if isinstance(lookups, dict) and lookups:
+            groups.setdefault(tuple(sorted(lookups)), []).append(index)
+
+    found = [None] * len(references)
+    for fields, indexes in groups.items():
+        try:
+            values = [
+                tuple(to_lookup_value(model, field, references[index][field]) for field in fields)
+                for index in indexes
+            ]
+        except (FieldDoesNotExist, DjangoValidationError):
+            # Unknown field or invalid value: the objects of this group are not found.
+            continue
+
+        if len(fields) == 1:
+            candidates = model.objects.filter(**{f'{fields[0]}__in': [value[0] for value in values]})
+        else:
+            condition = Q()
+            for value in values:
+                condition |= Q(**dict(zip(fields, value)))
+            candidates = model.objects.filter(condition)
+        by_values = {tuple(getattr(obj, field) for field in fields): obj for obj in candidates}
+
+        for index, value in zip(indexes, values):
+            found[index] = by_values.get(value)
+    return found
+
+
+class BulkViewSetMixin:
+    """Add the "bulk" action to a model viewset.
+
+    - bulk_references: {field: (model, error message)}, related objects given by lookups in the items,
+    - bulk_immutable_fields: related objects which are set on creation only (ignored by an update).
+    """
+
+    bulk_references = {}
+    bulk_immutable_fields = ()
+    bulk_max_items = 1000
+
+    @action(detail=False, methods=['post', 'put', 'patch'], url_path='bulk')
+    def bulk(self, request, *args, **kwargs):
+        items = request.data
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            raise ValidationError({'detail': 'Expected a list of objects.'})
+        if len(items) > self.bulk_max_items:
+            raise ValidationError({'detail': f'At most {self.bulk_max_items} objects can be sent at once.'})
+
+        items = [dict(item) for item in items]
+        if request.method == 'POST':
+            objects, errors = self.validate_bulk_create(items)
+        else:
+            objects, fields, errors = self.validate_bulk_update(items, partial=request.method == 'PATCH')
+        if errors:
+            return Response(
+                {'errors': [{'index': index, 'errors': errors[index]} for index in sorted(errors)]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        with transaction.atomic():
+            if request.method == 'POST':
+                self.bulk_insert(objects)
+            else:
+                self.bulk_save(objects, fields)
+
+        model = self.get_serializer_class().Meta.model
+        saved = self.shape_queryset(model.objects.all()).in_bulk([obj.pk for obj in objects])
+        data = self.get_serializer([saved[obj.pk] for obj in objects], many=True).data
+        return Response(data, status=status.HTTP_201_CREATED if request.method == 'POST' else status.HTTP_200_OK)
+
+    def resolve_bulk_references(self, items, fields):
+        """Pop the lookups of the related objects from the items and resolve them.
+        Return {field: list of objects (None if not found)} and {field: list of whether each item gave it}.
+        """
+        related, given = {}, {}
+        for field in fields:
+            model, _ = self.bulk_references[field]
+            given[field] = [field in item for item in items]
+            related[field] = resolve_references(model, [item.pop(field, None) for item in items])
+        return related, given
+
+    def validate_items(self, items, related, given, instances, partial=False):
+        """Validate each item with the serializer. Return the validated data and the errors, by item index."""
+        validated, errors = {}, {}
+        for index, item in enumerate(items):
+            item_errors = {}
+            for field, objects in related.items():
+                # A partial update may leave a relation out, not give one that does not exist.
+                if objects[index] is None and not (partial and not given[field][index]):
+                    item_errors[field] = [self.bulk_references[field][1]]
+
+            serializer = self.get_serializer(instances[index], data=item, partial=partial)
+            if not serializer.is_valid():
+                item_errors.update(serializer.errors)
+
+            if item_errors:
+                errors[index] = item_errors
+            else:
+                validated[index] = serializer.validated_data
+        return validated, errors
+
+    def validate_bulk_create(self, items):
+        related, given = self.resolve_bulk_references(items, list(self.bulk_references))
+        validated, errors = self.validate_items(items, related, given, [None] * len(items))
+        if errors:
+            return [], errors
+
+        model = self.get_serializer_class().Meta.model
+        objects = [
+            model(**validated[index], **{field: related[field][index] for field in related})
+            for index in range(len(items))
+        ]
+        return objects, self.get_bulk_create_errors(objects)
+
+    def validate_bulk_update(self, items, partial=False):
+        """Return the objects updated in memory, the names of the fields to write and the errors by item index."""
+        model = self.get_serializer_class().Meta.model
+        pk_name = 'pk' if 'pk' in self.get_serializer_class().Meta.fields else 'id'
+        pks = []
+        for item in items:
+            try:
+                pks.append(to_lookup_value(model, 'pk', item.pop(pk_name, None)))
+            except DjangoValidationError:
+                pks.append(None)
+            for field in self.bulk_immutable_fields:
+                item.pop(field, None)
+
+        # Only the objects that the user can see, then his permission to change each one of them.
+        instances = self.get_queryset().in_bulk([pk for pk in pks if pk is not None])
+        permissions = get_object_permissions(self.request.user, list(instances.values()))
+
+        errors = {}
+        for index, pk in enumerate(pks):
+            if pk not in instances:
+                errors[index] = {pk_name: ['Not found.']}
+            elif not permissions[pk]['change']:
+                errors[index] = {pk_name: ['You do not have permission to perform this action.']}
+
+        fields = [field for field in self.bulk_references if field not in self.bulk_immutable_fields]
+        related, given = self.resolve_bulk_references(items, fields)
+        valid_indexes = [index for index in range(len(items)) if index not in errors]
+        validated, item_errors = self.validate_items(
+            [items[index] for index in valid_indexes],
+            {field: [objects[index] for index in valid_indexes] for field, objects in related.items()},
+            {field: [values[index] for index in valid_indexes] for field, values in given.items()},
+            [instances[pks[index]] for index in valid_indexes],
+            partial=partial,
+        )
+        errors.update({valid_indexes[position]: error for position, error in item_errors.items()})
+        if errors:
+            return [], [], errors
+
+        objects, updated_fields = [], set()
+        for position, index in enumerate(valid_indexes):
+            instance = instances[pks[index]]
+            values = dict(validated[position])
+            values.update({field: related[field][index] for field in related if related[field][index] is not None})
+            for name, value in values.items():
+                setattr(instance, name, value)
+            updated_fields.update(values)
+            objects.append(instance)
+        return objects, sorted(updated_fields), errors
+
+    def get_bulk_create_errors(self, objects):
+        """Errors which need all the objects to be known, by item index. Nothing to check by default."""
+        return {}
+
+    def bulk_insert(self, objects):
+        model = self.get_serializer_class().Meta.model
+        if connection.features.can_return_rows_from_bulk_insert or all(obj.pk is not None for obj in objects):
+            model.objects.bulk_create(objects)
+            # bulk_create() does not send the signals maintaining the access index and the response cache.
+            refresh_objects_access(objects, created=True)
+            bump_versions(model._meta.model_name)
+        else:
+            # The database does not give back the ids of the rows inserted in bulk.
+            for obj in objects:
+                obj.save(force_insert=True)
+
+    def bulk_save(self, objects, fields):
+        model = self.get_serializer_class().Meta.model
+        now = timezone.now()
+        for obj in objects:
+            # bulk_update() does not run the auto_now of date_updated.
+            obj.date_updated = now
+        model.objects.bulk_update(objects, list(fields) + ['date_updated'])
+        refresh_objects_access([obj for obj in objects if obj.has_tracked_fields_changed()])
+        bump_versions(model._meta.model_name)
@@ -0,0 +1,140 @@
+"""Change feeds of the contracts and events: GET /contracts/changes/ and /events/changes/.
+
+A call returns the objects created or updated since the cursor of the previous call (ordered by date_updated, the
+pk breaking the ties) and the ids of the objects deleted since then, from the tombstones (see access_index.py), along
+with the cursor of the next call. Without a cursor, the feed starts with all the objects. The visibility rules of the
+list apply: a seller or a supporter gets the tombstones of the objects they could see, including the ones which are
+no longer visible to them, the managers get all the deletions. Apply the deletions before the updates.
+
+The feed stops CHANGE_FEED_DELAY seconds before now, so that a row written by a transaction which commits (or reaches
+a replica) later than the date it carries is still read. The tombstones are kept CHANGE_FEED_RETENTION_DAYS (see the
+prune_tombstones command): a cursor not used for longer gets a 410 response, and the client must start again without
+cursor.
+"""
+
+import base64
+import json
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from .exceptions import CursorExpired
+from .models import Tombstone
+from .pagination import KeysetPagination, keyset_filter
+from .user_role import is_superuser_or_manager
+
+
+def get_delay():
+    return timedelta(seconds=getattr(settings, 'CHANGE_FEED_DELAY', 5))
+
+
+def get_retention():
+    return timedelta(days=getattr(settings, 'CHANGE_FEED_RETENTION_DAYS', 30))
+
+
+def encode_cursor(updated, deleted):
+    cursor = {
+        name: None if position is None else [position[0].isoformat(), position[1]]
+        for name, position in (('u', updated), ('d', deleted))
+    }
+    return base64.urlsafe_b64encode(json.dumps(cursor, separators=(',', ':')).encode()).decode()
+
+
+def decode_cursor(encoded):
+    """Return the positions (date, pk) of the updates and of the deletions stored in the cursor."""
+    try:
+        cursor = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+        positions = []
+        for name in ('u', 'd'):
+            position = cursor[name]
+            if position is not None:
+                date = parse_datetime(position[0])
+                if date is None:
+                    raise ValueError
+                position = (date, int(position[1]))
+            positions.append(position)
+        return positions
+    except Exception:
+        raise NotFound('Invalid cursor')
+
+
+class ChangeFeedMixin:
+    """Add the "changes" action to the viewset of a model with a date_updated field and tombstones."""
+
+    changes_object_type = None
+    changes_page_size = 500
+    changes_max_page_size = 5000
+    changes_cursor_query_param = 'cursor'
+
+    @action(detail=False, methods=['get'], url_path='changes')
+    def changes(self, request, *args, **kwargs):
+        pagination = KeysetPagination()
+        pagination.page_size, pagination.max_page_size = self.changes_page_size, self.changes_max_page_size
+        page_size = pagination.get_page_size(request)
+        until = timezone.now() - get_delay()
+
+        encoded = request.query_params.get(self.changes_cursor_query_param)
+        if encoded:
+            updated, deleted = decode_cursor(encoded)
+            if deleted is not None and deleted[0] < timezone.now() - get_retention():
+                raise CursorExpired()
+        else:
+            # A new client reads all the objects: only the deletions from now on concern it.
+            updated, deleted = None, (until, 0)
+
+        objects, updated, more_objects = self.get_changed_objects(updated, until, page_size)
+        deleted_ids, deleted, more_deleted = self.get_deleted_ids(deleted, until, page_size)
+
+        cursor = encode_cursor(updated, deleted)
+        return Response(OrderedDict([
+            ('cursor', cursor),
+            ('next', replace_query_param(request.build_absolute_uri(), self.changes_cursor_query_param, cursor)),
+            ('has_more', more_objects or more_deleted),
+            ('results', self.get_serializer(objects, many=True).data),
+            ('deleted', deleted_ids),
+        ]))
+
+    def get_changed_objects(self, position, until, page_size):
+        """Return the objects updated after `position` up to `until`, the position of the last one, and whether
+        there are more.
+        """
+        queryset = self.get_queryset()
+        ordering = ('date_updated', queryset.model._meta.pk.attname)
+        # The position is read from an annotation: date_updated may be deferred by only() (see querysets.py).
+        queryset = queryset.filter(date_updated__lte=until).annotate(feed_date=F('date_updated'))
+        if position is not None:
+            queryset = queryset.filter(keyset_filter(ordering, dict(zip(ordering, position))))
+        objects = list(queryset.order_by(*ordering)[:page_size + 1])
+        page = objects[:page_size]
+        if page:
+            position = (page[-1].feed_date, page[-1].pk)
+        return page, position, len(objects) > page_size
+
+    def get_deleted_ids(self, position, until, page_size):
+        """Same as get_changed_objects() for the tombstones visible to the user, return the ids of the objects."""
+        user = self.request.user
+        tombstones = Tombstone.objects.filter(
+            object_type=self.changes_object_type,
+            user_id=None if is_superuser_or_manager(user) else user.pk,
+            date_deleted__lte=until,
+        )
+        ordering = ('date_deleted', 'id')
+        tombstones = tombstones.filter(keyset_filter(ordering, dict(zip(ordering, position)))).order_by(*ordering)
+        rows = list(tombstones.values_list('date_deleted', 'id', 'object_id')[:page_size + 1])
+        page = rows[:page_size]
+        if page:
+            position = page[-1][:2]
+        more = len(rows) > page_size
+        if not more:
+            # All the tombstones up to `until` are read: the position moves on even without deletion, so that the
+            # cursor of a client polling regularly does not expire.
+            position = max(position, (until, 0))
+        return list(dict.fromkeys(row[2] for row in page)), position, more
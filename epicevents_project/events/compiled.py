@@ -0,0 +1,214 @@
+"""Compiled read path of the list and retrieve endpoints.
+
+A ModelSerializer builds a model instance per row and per nested object, then calls get_attribute() and
+to_representation() on each field. For the reads, CompiledSerializer walks the fields of the serializer once, and
+keeps for each of them the column to read (a values() lookup such as "contract__client__email") and the conversion to
+apply, none for the values which the database already returns as the serializer renders them (strings, integers,
+booleans). A list then fetches flat rows with values() and assembles each of them into the same nested representation
+as the serializer (byte for byte once rendered) with a function generated for the serializer: a single dict display
+per row instead of a loop on the fields.
+
+The serializers whose fields do not all map to a column (method fields, dotted sources, many-to-many relations, ...)
+are not compiled: their viewsets keep the serializer. The writes always go through the serializers.
+"""
+
+import functools
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from epicevents_project.instrumentation import timed
+
+# The fields whose to_representation() returns the value as read from the database.
+IDENTITY_FIELDS = (
+    serializers.BooleanField,
+    serializers.CharField,
+    serializers.EmailField,
+    serializers.IntegerField,
+    serializers.ReadOnlyField,
+)
+
+
+class NotCompilable(Exception):
+    """A field of the serializer cannot be read from a column."""
+
+
+def get_current_timezone():
+    """The timezone of the dates rendered by a DateTimeField without explicit timezone."""
+    return timezone.get_current_timezone() if settings.USE_TZ else None
+
+
+def get_datetime_converter(field):
+    """DateTimeField.to_representation() in ISO 8601, with the current timezone read once per representation."""
+
+    def convert(value, current_timezone):
+        if value is None:
+            return None
+        if current_timezone is None or value.tzinfo is None:
+            return field.to_representation(value)
+        value = value.astimezone(current_timezone).isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+
+    return convert
+
+
+def get_converter(field):
+    """Return the function (value of the database or None, current timezone) returning the representation of the
+    value by `field`, None if the value is already its representation.
+    """
+    if type(field) in IDENTITY_FIELDS:
+        return None
+    if type(field) is serializers.ChoiceField and all(
+        key == value for key, value in field.choice_strings_to_values.items()
+    ):
+        return None
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    if (type(field) is serializers.DateTimeField and not hasattr(field, 'timezone')
+            and isinstance(output_format, str) and output_format.lower() == ISO_8601):
+        return get_datetime_converter(field)
+    to_representation = field.to_representation
+    return lambda value, current_timezone: None if value is None else to_representation(value)
+
+
+class CompiledSerializer:
+    """The representation of a model serializer, from the rows of values() or from instances."""
+
+    def __init__(self, serializer, prefix=''):
+        model = serializer.Meta.model
+        self.pk_lookup = prefix + model._meta.pk.name
+        self.lookups = [self.pk_lookup]
+        # (name, lookup, attribute, converter, nested CompiledSerializer)
+        self.fields = []
+
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            attribute = field.source
+            if attribute == 'pk':
+                model_field = model._meta.pk
+            else:
+                try:
+                    model_field = model._meta.get_field(attribute)
+                except FieldDoesNotExist:
+                    raise NotCompilable(f'{model.__name__}.{attribute} is not a field')
+                if not model_field.concrete or model_field.many_to_many:
+                    raise NotCompilable(f'{model.__name__}.{attribute} is not a column')
+
+            if isinstance(field, serializers.ModelSerializer) and model_field.is_relation:
+                nested = CompiledSerializer(field, prefix + attribute + '__')
+                self.lookups.extend(nested.lookups)
+                self.fields.append((name, nested.pk_lookup, attribute, None, nested))
+            elif isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is None:
+                # The value of the foreign key column (the primary key itself for a one-to-one primary key).
+                if attribute != 'pk':
+                    attribute = model_field.attname
+                self.lookups.append(prefix + attribute)
+                self.fields.append((name, prefix + attribute, attribute, None, None))
+            elif not model_field.is_relation and not isinstance(field, (serializers.BaseSerializer,
+                                                                        serializers.RelatedField)):
+                self.lookups.append(prefix + attribute)
+                self.fields.append((name, prefix + attribute, attribute, get_converter(field), None))
+            else:
+                raise NotCompilable(f'{model.__name__}.{attribute} cannot be read from a column')
+
+        self.lookups = list(dict.fromkeys(self.lookups))
+        if not prefix:
+            self.from_row = self.compile_row_function(type(serializer).__name__)
+
+    def get_row_expression(self, namespace):
+        """Return the Python expression of the representation of a row, adding the converters to `namespace`."""
+        items = []
+        for name, lookup, attribute, converter, nested in self.fields:
+            value = f'row[{lookup!r}]'
+            if nested is not None:
+                value = f'(None if {value} is None else {nested.get_row_expression(namespace)})'
+            elif converter is not None:
+                converter_name = f'convert_{len(namespace)}'
+                namespace[converter_name] = converter
+                value = f'{converter_name}({value}, current_timezone)'
+            items.append(f'{name!r}: {value}')
+        return '{' + ', '.join(items) + '}'
+
+    def compile_row_function(self, name):
+        """Return the function (row, current timezone) returning the representation of a row."""
+        namespace = {}
+        source = f'def from_row(row, current_timezone):\n    return {self.get_row_expression(namespace)}\n'
+        exec(compile(source, f'<compiled {name}>', 'exec'), namespace)
+        return namespace['from_row']
+
+    def from_instance(self, instance, current_timezone):
+        data = {}
+        for name, lookup, attribute, converter, nested in self.fields:
+            value = getattr(instance, attribute)
+            if value is None:
+                data[name] = None
+            elif nested is not None:
+                data[name] = nested.from_instance(value, current_timezone)
+            else:
+                data[name] = value if converter is None else converter(value, current_timezone)
+        return data
+
+    @timed('serializer')
+    def represent_rows(self, rows):
+        from_row, current_timezone = self.from_row, get_current_timezone()
+        return [from_row(row, current_timezone) for row in rows]
+
+    @timed('serializer')
+    def represent_instance(self, instance):
+        return self.from_instance(instance, get_current_timezone())
+
+
+@functools.lru_cache(maxsize=256)
+def compile_serializer(serializer_class, fields=None, expand=None):
+    """Return the CompiledSerializer of `serializer_class` with the sparse fieldset `fields` and `expand` (see
+    SparseFieldsMixin), None if it cannot be compiled. Built once for each fieldset in use.
+    """
+    options = {} if fields is None and expand is None else {'fields': fields, 'expand': expand}
+    try:
+        return CompiledSerializer(serializer_class(**options))
+    except NotCompilable:
+        return None
+
+
+class CompiledReadMixin:
+    """Serve the `list` and `retrieve` actions of a viewset with the compiled representation of its serializer.
+
+    To be placed before ObjectPermissionsListMixin, whose `list` is used when the serializer is not compiled.
+    """
+
+    compiled_read = True
+
+    def get_compiled_serializer(self):
+        if not self.compiled_read:
+            return None
+        # The fieldset of the request (see QuerysetShapingMixin).
+        return compile_serializer(self.get_serializer_class(), **self.get_fieldset())
+
+    def list(self, request, *args, **kwargs):
+        compiled = self.get_compiled_serializer()
+        if compiled is None:
+            return super(CompiledReadMixin, self).list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        # The keyset pagination reads its ordering fields on the rows to build the cursors.
+        lookups = compiled.lookups + list(getattr(self.pagination_class, 'ordering', ()))
+        rows = queryset.values(*dict.fromkeys(lookups))
+
+        page = self.paginate_queryset(rows)
+        rows = list(page if page is not None else rows)
+        data = compiled.represent_rows(rows)
+        self.add_object_permissions(data, queryset.model, [row[compiled.pk_lookup] for row in rows])
+
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+    def retrieve(self, request, *args, **kwargs):
+        compiled = self.get_compiled_serializer()
+        if compiled is None:
+            return super(CompiledReadMixin, self).retrieve(request, *args, **kwargs)
+        return Response(compiled.represent_instance(self.get_object()))
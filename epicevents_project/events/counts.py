@@ -0,0 +1,85 @@
+"""Counts of the rows of large querysets, exact only when it is cheap.
+
+A COUNT(*) reads all the rows it counts: on a large table, it costs as much as the page it goes with, or more. So the
+rows are first counted up to COUNT_EXACT_THRESHOLD (a count over a LIMIT subquery, which stops there). Below, the count
+is exact. Above, it is estimated by PostgreSQL: from pg_class.reltuples (the number of rows of the table maintained by
+ANALYZE) for a queryset without conditions, else from the number of rows expected by the plan of the query (EXPLAIN).
+The other databases have no such estimates: they count everything.
+
+Used by the keyset pagination of the API (`?with_count=true`, see pagination.py) and by the admin changelists
+(EstimatedCountPaginator).
+"""
+
+import json
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
+
+
+def get_threshold():
+    return getattr(settings, 'COUNT_EXACT_THRESHOLD', 10000)
+
+
+def get_table_estimate(connection, table):
+    """Return the number of rows of `table` according to the statistics of PostgreSQL, None if never analyzed."""
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass', [table])
+        row = cursor.fetchone()
+    # -1 (PostgreSQL 14+) or 0 before the first VACUUM or ANALYZE.
+    return int(row[0]) if row and row[0] > 0 else None
+
+
+def get_plan_estimate(connection, queryset):
+    """Return the number of rows that the planner of PostgreSQL expects from the query of `queryset`."""
+    sql, params = queryset.query.get_compiler(queryset.db).as_sql()
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def estimate_count(queryset):
+    """Return an estimate of the number of rows of `queryset`, None if the database cannot estimate it."""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    query = queryset.query
+    if not query.where and not query.distinct and not query.combinator:
+        estimate = get_table_estimate(connection, queryset.model._meta.db_table)
+        if estimate is not None:
+            return estimate
+    return get_plan_estimate(connection, queryset)
+
+
+def get_count(queryset, threshold=None):
+    """Return the number of rows of `queryset` and whether it is exact (see above)."""
+    threshold = get_threshold() if threshold is None else threshold
+    queryset = queryset.order_by()
+    count = queryset[:threshold + 1].count()
+    if count <= threshold:
+        return count, True
+    estimate = estimate_count(queryset)
+    if estimate is None:
+        return queryset.count(), True
+    # There are more rows than the threshold, whatever the estimate says.
+    return max(estimate, count), False
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator of the admin changelists counting the rows with get_count(). The last pages may be empty when the
+    count is estimated.
+    """
+
+    count_is_exact = True
+
+    @cached_property
+    def count(self):
+        if not isinstance(self.object_list, QuerySet):
+            return len(self.object_list)
+        count, self.count_is_exact = get_count(self.object_list)
+        return count
@@ -10,6 +10,14 @@ class UniqueConstraint(APIException):
     default_code = "Unique relation constraint"
 
 
+class CursorExpired(APIException):
+    """The cursor of a change feed is older than the tombstones kept."""
+
+    status_code = 410
+    default_detail = 'Cursor expired, read the changes again without cursor.'
+    default_code = 'cursor_expired'
+
+
 class NotFound(APIException):
     """Class to generate exceptions for not found object."""
 
@@ -0,0 +1,85 @@
+"""Export of contracts and events: GET /contracts/export/ and /events/export/, in CSV (default) or NDJSON with
+`?output=ndjson`.
+
+The filters and the visibility rules of the list apply. The rows are read as flat tuples of columns (no model
+instances, no nested serializers) from a server-side cursor and written to the response as they come, so the memory
+used does not depend on the number of rows exported.
+"""
+
+import csv
+from datetime import date, datetime
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+
+
+class Echo:
+    """A file-like object whose write() returns the value written, for csv.writer to yield lines."""
+
+    def write(self, value):
+        return value
+
+
+def to_csv_value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def csv_lines(columns, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow([to_csv_value(value) for value in row])
+
+
+def ndjson_lines(columns, rows):
+    encoder = DjangoJSONEncoder()
+    for row in rows:
+        yield encoder.encode(dict(zip(columns, row))) + '\n'
+
+
+OUTPUTS = {
+    'csv': ('text/csv', csv_lines),
+    'ndjson': ('application/x-ndjson', ndjson_lines),
+}
+
+
+class ExportViewSetMixin:
+    """Add the "export" action to a model viewset.
+
+    - export_columns: ((column name, field lookup), ...), the columns of the export,
+    - export_chunk_size: number of rows fetched from the database at a time.
+    """
+
+    export_columns = ()
+    export_chunk_size = 2000
+    export_query_param = 'output'
+    # Run by Django in its thread for synchronous views under ASGI (see async_views.py).
+    streaming_actions = ('export',)
+
+    @action(detail=False, methods=['get'], url_path='export')
+    def export(self, request, *args, **kwargs):
+        output = request.query_params.get(self.export_query_param, 'csv').lower()
+        if output not in OUTPUTS:
+            raise ValidationError({self.export_query_param: [f'Expected one of: {", ".join(OUTPUTS)}.']})
+        content_type, get_lines = OUTPUTS[output]
+
+        rows = self.get_export_queryset().iterator(chunk_size=self.export_chunk_size)
+        columns = [column for column, _ in self.export_columns]
+        response = StreamingHttpResponse(get_lines(columns, rows), content_type=content_type)
+        basename = self.get_serializer_class().Meta.model._meta.verbose_name_plural.replace(' ', '_')
+        response['Content-Disposition'] = f'attachment; filename="{basename}.{output}"'
+        return response
+
+    def get_export_queryset(self):
+        """The filtered list, ordered as the pages of the list, as tuples of the export columns."""
+        queryset = self.filter_queryset(self.get_queryset())
+        ordering = getattr(self.pagination_class, 'ordering', None)
+        if ordering:
+            queryset = queryset.order_by(*ordering)
+        # The rows are read after the view returns, out of the request: the database is chosen now (a replica).
+        queryset = queryset.using(queryset.db)
+        return queryset.values_list(*[lookup for _, lookup in self.export_columns])
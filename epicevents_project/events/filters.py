@@ -1,6 +1,7 @@
 """Implement the filter for Client, Contract and Event model."""
 
 import django_filters
+from django.db.models import Q
 from django_filters import CharFilter, NumberFilter, DateTimeFilter
 from .models import (
     Client,
@@ -9,12 +10,24 @@ from .models import (
 )
 
 
+def search_clients(queryset, value, prefix=''):
+    """Keep the rows whose client's first name, last name or email contains `value`.
+    On PostgreSQL, each condition is served by a trigram index (see migration 0004_search_indexes).
+    """
+    return queryset.filter(
+        Q(**{f'{prefix}first_name__icontains': value})
+        | Q(**{f'{prefix}last_name__icontains': value})
+        | Q(**{f'{prefix}email__icontains': value})
+    )
+
+
 class ClientFilter(django_filters.FilterSet):
     """Filters will be used with ClientViewSet."""
 
     first_name_contains = CharFilter(field_name="first_name", lookup_expr='icontains')
     last_name_contains = CharFilter(field_name="last_name", lookup_expr='icontains')
     email_contains = CharFilter(field_name="email", lookup_expr='icontains')
+    search = CharFilter(method='filter_search')
 
     class Meta:
         model = Client
@@ -24,9 +37,13 @@ class ClientFilter(django_filters.FilterSet):
             'last_name',
             'last_name_contains',
             'email',
-            'email_contains'
+            'email_contains',
+            'search'
         ]
 
+    def filter_search(self, queryset, name, value):
+        return search_clients(queryset, value)
+
 
 class ContractFilter(django_filters.FilterSet):
     """Filters will be used with ContractViewSet."""
@@ -38,6 +55,7 @@ class ContractFilter(django_filters.FilterSet):
     amount_max = NumberFilter(field_name="amount", lookup_expr='lte')
     date_created_min = DateTimeFilter(field_name='date_created', lookup_expr='gte')
     date_created_max = DateTimeFilter(field_name='date_created', lookup_expr='lte')
+    search = CharFilter(method='filter_search')
 
     class Meta:
         model = Contract
@@ -54,9 +72,12 @@ class ContractFilter(django_filters.FilterSet):
             'amount',
             'amount_min',
             'amount_max',
-
+            'search'
         ]
 
+    def filter_search(self, queryset, name, value):
+        return search_clients(queryset, value, prefix='client__')
+
 
 class EventFilter(django_filters.FilterSet):
     """Filters will be used with EventViewSet."""
@@ -73,6 +94,7 @@ class EventFilter(django_filters.FilterSet):
 
     event_date_min = DateTimeFilter(field_name='event_date', lookup_expr='gte')
     event_date_max = DateTimeFilter(field_name='event_date', lookup_expr='lte')
+    search = CharFilter(method='filter_search')
 
     class Meta:
         model = Event
@@ -85,5 +107,9 @@ class EventFilter(django_filters.FilterSet):
             'client__email_contains',
             'event_date',
             'event_date_min',
-            'event_date_max'
+            'event_date_max',
+            'search'
         ]
+
+    def filter_search(self, queryset, name, value):
+        return search_clients(queryset, value, prefix='contract__client__')
@@ -0,0 +1,241 @@
+"""Benchmark the API endpoints for each role, save the results as JSON and check the query budgets.
+
+The benchmark data (users of the three groups, clients with their contracts and events) is generated first if missing,
+deterministically from --seed. Then each operation (list, filter, retrieve, create, update) of each endpoint (clients,
+contracts, events) is called in process as a manager, a seller and a supporter. The writes are rolled back so that
+all the runs see the same data, and the response cache is cleared before each call so that the views do their work.
+
+The command fails if an operation runs more queries than its budget (QUERY_BUDGETS, or --budgets FILE with
+{"endpoint operation": max queries}). The operations refused to a role (403, 404) are measured but not checked.
+Compare two runs with --compare. Example:
+    python manage.py benchmark_api --users 50 --clients 20000 --output bench.json
+    python manage.py benchmark_api --users 50 --clients 20000 --compare bench.json
+"""
+
+import json
+import platform
+import re
+import subprocess
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from events.benchmarks import DataGenerator, call_view, time_calls
+from events.models import Contract, Event
+from events.views import ClientViewSet, ContractViewSet, EventViewSet
+
+ENDPOINTS = {
+    'clients': ClientViewSet,
+    'contracts': ContractViewSet,
+    'events': EventViewSet,
+}
+ACTIONS = {
+    'list': ('get', 'list'),
+    'filter': ('get', 'list'),
+    'retrieve': ('get', 'retrieve'),
+    'create': ('post', 'create'),
+    'update': ('put', 'update'),
+}
+FILTERS = {
+    'clients': {'last_name': 'Durand'},
+    'contracts': {'is_signed': 'true', 'amount_min': 5000},
+    'events': {'status': 'SCHEDULED'},
+}
+TRANSACTION_QUERY = re.compile(r'^(BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE SAVEPOINT)\b')
+# Maximum number of queries of each operation, whatever the role and the number of rows.
+QUERY_BUDGETS = {
+    'clients list': 2,
+    'clients filter': 2,
+    'clients retrieve': 2,
+    'clients create': 7,
+    'clients update': 4,
+    'contracts list': 2,
+    'contracts filter': 2,
+    'contracts retrieve': 2,
+    'contracts create': 13,
+    'contracts update': 4,
+    'events list': 2,
+    'events filter': 2,
+    'events retrieve': 2,
+    'events create': 14,
+    'events update': 4,
+}
+
+
+def get_targets(role, user, users):
+    """Return the objects that `user` can retrieve and update, and the data to create and update them."""
+    seller = users['seller'][0]
+    if role == 'supporter':
+        events = Event.objects.filter(support_contact=user)
+    else:
+        events = Event.objects.filter(contract__client__main_sales_contact=seller)
+    event = events.select_related('contract__client').order_by('pk').first()
+    contract = event.contract
+    client = contract.client
+    # A contract of the seller without event, for the creation of an event.
+    free_contract = Contract.objects.filter(
+        client__main_sales_contact=seller, event__isnull=True
+    ).order_by('pk').first() or contract
+    now = timezone.now()
+
+    client_data = {
+        'first_name': 'Bench', 'last_name': 'Client', 'email': 'new.client@bench.example', 'phone': '0102030405',
+        'mobile': '0602030405', 'company_name': 'Bench company', 'main_sales_contact': {'id': seller.pk},
+    }
+    contract_data = {
+        'client': {'id': client.pk}, 'sales_contact': {'id': seller.pk}, 'amount': 1234,
+        'payment_due': (now + timedelta(days=30)).isoformat(), 'is_signed': True,
+    }
+    event_data = {
+        'contract': {'id': free_contract.pk}, 'support_contact': {'id': users['supporter'][0].pk},
+        'attendees': 42, 'event_date': (now + timedelta(days=60)).isoformat(), 'notes': 'Bench notes',
+        'status': 'SCHEDULED',
+    }
+    return {
+        'clients': (client.pk, client_data),
+        'contracts': (contract.pk, contract_data),
+        'events': (event.pk, event_data),
+    }
+
+
+def get_git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = 'Measure the latency and the queries of the API operations for each role, and check the query budgets.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50, help='Number of benchmark users.')
+        parser.add_argument('--clients', type=int, default=20000, help='Number of benchmark clients.')
+        parser.add_argument('--seed', type=int, default=12)
+        parser.add_argument('--repeat', type=int, default=20, help='Number of calls per operation.')
+        parser.add_argument('--output', help='Write the results to this JSON file.')
+        parser.add_argument('--compare', help='JSON results of a previous run to compare with.')
+        parser.add_argument('--budgets', help='JSON file of query budgets, overriding the default ones.')
+
+    def handle(self, *args, **options):
+        generator = DataGenerator(seed=options['seed'])
+        counts = generator.generate(options['users'], options['clients'])
+        if any(counts.values()):
+            self.stdout.write(f'Benchmark data created: {counts}')
+        users = generator.get_users(options['users'])
+
+        budgets = dict(QUERY_BUDGETS)
+        if options['budgets']:
+            with open(options['budgets']) as file:
+                budgets.update(json.load(file))
+
+        results = []
+        self.stdout.write(
+            f'{"operation":<20} {"role":<10} {"status":>6} {"queries":>7} {"budget":>6} {"median ms":>10} '
+            f'{"p95 ms":>10} {"req/s":>8}'
+        )
+        for role, role_users in users.items():
+            user = role_users[0]
+            targets = get_targets(role, user, users)
+            for endpoint, viewset in ENDPOINTS.items():
+                for operation, (method, action) in ACTIONS.items():
+                    result = self.run_operation(
+                        viewset, endpoint, operation, method, action, user, targets[endpoint], options['repeat'],
+                    )
+                    # The budgets are those of the operations done, not refused.
+                    budget = budgets.get(f'{endpoint} {operation}') if result['status'] < 400 else None
+                    result.update({'role': role, 'budget': budget})
+                    results.append(result)
+                    self.stdout.write(
+                        f'{endpoint + " " + operation:<20} {role:<10} {result["status"]:>6} {result["queries"]:>7} '
+                        f'{result["budget"] or "-":>6} {result["median_ms"]:>10.2f} {result["p95_ms"]:>10.2f} '
+                        f'{result["requests_per_second"]:>8.1f}'
+                    )
+
+        report = {
+            'commit': get_git_commit(),
+            'date': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'options': {name: options[name] for name in ('users', 'clients', 'seed', 'repeat')},
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(report, file, indent=2)
+            self.stdout.write(f'Results written to {options["output"]}')
+        if options['compare']:
+            self.compare(results, options['compare'])
+
+        over_budget = [
+            f'{result["endpoint"]} {result["operation"]} as {result["role"]}: {result["queries"]} queries '
+            f'> {result["budget"]}'
+            for result in results if result['budget'] is not None and result['queries'] > result['budget']
+        ]
+        if over_budget:
+            raise CommandError('Query budget exceeded:\n' + '\n'.join(over_budget))
+
+    @staticmethod
+    def run_operation(viewset, endpoint, operation, method, action, user, target, repeat):
+        pk, data = target
+        view = viewset.as_view({method: action})
+        path = f'/{endpoint}/'
+        kwargs = {}
+        if action in ('retrieve', 'update'):
+            path += f'{pk}/'
+            kwargs['pk'] = pk
+        if operation == 'filter':
+            data = FILTERS[endpoint]
+        elif method == 'get':
+            data = None
+
+        def call():
+            cache.clear()
+            if method == 'get':
+                return call_view(view, user, path, method=method, data=data, **kwargs)
+            # The views pop the related objects from the data.
+            request_data = {name: dict(value) if isinstance(value, dict) else value for name, value in data.items()}
+            with transaction.atomic():
+                response = call_view(view, user, path, method=method, data=request_data, **kwargs)
+                transaction.set_rollback(True)
+            return response
+
+        with CaptureQueriesContext(connection) as context:
+            response = call()
+        # Not the transaction of the rollback (BEGIN and ROLLBACK, or savepoints when the command runs in a
+        # transaction, as in the tests).
+        queries = [query for query in context.captured_queries if not TRANSACTION_QUERY.match(query['sql'])]
+        stats = time_calls(call, repeat)
+        return {
+            'endpoint': endpoint,
+            'operation': operation,
+            'status': response.status_code,
+            'queries': len(queries),
+            'median_ms': stats['median'],
+            'p95_ms': stats['p95'],
+            'requests_per_second': 1000 / stats['mean'],
+        }
+
+    def compare(self, results, path):
+        with open(path) as file:
+            previous = {
+                (result['endpoint'], result['operation'], result['role']): result
+                for result in json.load(file)['results']
+            }
+        self.stdout.write(f'\n{"operation":<20} {"role":<10} {"queries":>9} {"median ms":>20}')
+        for result in results:
+            before = previous.get((result['endpoint'], result['operation'], result['role']))
+            if before is None:
+                continue
+            change = (result['median_ms'] - before['median_ms']) / before['median_ms'] * 100
+            self.stdout.write(
+                f'{result["endpoint"] + " " + result["operation"]:<20} {result["role"]:<10} '
+                f'{before["queries"]:>4} {result["queries"]:>4} '
+                f'{before["median_ms"]:>7.2f} {result["median_ms"]:>7.2f} {change:>+5.0f}%'
+            )
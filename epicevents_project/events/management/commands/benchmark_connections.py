@@ -0,0 +1,57 @@
+"""Compare the latency of short requests with a new PostgreSQL connection each time and with the connection pool
+(see epicevents_project/db_backends/pooled_postgresql). Each simulated request connects, runs a small query and
+closes its connection, as Django does with CONN_MAX_AGE = 0. Example:
+    python manage.py benchmark_connections --requests 500
+"""
+
+import copy
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from epicevents_project.db_backends.pooled_postgresql.pool import get_pool_stats
+from events.benchmarks import time_calls
+
+ENGINES = {
+    'new connection': 'django.db.backends.postgresql',
+    'pooled': 'epicevents_project.db_backends.pooled_postgresql',
+}
+
+
+def add_alias(alias, settings_dict):
+    """Add a database alias at run time, as if it were in settings.DATABASES."""
+    connections.databases[alias] = settings_dict
+    connections.ensure_defaults(alias)
+    connections.prepare_test_settings(alias)
+
+
+class Command(BaseCommand):
+    help = 'Time short requests with a new connection each time and with the connection pool.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='PostgreSQL database to connect to.')
+        parser.add_argument('--requests', type=int, default=500, help='Number of requests per mode.')
+
+    def handle(self, *args, **options):
+        settings_dict = connections.databases[options['database']]
+        if connections[options['database']].vendor != 'postgresql':
+            raise CommandError('The database must be a PostgreSQL database.')
+
+        self.stdout.write(f'{"mode":<16} {"median ms":>10} {"p95 ms":>10} {"max ms":>10}')
+        for mode, engine in ENGINES.items():
+            alias = 'benchmark_' + mode.replace(' ', '_')
+            add_alias(alias, {**copy.deepcopy(settings_dict), 'ENGINE': engine, 'CONN_MAX_AGE': 0})
+            connection = connections[alias]
+
+            def request():
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT id FROM events_client ORDER BY id LIMIT 1')
+                    cursor.fetchall()
+                connection.close()
+
+            request()  # Creates the pool, not timed.
+            stats = time_calls(request, options['requests'])
+            self.stdout.write(f'{mode:<16} {stats["median"]:>10.2f} {stats["p95"]:>10.2f} {stats["max"]:>10.2f}')
+
+        for pool_stats in get_pool_stats():
+            self.stdout.write(f'Pool statistics: {pool_stats}')
@@ -0,0 +1,63 @@
+"""Measure the latency of the filtered list calls of the API on a large table of clients.
+
+The missing benchmark users and clients (with their contracts and events, see events/benchmarks.py) are created first
+in the configured database, so the first run at 10^6 clients takes a while (or run seed_data first). Example:
+    python manage.py benchmark_filters --clients 1000000 --repeat 20
+"""
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from events.benchmarks import DataGenerator, call_view, count_queries, time_calls
+from events.views import ClientViewSet, ContractViewSet, EventViewSet
+
+
+def get_scenarios():
+    now = timezone.now()
+    return [
+        ('clients first_name_contains', ClientViewSet, '/clients/', {'first_name_contains': 'nna'}),
+        ('clients email_contains', ClientViewSet, '/clients/', {'email_contains': '4242'}),
+        ('clients search', ClientViewSet, '/clients/', {'search': 'durand'}),
+        ('contracts client__last_name_contains', ContractViewSet, '/contracts/', {
+            'client__last_name_contains': 'ober',
+        }),
+        ('contracts amount range', ContractViewSet, '/contracts/', {'amount_min': 5000, 'amount_max': 5010}),
+        ('contracts date_created range', ContractViewSet, '/contracts/', {
+            'date_created_min': (now - timedelta(days=3)).isoformat(), 'date_created_max': now.isoformat(),
+        }),
+        ('events event_date range', EventViewSet, '/events/', {
+            'event_date_min': (now + timedelta(days=10)).isoformat(),
+            'event_date_max': (now + timedelta(days=11)).isoformat(),
+        }),
+        ('events client__email_contains', EventViewSet, '/events/', {'client__email_contains': '777'}),
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Create benchmark clients if needed, then time the filtered list calls of the API.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=10 ** 6, help='Number of benchmark clients.')
+        parser.add_argument('--users', type=int, default=2000, help='Number of benchmark users.')
+        parser.add_argument('--repeat', type=int, default=20, help='Number of calls per scenario.')
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=12)
+
+    def handle(self, *args, **options):
+        generator = DataGenerator(options['seed'], options['batch_size'])
+        counts = generator.generate(options['users'], options['clients'])
+        if any(counts.values()):
+            self.stdout.write(f'Benchmark data created: {counts}')
+        manager = generator.get_users(options['users'])['manager'][0]
+
+        self.stdout.write(f'{"scenario":<40} {"rows":>5} {"queries":>7} {"median ms":>10} {"p95 ms":>10}')
+        for name, viewset, path, params in get_scenarios():
+            view = viewset.as_view({'get': 'list'})
+            response, queries = count_queries(lambda: call_view(view, manager, path, data=params))
+            stats = time_calls(lambda: call_view(view, manager, path, data=params), options['repeat'])
+            self.stdout.write(
+                f'{name:<40} {len(response.data["results"]):>5} {queries:>7} '
+                f'{stats["median"]:>10.1f} {stats["p95"]:>10.1f}'
+            )
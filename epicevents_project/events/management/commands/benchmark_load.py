@@ -0,0 +1,142 @@
+"""Load test a running server with many concurrent keep-alive connections, to compare the deployments. Example:
+    gunicorn epicevents_project.wsgi --workers 4 --threads 8 --bind 127.0.0.1:8000
+    uvicorn epicevents_project.asgi:application --workers 4 --port 8001
+    python manage.py benchmark_load --url http://127.0.0.1:8000 --username manager --password ... --concurrency 500
+    python manage.py benchmark_load --url http://127.0.0.1:8001 --username manager --password ... --concurrency 500
+"""
+
+import asyncio
+import json
+import statistics
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+DEFAULT_PATHS = ['/clients/', '/contracts/', '/events/']
+
+
+class Connection:
+    """A minimal HTTP/1.1 keep-alive client connection."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = self.writer = None
+
+    async def request(self, method, path, headers=None, body=b''):
+        """Send a request, return (status, body). Reconnect if the server closed the connection."""
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+        lines = [f'{method} {path} HTTP/1.1', f'Host: {self.host}:{self.port}', f'Content-Length: {len(body)}']
+        lines += [f'{name}: {value}' for name, value in (headers or {}).items()]
+        self.writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode() + body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            await self.close()
+            raise ConnectionError('Connection closed by the server')
+        status = int(status_line.split()[1])
+
+        response_headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+
+        if response_headers.get('transfer-encoding') == 'chunked':
+            body = b''
+            while True:
+                size = int((await self.reader.readline()).strip(), 16)
+                body += await self.reader.readexactly(size + 2)
+                if size == 0:
+                    break
+        elif 'content-length' in response_headers:
+            body = await self.reader.readexactly(int(response_headers['content-length']))
+        else:
+            body = await self.reader.read()
+
+        if response_headers.get('connection', '').lower() == 'close':
+            await self.close()
+        return status, body
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+
+async def login(host, port, username, password):
+    connection = Connection(host, port)
+    status, body = await connection.request(
+        'POST', '/login/', {'Content-Type': 'application/json'},
+        json.dumps({'username': username, 'password': password}).encode(),
+    )
+    await connection.close()
+    if status != 200:
+        raise CommandError(f'Login failed ({status}): {body[:200]!r}')
+    return json.loads(body)['access']
+
+
+async def run_load(host, port, paths, headers, concurrency, total):
+    """Send `total` requests over `concurrency` connections, cycling through `paths`.
+    Return the latencies (seconds), the number of errors and the elapsed time.
+    """
+    latencies, errors = [], 0
+    counter = iter(range(total))
+
+    async def client():
+        nonlocal errors
+        connection = Connection(host, port)
+        for index in counter:
+            start = time.perf_counter()
+            try:
+                status, _ = await connection.request('GET', paths[index % len(paths)], headers)
+            except (ConnectionError, OSError, asyncio.IncompleteReadError):
+                errors += 1
+                await connection.close()
+                continue
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors += 1
+        await connection.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*[client() for _ in range(concurrency)])
+    return latencies, errors, time.perf_counter() - start
+
+
+class Command(BaseCommand):
+    help = 'Send concurrent GET requests to a running server and report the requests/s and the latencies.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Base url of the server.')
+        parser.add_argument('--path', action='append', dest='paths', help='Path to request (repeatable).')
+        parser.add_argument('--username', required=True)
+        parser.add_argument('--password', required=True)
+        parser.add_argument('--concurrency', type=int, default=500, help='Number of concurrent connections.')
+        parser.add_argument('--requests', type=int, default=10000, help='Total number of requests.')
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['url'])
+        host, port = url.hostname, url.port or 80
+        paths = options['paths'] or DEFAULT_PATHS
+
+        access = asyncio.run(login(host, port, options['username'], options['password']))
+        headers = {'Authorization': f'Bearer {access}', 'Accept': 'application/json'}
+        latencies, errors, elapsed = asyncio.run(
+            run_load(host, port, paths, headers, options['concurrency'], options['requests'])
+        )
+        if not latencies:
+            raise CommandError('No response received.')
+
+        latencies.sort()
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(latencies)} responses ({errors} errors) in {elapsed:.1f}s: {len(latencies) / elapsed:.1f} '
+            f'requests/s, median {statistics.median(latencies) * 1000:.1f} ms, p99 {p99 * 1000:.1f} ms'
+        ))
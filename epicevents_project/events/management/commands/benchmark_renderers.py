@@ -0,0 +1,76 @@
+"""Compare the renderers of the API (encoding time and size) and the compressions of their output, on a list of events
+serialized as by GET /events/ (each event embeds its contract, client and users).
+
+The benchmark data is generated first if missing, deterministically from --seed (about 0.84 event per client, see
+events/benchmarks.py). The renderers and compressions whose library is not installed are skipped. Example:
+    python manage.py benchmark_renderers --clients 12500 --events 10000
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.text import compress_string
+from rest_framework.renderers import JSONRenderer
+
+from epicevents_project import compression, renderers
+from events.benchmarks import DataGenerator, time_calls
+from events.models import Event
+from events.serializers import EventSerializer
+from events.views import EventViewSet
+
+
+def get_renderers():
+    available = {'json': JSONRenderer()}
+    if renderers.orjson is not None:
+        available['orjson'] = renderers.ORJSONRenderer()
+    if renderers.msgpack is not None:
+        available['msgpack'] = renderers.MessagePackRenderer()
+    return available
+
+
+def get_compressions():
+    available = {'gzip': compress_string}
+    if compression.brotli is not None:
+        available['br'] = compression.COMPRESSORS['br'][0]
+    return available
+
+
+class Command(BaseCommand):
+    help = 'Measure the encoding time and the size of a list of events for each renderer and compression.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50, help='Number of benchmark users.')
+        parser.add_argument('--clients', type=int, default=12500, help='Number of benchmark clients.')
+        parser.add_argument('--seed', type=int, default=12)
+        parser.add_argument('--events', type=int, default=10000, help='Number of events of the list.')
+        parser.add_argument('--repeat', type=int, default=10, help='Number of encodings per renderer.')
+
+    def handle(self, *args, **options):
+        counts = DataGenerator(seed=options['seed']).generate(options['users'], options['clients'])
+        if any(counts.values()):
+            self.stdout.write(f'Benchmark data created: {counts}')
+
+        events = Event.objects.select_related(*EventViewSet.select_related_fields).order_by('pk')[:options['events']]
+        data = EventSerializer(events, many=True).data
+        if len(data) < options['events']:
+            self.stdout.write(self.style.WARNING(
+                f'Only {len(data)} events: increase --clients to list {options["events"]} events.'
+            ))
+
+        available = get_renderers()
+        outputs = {name: renderer.render(data) for name, renderer in available.items()}
+        if 'orjson' in outputs and outputs['orjson'] != outputs['json']:
+            raise CommandError('The output of ORJSONRenderer differs from the one of JSONRenderer.')
+        compressions = get_compressions()
+
+        self.stdout.write(f'{len(data)} events')
+        self.stdout.write(
+            f'{"renderer":<10} {"encode ms":>10} {"bytes":>10}'
+            + ''.join(f' {name + " ms":>9} {name + " bytes":>10}' for name in compressions)
+        )
+        for name, renderer in available.items():
+            encode = time_calls(lambda: renderer.render(data), options['repeat'])
+            line = f'{name:<10} {encode["median"]:>10.1f} {len(outputs[name]):>10}'
+            for compress in compressions.values():
+                compressed = compress(outputs[name])
+                timing = time_calls(lambda: compress(outputs[name]), options['repeat'])
+                line += f' {timing["median"]:>9.1f} {len(compressed):>10}'
+            self.stdout.write(line)
@@ -0,0 +1,65 @@
+"""Compare the read path of the serializers with the compiled one (see events/compiled.py) on the lists of clients,
+contracts and events: fetching and representing --rows objects, and checking that both render the same JSON.
+
+The benchmark data is generated first if missing, deterministically from --seed. Example:
+    python manage.py benchmark_serializers --clients 12500 --rows 10000 --min-speedup 5
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from events.benchmarks import DataGenerator, time_calls
+from events.compiled import compile_serializer
+from events.views import ClientViewSet, ContractViewSet, EventViewSet
+
+VIEWSETS = {
+    'clients': ClientViewSet,
+    'contracts': ContractViewSet,
+    'events': EventViewSet,
+}
+
+
+class Command(BaseCommand):
+    help = 'Measure the speedup of the compiled read path over the serializers on the lists.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50, help='Number of benchmark users.')
+        parser.add_argument('--clients', type=int, default=12500, help='Number of benchmark clients.')
+        parser.add_argument('--seed', type=int, default=12)
+        parser.add_argument('--rows', type=int, default=10000, help='Number of objects of each list.')
+        parser.add_argument('--repeat', type=int, default=5, help='Number of runs of each read path.')
+        parser.add_argument('--min-speedup', type=float, help='Fail if a list is not that many times faster.')
+
+    def handle(self, *args, **options):
+        counts = DataGenerator(seed=options['seed']).generate(options['users'], options['clients'])
+        if any(counts.values()):
+            self.stdout.write(f'Benchmark data created: {counts}')
+
+        renderer = JSONRenderer()
+        self.stdout.write(f'{"list":<10} {"rows":>6} {"serializer ms":>14} {"compiled ms":>12} {"speedup":>8}')
+        slow = []
+        for name, viewset in VIEWSETS.items():
+            serializer_class = viewset.serializer_class
+            compiled = compile_serializer(serializer_class)
+            ordering = viewset.pagination_class.ordering
+            queryset = serializer_class.Meta.model.objects.order_by(*ordering)[:options['rows']]
+
+            def read_objects():
+                objects = queryset.select_related(*viewset.select_related_fields)
+                return serializer_class(objects, many=True).data
+
+            def read_rows():
+                return compiled.represent_rows(queryset.values(*compiled.lookups))
+
+            if renderer.render(read_objects()) != renderer.render(read_rows()):
+                raise CommandError(f'The compiled representation of the {name} differs from the serializer one.')
+            rows = queryset.count()
+            before = time_calls(read_objects, options['repeat'])['median']
+            after = time_calls(read_rows, options['repeat'])['median']
+            speedup = before / after
+            self.stdout.write(f'{name:<10} {rows:>6} {before:>14.1f} {after:>12.1f} {speedup:>7.1f}x')
+            if options['min_speedup'] and speedup < options['min_speedup']:
+                slow.append(f'{name}: {speedup:.1f}x')
+
+        if slow:
+            raise CommandError(f'Speedup below {options["min_speedup"]}x: {", ".join(slow)}')
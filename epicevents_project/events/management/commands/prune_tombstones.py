@@ -0,0 +1,35 @@
+"""Delete the tombstones of the change feeds older than CHANGE_FEED_RETENTION_DAYS, by batches (see events/changes.py).
+To run periodically, e.g. every day from cron:
+    python manage.py prune_tombstones
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from events.changes import get_retention
+from events.models import Tombstone
+
+
+class Command(BaseCommand):
+    help = 'Delete the tombstones of the change feeds older than the retention.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='Number of tombstones deleted per query.')
+
+    def handle(self, *args, **options):
+        expired = Tombstone.objects.filter(date_deleted__lt=timezone.now() - get_retention())
+
+        start = time.perf_counter()
+        count = 0
+        while True:
+            ids = list(expired.values_list('id', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            Tombstone.objects.filter(id__in=ids).delete()
+            count += len(ids)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{count} expired tombstones deleted in {time.perf_counter() - start:.1f}s.'
+        ))
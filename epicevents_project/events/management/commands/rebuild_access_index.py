@@ -0,0 +1,21 @@
+"""Rebuild the access index from scratch (see events/access_index.py)."""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from events.access_index import rebuild_access_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the access index of the clients, contracts and events from scratch.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='Number of objects read per query.')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        count = rebuild_access_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Access index rebuilt: {count} rows in {time.perf_counter() - start:.1f}s.'
+        ))
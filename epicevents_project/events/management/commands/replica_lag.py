@@ -0,0 +1,16 @@
+"""Print the replication lag of the read replicas (see epicevents_project/db_router.py)."""
+
+from django.core.management.base import BaseCommand
+
+from epicevents_project.db_router import get_replicas_lag
+
+
+class Command(BaseCommand):
+    help = 'Print the replication lag of each read replica, in seconds.'
+
+    def handle(self, *args, **options):
+        lags = get_replicas_lag()
+        if not lags:
+            self.stdout.write('No replica configured (DATABASE_REPLICA_HOSTS).')
+        for alias, lag in lags.items():
+            self.stdout.write(f'{alias}: {"unknown" if lag is None else f"{lag:.3f}s"}')
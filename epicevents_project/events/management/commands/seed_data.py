@@ -0,0 +1,56 @@
+"""Fill the database with synthetic users, clients, contracts and events, from 10^4 to 10^7 clients, and report the
+insertion throughput. The data is deterministic for a given --seed (see events/benchmarks.py), and a run only adds the
+clients missing to reach --clients. Example:
+    python manage.py seed_data --clients 1000000 --users 2000
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from events.access_index import rebuild_access_index
+from events.benchmarks import DataGenerator
+
+
+class Command(BaseCommand):
+    help = 'Generate benchmark users, clients, contracts and events at scale and report the rows per second.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=10 ** 4, help='Number of benchmark clients.')
+        parser.add_argument('--users', type=int, help='Number of benchmark users (default: one per 500 clients).')
+        parser.add_argument('--seed', type=int, default=12)
+        parser.add_argument('--batch-size', type=int, default=10000, help='Number of clients written at once.')
+        parser.add_argument('--no-copy', action='store_true', help='Use bulk_create() even on PostgreSQL.')
+
+    def handle(self, *args, **options):
+        users = options['users'] or max(10, options['clients'] // 500)
+        generator = DataGenerator(options['seed'], options['batch_size'], use_copy=not options['no_copy'])
+        method = 'COPY' if generator.use_copy else 'bulk_create()'
+        self.stdout.write(f'Seeding {options["clients"]} clients and {users} users with {method}...')
+
+        start = time.perf_counter()
+
+        def progress(counts):
+            rows = sum(counts.values())
+            self.stdout.write(
+                f'  {counts["clients"]} clients, {counts["contracts"]} contracts, {counts["events"]} events: '
+                f'{rows / (time.perf_counter() - start):.0f} rows/s'
+            )
+
+        counts = generator.generate(users, options['clients'], rebuild_index=False, progress=progress)
+        elapsed = time.perf_counter() - start
+        rows = sum(counts.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'{rows} rows inserted in {elapsed:.1f}s: {rows / elapsed if elapsed else 0:.0f} rows/s '
+            f'({counts["clients"]} clients, {counts["contracts"]} contracts, {counts["events"]} events).'
+        ))
+
+        if rows:
+            # Neither bulk_create() nor COPY send the signals maintaining the access index.
+            start = time.perf_counter()
+            count = rebuild_access_index(batch_size=options['batch_size'])
+            elapsed = time.perf_counter() - start
+            self.stdout.write(self.style.SUCCESS(
+                f'Access index rebuilt: {count} rows in {elapsed:.1f}s '
+                f'({count / elapsed if elapsed else 0:.0f} rows/s).'
+            ))
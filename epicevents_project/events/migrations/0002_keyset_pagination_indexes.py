@@ -0,0 +1,25 @@
+# Generated by Django 3.2.5 on 2026-10-17 20:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['date_created', 'id'], name='client_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contract',
+            index=models.Index(fields=['date_created', 'id'], name='contract_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['event_date', 'contract'], name='event_date_contract_idx'),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 3.2.5 on 2026-10-17 20:29
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_access_index(apps, schema_editor):
+    """Index the existing clients, contracts and events (same rows as events/access_index.py)."""
+    AccessIndex = apps.get_model('events', 'AccessIndex')
+    Client = apps.get_model('events', 'Client')
+    Contract = apps.get_model('events', 'Contract')
+    Event = apps.get_model('events', 'Event')
+
+    rows = set()
+    for client_id, user_id in Client.objects.values_list('id', 'main_sales_contact_id'):
+        rows.add((user_id, 'client', client_id, 'main_sales_contact'))
+    for contract_id, client_id, sales_contact_id, main_sales_contact_id in Contract.objects.values_list(
+            'id', 'client_id', 'sales_contact_id', 'client__main_sales_contact_id'):
+        rows.add((sales_contact_id, 'client', client_id, 'sales_contact'))
+        rows.add((sales_contact_id, 'contract', contract_id, 'sales_contact'))
+        rows.add((main_sales_contact_id, 'contract', contract_id, 'main_sales_contact'))
+    for event_id, client_id, support_contact_id, sales_contact_id, main_sales_contact_id in Event.objects.values_list(
+            'pk', 'contract__client_id', 'support_contact_id', 'contract__sales_contact_id',
+            'contract__client__main_sales_contact_id'):
+        rows.add((support_contact_id, 'client', client_id, 'support_contact'))
+        rows.add((support_contact_id, 'event', event_id, 'support_contact'))
+        rows.add((sales_contact_id, 'event', event_id, 'sales_contact'))
+        rows.add((main_sales_contact_id, 'event', event_id, 'main_sales_contact'))
+
+    AccessIndex.objects.bulk_create([
+        AccessIndex(user_id=user_id, object_type=object_type, object_id=object_id, relation=relation)
+        for user_id, object_type, object_id, relation in rows
+        if user_id is not None and object_id is not None
+    ], batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('events', '0002_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccessIndex',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_type', models.CharField(choices=[('client', 'Client'), ('contract', 'Contract'), ('event', 'Event')], max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('relation', models.CharField(choices=[('main_sales_contact', 'Main sales contact'), ('sales_contact', 'Sales contact'), ('support_contact', 'Support contact')], max_length=20)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'access index',
+                'verbose_name_plural': 'access index',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='accessindex',
+            index=models.Index(fields=['object_type', 'object_id'], name='access_object_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='accessindex',
+            constraint=models.UniqueConstraint(fields=('user', 'object_type', 'object_id', 'relation'), name='unique_access'),
+        ),
+        migrations.RunPython(build_access_index, reverse_code=migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 3.2.5 on 2026-10-17 20:32
+
+from django.db import migrations, models
+
+# Columns searched with the "contains" filters (icontains). On PostgreSQL, icontains is translated to
+# UPPER(column::text) LIKE UPPER('%...%'), which a trigram GIN index on the same expression can serve.
+# The other databases keep the B-tree indexes only.
+TRIGRAM_COLUMNS = [
+    ('events_client', 'first_name'),
+    ('events_client', 'last_name'),
+    ('events_client', 'email'),
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table, column in TRIGRAM_COLUMNS:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {table}_{column}_trgm_idx ON {table} '
+            f'USING gin ((UPPER({column}::text)) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table, column in TRIGRAM_COLUMNS:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {table}_{column}_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0003_access_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['first_name'], name='client_first_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['last_name'], name='client_last_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['email'], name='client_email_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contract',
+            index=models.Index(fields=['amount'], name='contract_amount_idx'),
+        ),
+        migrations.RunPython(create_trigram_indexes, reverse_code=drop_trigram_indexes),
+    ]
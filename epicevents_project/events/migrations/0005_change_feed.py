@@ -0,0 +1,51 @@
+# Generated by Django 3.2.5 on 2026-10-17 21:03
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('events', '0004_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_type', models.CharField(choices=[('client', 'Client'), ('contract', 'Contract'), ('event', 'Event')], max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('date_deleted', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'tombstone',
+                'verbose_name_plural': 'tombstones',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='contract',
+            index=models.Index(fields=['date_updated', 'id'], name='contract_updated_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['date_updated', 'contract'], name='event_updated_contract_idx'),
+        ),
+        migrations.AddField(
+            model_name='tombstone',
+            name='user',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['object_type', 'user', 'date_deleted', 'id'], name='tombstone_feed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['date_deleted'], name='tombstone_date_idx'),
+        ),
+    ]
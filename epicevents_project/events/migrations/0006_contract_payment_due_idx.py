@@ -0,0 +1,17 @@
+# Generated by Django 3.2.5 on 2026-10-17 21:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0005_change_feed'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contract',
+            index=models.Index(fields=['payment_due'], name='contract_payment_due_idx'),
+        ),
+    ]
@@ -2,15 +2,48 @@
 - Client
 - Contract
 - Event
+- AccessIndex
+- Tombstone
 """
 
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.utils import timezone
 
 User = get_user_model()
 
 
-class Client(models.Model):
+class TrackedFieldsMixin:
+    """Remember the values of `tracked_fields` as loaded from the database, to know after a save if they changed."""
+
+    tracked_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_tracked_fields()
+        return instance
+
+    def remember_tracked_fields(self):
+        self._tracked_values = {name: self.__dict__[name] for name in self.tracked_fields if name in self.__dict__}
+
+    def has_tracked_fields_changed(self):
+        tracked_values = getattr(self, '_tracked_values', {})
+        return any(
+            name not in tracked_values or tracked_values[name] != getattr(self, name)
+            for name in self.tracked_fields
+        )
+
+
+class UserRelationsMixin:
+    """Give the relations of a user with the object, read from the access index (see object_permissions.py)."""
+
+    def get_user_relations(self, user):
+        from .object_permissions import get_user_relations
+        return get_user_relations(user, self)
+
+
+class Client(TrackedFieldsMixin, UserRelationsMixin, models.Model):
     """Client model"""
 
     first_name = models.CharField(max_length=25, blank=False, null=False)
@@ -25,10 +58,20 @@ class Client(models.Model):
     is_official_client = models.BooleanField(default=False)  # is potential or final client
     main_sales_contact = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name="clients")
 
+    tracked_fields = ('main_sales_contact_id',)
+
     class Meta:
         app_label = 'events'
         verbose_name = 'client'
         verbose_name_plural = 'clients'
+        indexes = [
+            # Ordering of the keyset pagination.
+            models.Index(fields=['date_created', 'id'], name='client_created_id_idx'),
+            # Exact filters. The "contains" filters use trigram indexes on PostgreSQL (see migration 0004).
+            models.Index(fields=['first_name'], name='client_first_name_idx'),
+            models.Index(fields=['last_name'], name='client_last_name_idx'),
+            models.Index(fields=['email'], name='client_email_idx'),
+        ]
 
     def __str__(self):
         return f'Client\'s name: {self.first_name} {self.last_name}. Main seller: {self.main_sales_contact}'
@@ -37,16 +80,14 @@ class Client(models.Model):
         return user == self.main_sales_contact
 
     def is_user_in_sales_contacts_of_client(self, user):
-        return user == self.main_sales_contact or self.contracts.filter(sales_contact=user).exists()
+        relations = self.get_user_relations(user)
+        return AccessIndex.Relation.MAIN_SALES_CONTACT in relations or AccessIndex.Relation.SALES_CONTACT in relations
 
-    # obj.contracts.filter(sales_contact=user) ok for for
     def is_user_in_support_contacts_of_client(self, user):
-        if self.contracts.filter(event__support_contact=user).exists():
-            return True
-        return False
+        return AccessIndex.Relation.SUPPORT_CONTACT in self.get_user_relations(user)
 
 
-class Contract(models.Model):
+class Contract(TrackedFieldsMixin, UserRelationsMixin, models.Model):
     """ Contract model"""
 
     sales_contact = models.ForeignKey(User, on_delete=models.SET_NULL,
@@ -58,25 +99,37 @@ class Contract(models.Model):
     amount = models.FloatField(null=False, blank=False)
     payment_due = models.DateTimeField(null=False, blank=False)
 
+    tracked_fields = ('client_id', 'sales_contact_id')
+
     class Meta:
         app_label = 'events'
         verbose_name = 'contract'
         verbose_name_plural = 'contracts'
+        indexes = [
+            # Ordering of the keyset pagination, also used by the date_created range filters.
+            models.Index(fields=['date_created', 'id'], name='contract_created_id_idx'),
+            models.Index(fields=['amount'], name='contract_amount_idx'),
+            # Date filter of the admin changelist.
+            models.Index(fields=['payment_due'], name='contract_payment_due_idx'),
+            # Change feed (see changes.py).
+            models.Index(fields=['date_updated', 'id'], name='contract_updated_id_idx'),
+        ]
 
     def __str__(self):
         return f'Contract id: {self.id}. {self.client}. Signed with seller: {self.sales_contact}.'
 
     def is_user_in_main_sales_contacts_of_contract(self, user):
-        return user == self.client.main_sales_contact
+        return AccessIndex.Relation.MAIN_SALES_CONTACT in self.get_user_relations(user)
 
     def is_user_in_sales_contacts_of_contract(self, user):
         """A contract has one sales_contact (who signs the contract)
         and one main_sales_contact (related with client).
         """
-        return user == self.sales_contact or user == self.client.main_sales_contact
+        relations = self.get_user_relations(user)
+        return AccessIndex.Relation.MAIN_SALES_CONTACT in relations or AccessIndex.Relation.SALES_CONTACT in relations
 
 
-class Event(models.Model):
+class Event(TrackedFieldsMixin, UserRelationsMixin, models.Model):
     """Event model."""
 
     class StatusChoice(models.TextChoices):
@@ -95,21 +148,90 @@ class Event(models.Model):
     event_date = models.DateTimeField(null=False, blank=False)
     notes = models.TextField(null=False, blank=False)
 
+    tracked_fields = ('support_contact_id',)
+
     class Meta:
         app_label = 'events'
         verbose_name = 'event'
         verbose_name_plural = 'events'
+        indexes = [
+            # Ordering of the keyset pagination, also used by the event_date range filters.
+            models.Index(fields=['event_date', 'contract'], name='event_date_contract_idx'),
+            # Change feed (see changes.py).
+            models.Index(fields=['date_updated', 'contract'], name='event_updated_contract_idx'),
+        ]
 
     def __str__(self):
         return f'Event id = {self.pk}. {self.contract} Supporter: {self.support_contact}'
 
     def is_user_in_main_sales_contacts_of_event(self, user):
-        return user == self.contract.client.main_sales_contact
+        return AccessIndex.Relation.MAIN_SALES_CONTACT in self.get_user_relations(user)
 
     def is_user_in_sales_contacts_of_event(self, user):
-        contract = self.contract
-        # Call the method checking user of contract because event and contract has one to one relationship.
-        return contract.is_user_in_sales_contacts_of_contract(user)
+        # Same as the sales contacts of the contract because event and contract has one to one relationship.
+        relations = self.get_user_relations(user)
+        return AccessIndex.Relation.MAIN_SALES_CONTACT in relations or AccessIndex.Relation.SALES_CONTACT in relations
 
     def is_user_in_support_contacts_of_event(self, user):
-        return user == self.support_contact
+        return AccessIndex.Relation.SUPPORT_CONTACT in self.get_user_relations(user)
+
+
+class AccessIndex(models.Model):
+    """Denormalized index of the users related to each client, contract and event, maintained by the signals
+    (see access_index.py). It replaces the joins through contracts and events of the visibility querysets.
+    """
+
+    class ObjectType(models.TextChoices):
+        CLIENT = 'client', 'Client'
+        CONTRACT = 'contract', 'Contract'
+        EVENT = 'event', 'Event'
+
+    class Relation(models.TextChoices):
+        MAIN_SALES_CONTACT = 'main_sales_contact', 'Main sales contact'
+        SALES_CONTACT = 'sales_contact', 'Sales contact'
+        SUPPORT_CONTACT = 'support_contact', 'Support contact'
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    object_type = models.CharField(max_length=10, choices=ObjectType.choices)
+    object_id = models.BigIntegerField()
+    relation = models.CharField(max_length=20, choices=Relation.choices)
+
+    class Meta:
+        app_label = 'events'
+        verbose_name = 'access index'
+        verbose_name_plural = 'access index'
+        constraints = [
+            # Also the index of the visibility querysets: (user, object_type) -> object_id.
+            models.UniqueConstraint(fields=['user', 'object_type', 'object_id', 'relation'], name='unique_access'),
+        ]
+        indexes = [
+            models.Index(fields=['object_type', 'object_id'], name='access_object_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id} is {self.relation} of {self.object_type} {self.object_id}'
+
+
+class Tombstone(models.Model):
+    """A contract or an event deleted, or no longer visible to `user`, for the change feeds (see changes.py).
+
+    An object deleted gets a tombstone for each user who could see it, and one without user for the managers.
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, related_name='+')
+    object_type = models.CharField(max_length=10, choices=AccessIndex.ObjectType.choices)
+    object_id = models.BigIntegerField()
+    date_deleted = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        app_label = 'events'
+        verbose_name = 'tombstone'
+        verbose_name_plural = 'tombstones'
+        indexes = [
+            # Deletions seen by a user (or by the managers, user null) since a position of the feed.
+            models.Index(fields=['object_type', 'user', 'date_deleted', 'id'], name='tombstone_feed_idx'),
+            models.Index(fields=['date_deleted'], name='tombstone_date_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.object_type} {self.object_id} deleted for {self.user_id or "managers"} at {self.date_deleted}'
@@ -0,0 +1,129 @@
+"""Evaluate the view/change/delete permissions of a user on many clients, contracts or events at once.
+
+The relations of the user with the objects are read from the access index (see access_index.py) in one query whatever
+the number of objects, then the rules of the admin configurations are applied:
+- client: view if related in any way, change and delete if main sales contact,
+- contract: view and change if sales contact or main sales contact, delete if main sales contact,
+- event: view and change if related in any way, delete if main sales contact.
+A superuser or a manager has all permissions without any query.
+"""
+
+from django.db.models import QuerySet
+from rest_framework.response import Response
+
+from epicevents_project.instrumentation import timed
+
+from .access_index import (
+    CLIENT,
+    CONTRACT,
+    EVENT,
+    MAIN_SALES_CONTACT,
+    SALES_CONTACT,
+    SUPPORT_CONTACT,
+)
+from .models import (
+    AccessIndex,
+    Client,
+    Contract,
+    Event
+)
+from .user_role import is_superuser_or_manager
+
+ACTIONS = ('view', 'change', 'delete')
+ALL_RELATIONS = {MAIN_SALES_CONTACT, SALES_CONTACT, SUPPORT_CONTACT}
+
+OBJECT_TYPES = {
+    Client: CLIENT,
+    Contract: CONTRACT,
+    Event: EVENT,
+}
+
+# Relations giving each permission, by object type.
+RULES = {
+    CLIENT: {'view': ALL_RELATIONS, 'change': {MAIN_SALES_CONTACT}, 'delete': {MAIN_SALES_CONTACT}},
+    CONTRACT: {
+        'view': {MAIN_SALES_CONTACT, SALES_CONTACT},
+        'change': {MAIN_SALES_CONTACT, SALES_CONTACT},
+        'delete': {MAIN_SALES_CONTACT},
+    },
+    EVENT: {'view': ALL_RELATIONS, 'change': ALL_RELATIONS, 'delete': {MAIN_SALES_CONTACT}},
+}
+
+
+def get_relations(user, object_type, object_ids):
+    """Return the relations of `user` with each object, as a dict {object id: set of relations}."""
+    relations = {object_id: set() for object_id in object_ids}
+    rows = AccessIndex.objects.filter(
+        user_id=user.pk, object_type=object_type, object_id__in=object_ids
+    ).values_list('object_id', 'relation')
+    for object_id, relation in rows:
+        relations[object_id].add(relation)
+    return relations
+
+
+def get_user_relations(user, obj):
+    """Return the relations of `user` with one object, memoized on the object."""
+    cached = getattr(obj, '_user_relations', None)
+    if cached is not None and cached[0] == user.pk:
+        return cached[1]
+    relations = get_relations(user, OBJECT_TYPES[type(obj)], [obj.pk])[obj.pk]
+    obj._user_relations = (user.pk, relations)
+    return relations
+
+
+def permissions_from_relations(object_type, relations):
+    return {action: bool(relations & RULES[object_type][action]) for action in ACTIONS}
+
+
+@timed('permission')
+def get_object_permissions(user, objects):
+    """Return the permissions of `user` on a list or a queryset of objects of the same model, as a dict
+    {pk: {'view': bool, 'change': bool, 'delete': bool}}, with at most two queries.
+    """
+
+    if isinstance(objects, QuerySet):
+        model = objects.model
+        pks = list(objects.values_list('pk', flat=True))
+    else:
+        objects = list(objects)
+        if not objects:
+            return {}
+        model = type(objects[0])
+        pks = [obj.pk for obj in objects]
+    return get_permissions(user, model, pks)
+
+
+@timed('permission')
+def get_permissions(user, model, pks):
+    """Same as get_object_permissions() from the primary keys of objects of `model`, with at most one query."""
+    if is_superuser_or_manager(user):
+        return {pk: dict.fromkeys(ACTIONS, True) for pk in pks}
+
+    object_type = OBJECT_TYPES[model]
+    relations = get_relations(user, object_type, pks)
+    return {pk: permissions_from_relations(object_type, relations[pk]) for pk in pks}
+
+
+class ObjectPermissionsListMixin:
+    """Add to each row of a list the permissions of the user on it when `?with_permissions=true` is given."""
+
+    permissions_query_param = 'with_permissions'
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+
+        page = self.paginate_queryset(queryset)
+        objects = list(page if page is not None else queryset)
+        data = self.get_serializer(objects, many=True).data
+        self.add_object_permissions(data, queryset.model, [obj.pk for obj in objects])
+
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+    def add_object_permissions(self, data, model, pks):
+        """Add the permissions on the objects `pks` to their rows in `data`, if requested."""
+        if self.request.query_params.get(self.permissions_query_param, '').lower() in ('1', 'true', 'yes'):
+            permissions = get_permissions(self.request.user, model, pks)
+            for item, pk in zip(data, pks):
+                item['permissions'] = permissions[pk]
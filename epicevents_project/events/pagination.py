@@ -0,0 +1,182 @@
+"""Keyset (cursor) pagination for the list endpoints of Client, Contract and Event.
+
+A page is read from the position stored in the cursor with a `WHERE a >= x AND (a > x OR (a = x AND b > y)) ORDER BY
+a, b LIMIT n` query (see keyset_filter()) instead of an OFFSET, so the cost of a page does not depend on how deep it is
+in the data.
+
+With `?with_count=true`, the response also gives the number of rows (`count`) and whether it is exact
+(`count_is_exact`): above COUNT_EXACT_THRESHOLD rows, it is estimated (see counts.py).
+"""
+
+import base64
+import json
+from collections import OrderedDict
+from datetime import date, datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param, remove_query_param
+
+from .counts import get_count
+
+
+def keyset_filter(ordering, position, reverse=False):
+    """Return the condition `(a, b, ...) > (x, y, ...)` (`<` if `reverse`) on the fields of `ordering`, whose values
+    are given by `position`.
+
+    Django has no row value comparison: the condition is written as OR-ed equalities, under a bound on the first
+    field (`a >= x`). The database uses this bound to start the index range scan at the position, where the OR alone
+    would make it scan the index from its start.
+    """
+    lookup, bound = ('lt', 'lte') if reverse else ('gt', 'gte')
+    condition = Q()
+    for index, field in enumerate(ordering):
+        equalities = {previous: position[previous] for previous in ordering[:index]}
+        condition |= Q(**equalities, **{f'{field}__{lookup}': position[field]})
+    if len(ordering) == 1:
+        return condition
+    first = ordering[0]
+    return Q(**{f'{first}__{bound}': position[first]}) & condition
+
+
+class KeysetPagination(BasePagination):
+    """Paginate a queryset on `ordering`, a tuple of fields which must be unique taken together."""
+
+    ordering = ('id',)
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    cursor_query_param = 'cursor'
+    count_query_param = 'with_count'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        position, self.reverse = self.decode_cursor(request, queryset.model)
+
+        self.count = self.count_is_exact = None
+        if request.query_params.get(self.count_query_param, '').lower() in ('1', 'true', 'yes'):
+            self.count, self.count_is_exact = get_count(queryset)
+
+        if self.reverse:
+            queryset = queryset.order_by(*['-' + field for field in self.ordering])
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            queryset = queryset.filter(self.get_position_filter(position, self.reverse))
+
+        # Fetch one more row than the page size to know if there is a page after this one.
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+
+        if self.reverse:
+            self.page.reverse()
+            self.has_previous, self.has_next = has_more, True
+        else:
+            self.has_previous, self.has_next = position is not None, has_more
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_position_filter(self, position, reverse):
+        return keyset_filter(self.ordering, position, reverse)
+
+    @staticmethod
+    def get_item_value(item, field):
+        """Read an ordering value on a model instance or on a row fetched with `values()`."""
+        if isinstance(item, dict):
+            return item[field]
+        return getattr(item, field)
+
+    def encode_cursor(self, item, reverse):
+        values = []
+        for field in self.ordering:
+            value = self.get_item_value(item, field)
+            values.append(value.isoformat() if isinstance(value, (date, datetime)) else value)
+        cursor = json.dumps({'p': values, 'r': reverse}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(cursor.encode()).decode()
+
+    def decode_cursor(self, request, model):
+        """Return the position (values of the ordering fields) and the direction stored in the cursor."""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            values = cursor['p']
+            if len(values) != len(self.ordering):
+                raise ValueError
+            position = {
+                field: model._meta.get_field(field).to_python(value)
+                for field, value in zip(self.ordering, values)
+            }
+            return position, bool(cursor['r'])
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_link(self, item, reverse):
+        url = self.request.build_absolute_uri()
+        if item is None:
+            return remove_query_param(url, self.cursor_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(item, reverse))
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if not self.page:
+            # An empty page reached backwards: the next page is the first one.
+            return self.get_link(None, False)
+        return self.get_link(self.page[-1], False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return self.get_link(None, False)
+        return self.get_link(self.page[0], True)
+
+    def get_paginated_response(self, data):
+        response = OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+        ])
+        if self.count is not None:
+            response['count'] = self.count
+            response['count_is_exact'] = self.count_is_exact
+        response['results'] = data
+        return Response(response)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True},
+                'previous': {'type': 'string', 'nullable': True},
+                'count': {'type': 'integer', 'description': f'With ?{self.count_query_param}=true only.'},
+                'count_is_exact': {'type': 'boolean', 'description': 'False if the count is an estimate.'},
+                'results': schema,
+            },
+        }
+
+
+class ClientPagination(KeysetPagination):
+    ordering = ('date_created', 'id')
+
+
+class ContractPagination(KeysetPagination):
+    ordering = ('date_created', 'id')
+
+
+class EventPagination(KeysetPagination):
+    ordering = ('event_date', 'contract_id')
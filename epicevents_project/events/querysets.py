@@ -0,0 +1,109 @@
+"""Shape the querysets of the viewsets according to what their serializers render.
+
+Each viewset declares in `select_related_fields` the relation graph its serializer needs. The relations are joined
+with `select_related` and, for the read requests, the columns rendered by the serializer along this graph are loaded
+with `only()`, so that a list call costs a constant number of queries whatever the number of rows.
+
+A read request can also choose what is rendered with `?fields=` and `?expand=` (comma separated, dotted for the
+relations of the relations, see SparseFieldsMixin in serializers.py), e.g. `/events/?fields=pk,status,event_date` or
+`/contracts/?expand=client`. Only the relations expanded are then joined and only the columns of the fields requested
+are loaded, the relations which are not expanded are rendered as their primary key.
+"""
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+
+def is_selected_relation(path, relations):
+    """Return `True` if the relation `path` (e.g. "contract__client") is part of the declared relation graph."""
+    return any(relation == path or relation.startswith(path + '__') for relation in relations)
+
+
+def get_expanded_relations(serializer, prefix=''):
+    """Return the paths of the relations rendered by nested model serializers, e.g. ["contract__client"]."""
+    relations = []
+    for field in serializer.fields.values():
+        if isinstance(field, serializers.ModelSerializer) and field.source not in ('*', 'pk'):
+            path = prefix + field.source.split('.')[0]
+            relations.extend(get_expanded_relations(field, prefix=path + '__') or [path])
+    return relations
+
+
+def parse_names(value):
+    """Return the names of a comma separated query parameter, None if it is not given."""
+    if not value:
+        return None
+    return frozenset(name.strip() for name in value.split(',') if name.strip())
+
+
+def get_only_fields(serializer, relations, prefix=''):
+    """Return the lookups to give to `only()` in order to load the columns rendered by a (nested) model serializer.
+
+    Nested serializers are followed only if their relation is in `relations`, the other ones keep their foreign key
+    column so that they are still loaded lazily.
+    """
+
+    model = serializer.Meta.model
+    only_fields = [prefix + model._meta.pk.name]
+
+    for field in serializer.fields.values():
+        if field.write_only or field.source in ('*', 'pk'):
+            continue
+
+        source = field.source.split('.')[0]
+        try:
+            model_field = model._meta.get_field(source)
+        except FieldDoesNotExist:
+            # Property or method of the model, nothing to load for it.
+            continue
+        if not model_field.concrete:
+            continue
+
+        path = prefix + source
+        only_fields.append(path)
+        if isinstance(field, serializers.ModelSerializer) and is_selected_relation(path, relations):
+            only_fields.extend(get_only_fields(field, relations, prefix=path + '__'))
+
+    return list(dict.fromkeys(only_fields))
+
+
+class QuerysetShapingMixin:
+    """Apply `select_related`/`only()` on the queryset of a viewset from the relation graph it declares."""
+
+    select_related_fields = ()
+    fields_query_param = 'fields'
+    expand_query_param = 'expand'
+
+    def get_fieldset(self):
+        """Return the `fields` and `expand` options of the serializer from the query parameters of a read request,
+        {} without them.
+        """
+        request = getattr(self, 'request', None)
+        if request is None or request.method not in SAFE_METHODS:
+            return {}
+        fields = parse_names(request.query_params.get(self.fields_query_param))
+        expand = parse_names(request.query_params.get(self.expand_query_param))
+        if fields is None and expand is None:
+            return {}
+        return {'fields': fields, 'expand': expand or frozenset()}
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.update(self.get_fieldset())
+        return super(QuerysetShapingMixin, self).get_serializer(*args, **kwargs)
+
+    def shape_queryset(self, queryset):
+        relations = self.select_related_fields
+
+        request = getattr(self, 'request', None)
+        if request is not None and request.method in SAFE_METHODS:
+            fieldset = self.get_fieldset()
+            serializer = self.get_serializer_class()(**fieldset)
+            if fieldset:
+                relations = get_expanded_relations(serializer)
+            # Only for read requests: a model loaded with deferred fields does not save them (e.g. date_updated).
+            only_fields = get_only_fields(serializer, relations)
+            # The keyset pagination reads its ordering fields on the rows to build the cursors.
+            only_fields += getattr(self.pagination_class, 'ordering', ())
+            queryset = queryset.only(*only_fields)
+        return queryset.select_related(*relations)
@@ -0,0 +1,136 @@
+"""Read-through cache of the responses of the list and detail endpoints, with ETag / If-None-Match support.
+
+A response is cached under a key made of the endpoint (host, path and sorted query parameters), the Accept header, the
+visibility scope of the user ('all' for the managers, who see everything, else the user id) and the current versions
+of the models it depends on. A version is a counter kept in the cache and bumped by the signals of the models (see
+signals.py): a write makes all the keys built on the previous version unreachable, nothing has to be deleted.
+
+The ETag of a response is derived from its key and from its content, and cached with it: a request with a matching
+If-None-Match gets a 304 without any query on the data nor any serialization while the response is cached. Derived
+from the key only, it would confirm a response read from a late replica until the next write, after the entry has
+expired.
+
+The cache is the RESPONSE_CACHE_ALIAS cache (default: 'default', local memory unless configured otherwise). With
+several worker processes, a shared backend (Redis) is needed for the versions bumped in one process to be seen by the
+others.
+"""
+
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags, urlencode
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from epicevents_project.db_router import get_pin_seconds, use_replica
+
+from .user_role import is_superuser_or_manager
+
+CACHE_PREFIX = 'response_cache'
+CACHE_TIMEOUT = getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300)
+
+CLIENT = 'client'
+CONTRACT = 'contract'
+EVENT = 'event'
+USER = 'user'
+ALL_MODELS = (CLIENT, CONTRACT, EVENT, USER)
+
+
+def get_cache():
+    return caches[getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')]
+
+
+def get_version_key(name):
+    return f'{CACHE_PREFIX}:version:{name}'
+
+
+def get_versions(names):
+    """Return the current versions of the models `names`, as a tuple."""
+    cache = get_cache()
+    keys = [get_version_key(name) for name in names]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # A version lost (restart, eviction) starts again from the clock, never from a value already used.
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+    return tuple(versions[key] for key in keys)
+
+
+def bump_version(name):
+    cache = get_cache()
+    key = get_version_key(name)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), timeout=None)
+
+
+def bump_versions(*names):
+    """Invalidate the cached responses depending on the models `names`.
+
+    Bumped now, for the requests of this process, and again when the transaction is committed, so that a response
+    cached between the write and the commit (with the data before the write) is not served afterwards.
+    """
+    for name in names:
+        bump_version(name)
+    transaction.on_commit(lambda: [bump_version(name) for name in names])
+
+
+class ResponseCacheMixin:
+    """Cache the responses of the `list` and `retrieve` actions of a viewset.
+
+    - response_cache_models: the models on which the responses depend, by default all of them since the
+      serializers nest the related objects and the visibility of an object depends on its parents and children.
+    """
+
+    response_cache_models = ALL_MODELS
+    response_cache_timeout = CACHE_TIMEOUT
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(super(ResponseCacheMixin, self).list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(super(ResponseCacheMixin, self).retrieve, request, *args, **kwargs)
+
+    def get_response_cache_key(self, request):
+        scope = 'all' if is_superuser_or_manager(request.user) else request.user.pk
+        query = urlencode(sorted(
+            (name, value) for name, values in request.query_params.lists() for value in values
+        ))
+        parts = (
+            request.get_host(), request.path, query, request.META.get('HTTP_ACCEPT', ''), scope,
+            get_versions(self.response_cache_models),
+        )
+        return f'{CACHE_PREFIX}:response:{hashlib.sha1(repr(parts).encode()).hexdigest()}'
+
+    def get_cached_response(self, handler, request, *args, **kwargs):
+        key = self.get_response_cache_key(request)
+        cache = get_cache()
+        cached = cache.get(key)
+        if cached is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            content = hashlib.sha1(JSONRenderer().render(response.data)).hexdigest()
+            etag = f'"{hashlib.sha1((key + content).encode()).hexdigest()}"'
+            # Read from a replica, the data may be late by a few seconds: it is not kept longer than that.
+            timeout = min(self.response_cache_timeout, get_pin_seconds()) if use_replica() else (
+                self.response_cache_timeout
+            )
+            cache.set(key, (etag, response.data), timeout)
+        else:
+            etag, data = cached
+            response = Response(data)
+
+        if_none_match = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+        if etag in if_none_match or f'W/{etag}' in if_none_match:
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        response['ETag'] = etag
+        patch_vary_headers(response, ('Accept', 'Authorization'))
+        return response
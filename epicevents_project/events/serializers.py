@@ -1,7 +1,11 @@
 """Serializers for some models: Client, Contract, Event."""
 
+from collections import OrderedDict
+
 from django.shortcuts import get_object_or_404
 from rest_framework import serializers
+
+from epicevents_project.instrumentation import InstrumentedSerializerMixin
 from .models import (
     Client,
     Contract,
@@ -13,7 +17,66 @@ from django.contrib.auth import get_user_model
 User = get_user_model()
 
 
-class UserSerializer(serializers.ModelSerializer):
+def split_paths(paths):
+    """Split dotted paths on their first name: ({"a", "b"}, {"a": {"c"}}) for ["a", "b.c"] (without "b")."""
+    names, children = set(), {}
+    for path in paths:
+        name, _, child = path.partition('.')
+        if child:
+            children.setdefault(name, set()).add(child)
+        else:
+            names.add(name)
+    return names, children
+
+
+class SparseFieldsMixin:
+    """Render only some fields and inline only some relations, the other ones as their primary key.
+
+    - fields: the names of the fields to render (None: all of them), "contract.amount" for a field of a relation,
+    - expand: the relations to inline, "contract.client" for a relation of a relation. A relation with fields given
+      is inlined too.
+    Without both, the serializer renders as declared.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.sparse_fields = kwargs.pop('fields', None)
+        self.sparse_expand = kwargs.pop('expand', None)
+        super(SparseFieldsMixin, self).__init__(*args, **kwargs)
+
+    def get_fields(self):
+        fields = super(SparseFieldsMixin, self).get_fields()
+        if self.sparse_fields is None and self.sparse_expand is None:
+            return fields
+
+        names, nested_fields = split_paths(self.sparse_fields or ())
+        expanded, nested_expand = split_paths(self.sparse_expand or ())
+        expanded |= set(nested_expand) | set(nested_fields)
+        relations = {name for name, field in fields.items() if isinstance(field, serializers.BaseSerializer)}
+        errors = {}
+        unknown = (names | set(nested_fields)) - set(fields)
+        if unknown:
+            errors['fields'] = [f'Unknown field: {name}' for name in sorted(unknown)]
+        if expanded - relations:
+            errors['expand'] = [f'Not a relation: {name}' for name in sorted(expanded - relations)]
+        if errors:
+            raise serializers.ValidationError(errors)
+
+        sparse = OrderedDict()
+        for name, field in fields.items():
+            if self.sparse_fields is not None and name not in names and name not in nested_fields:
+                continue
+            if name in expanded:
+                field = type(field)(
+                    *field._args, **field._kwargs, fields=nested_fields.get(name), expand=nested_expand.get(name, ()),
+                )
+            elif name in relations:
+                source = {'source': field._kwargs['source']} if 'source' in field._kwargs else {}
+                field = serializers.PrimaryKeyRelatedField(read_only=True, **source)
+            sparse[name] = field
+        return sparse
+
+
+class UserSerializer(SparseFieldsMixin, InstrumentedSerializerMixin, serializers.ModelSerializer):
     """Serializer is used for a user."""
 
     username = serializers.CharField(required=False, allow_blank=True)  # To get is_valid = True for unique field
@@ -24,7 +87,7 @@ class UserSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
-class ClientSerializer(serializers.ModelSerializer):
+class ClientSerializer(SparseFieldsMixin, InstrumentedSerializerMixin, serializers.ModelSerializer):
     """Serializer is used for a client."""
 
     main_sales_contact = UserSerializer(read_only=True)
@@ -36,7 +99,7 @@ class ClientSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
-class ContractSerializer(serializers.ModelSerializer):
+class ContractSerializer(SparseFieldsMixin, InstrumentedSerializerMixin, serializers.ModelSerializer):
     """Serializer is used for a contract."""
 
     sales_contact = UserSerializer(read_only=True)  # read_only=True whenever having a foreign key
@@ -48,7 +111,7 @@ class ContractSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'date_created']
 
 
-class EventSerializer(serializers.ModelSerializer):
+class EventSerializer(SparseFieldsMixin, InstrumentedSerializerMixin, serializers.ModelSerializer):
     """Serializer is used for an event."""
 
     contract = ContractSerializer(read_only=True)  # read_only=True whenever having a foreign key
@@ -0,0 +1,157 @@
+"""Signal receivers of the events app, connected in EventsConfig.ready()."""
+
+from django.contrib.auth.models import Group
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .access_index import (
+    CLIENT,
+    CONTRACT,
+    EVENT,
+    refresh_access,
+    refresh_client_tree,
+    remove_access,
+)
+from .models import (
+    User,
+    Client,
+    Contract,
+    Event
+)
+from . import response_cache
+from .user_role import forget_user_roles
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def forget_roles_on_groups_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """Invalidate the cached roles of the users whose groups changed."""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if reverse:
+        # From group.user_set: `pk_set` holds the users, it is None when the group is cleared.
+        forget_user_roles(pk_set)
+    else:
+        instance.__dict__.pop('_roles', None)
+        forget_user_roles([instance.pk])
+
+
+@receiver(post_delete, sender=User)
+def forget_roles_on_user_delete(sender, instance, **kwargs):
+    forget_user_roles([instance.pk])
+
+
+@receiver(post_save, sender=User)
+def forget_roles_on_user_save(sender, instance, update_fields=None, **kwargs):
+    """is_superuser and is_active are part of the roles version of the user (see user_role.py)."""
+    if update_fields and set(update_fields) <= {'last_login', 'password'}:
+        return
+    forget_user_roles([instance.pk])
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def forget_roles_on_group_change(sender, **kwargs):
+    """A group renamed or deleted changes the roles of all its users."""
+    forget_user_roles()
+
+
+@receiver(post_save, sender=Client)
+def refresh_access_on_client_save(sender, instance, created, **kwargs):
+    """The main sales contact of a client is also related to its contracts and events."""
+    if instance.has_tracked_fields_changed():
+        if created:
+            refresh_access(client_ids=[instance.pk])
+        else:
+            refresh_client_tree([instance.pk])
+        instance.remember_tracked_fields()
+
+
+@receiver(post_save, sender=Contract)
+def refresh_access_on_contract_save(sender, instance, created, **kwargs):
+    if instance.has_tracked_fields_changed():
+        previous_client_id = getattr(instance, '_tracked_values', {}).get('client_id')
+        refresh_access(
+            client_ids=[instance.client_id, previous_client_id],
+            contract_ids=[instance.pk],
+            event_ids=[instance.pk],
+            created=created,
+        )
+        instance.remember_tracked_fields()
+
+
+@receiver(post_save, sender=Event)
+def refresh_access_on_event_save(sender, instance, created, **kwargs):
+    if instance.has_tracked_fields_changed():
+        client_ids = Contract.objects.filter(pk=instance.pk).values_list('client_id', flat=True)
+        refresh_access(client_ids=list(client_ids), event_ids=[instance.pk], created=created)
+        instance.remember_tracked_fields()
+
+
+@receiver(pre_delete, sender=Client)
+def remember_contracts_on_client_delete(sender, instance, **kwargs):
+    # The contracts of a deleted client are kept (client set to null) but lose its main sales contact.
+    instance._deleted_contract_ids = list(instance.contracts.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Client)
+def remove_access_on_client_delete(sender, instance, **kwargs):
+    remove_access(CLIENT, [instance.pk])
+    contract_ids = getattr(instance, '_deleted_contract_ids', [])
+    refresh_access(contract_ids=contract_ids, event_ids=contract_ids)
+    # Their client was set to null by an update query, without auto_now: for the change feed.
+    Contract.objects.filter(pk__in=contract_ids).update(date_updated=timezone.now())
+
+
+@receiver(post_delete, sender=Contract)
+def remove_access_on_contract_delete(sender, instance, **kwargs):
+    remove_access(CONTRACT, [instance.pk])
+    refresh_access(client_ids=[instance.client_id])
+
+
+@receiver(post_delete, sender=Event)
+def remove_access_on_event_delete(sender, instance, **kwargs):
+    remove_access(EVENT, [instance.pk])
+    client_ids = Contract.objects.filter(pk=instance.pk).values_list('client_id', flat=True)
+    refresh_access(client_ids=list(client_ids))
+
+
+@receiver(post_save, sender=Client)
+@receiver(post_delete, sender=Client)
+def invalidate_client_responses(sender, **kwargs):
+    response_cache.bump_versions(response_cache.CLIENT)
+
+
+@receiver(post_save, sender=Contract)
+@receiver(post_delete, sender=Contract)
+def invalidate_contract_responses(sender, **kwargs):
+    response_cache.bump_versions(response_cache.CONTRACT)
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def invalidate_event_responses(sender, **kwargs):
+    response_cache.bump_versions(response_cache.EVENT)
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_responses_on_save(sender, update_fields=None, **kwargs):
+    # Not on a login (last_login) nor on a password change, nothing that the responses show.
+    if update_fields and set(update_fields) <= {'last_login', 'password'}:
+        return
+    response_cache.bump_versions(response_cache.USER)
+
+
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_user_responses(sender, **kwargs):
+    response_cache.bump_versions(response_cache.USER)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_user_responses_on_groups_change(sender, action, **kwargs):
+    """The role of a user gives his visibility scope."""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        response_cache.bump_versions(response_cache.USER)
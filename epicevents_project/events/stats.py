@@ -0,0 +1,125 @@
+"""Aggregates of the contracts and events for the dashboard (GET /stats/).
+
+All the aggregates are grouped and computed by the database on the contracts and events that the user can see (the
+querysets of the admin configurations). The result is cached for STATS_CACHE_TIMEOUT seconds, by visibility scope:
+all the managers share the same entry, a seller or a supporter has his own.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+
+from .user_role import is_superuser_or_manager
+
+PERIODS = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+
+CACHE_PREFIX = 'stats'
+CACHE_TIMEOUT = getattr(settings, 'STATS_CACHE_TIMEOUT', 30)
+
+
+def revenue_per_seller(contracts):
+    rows = contracts.values('sales_contact_id', 'sales_contact__username').annotate(
+        contracts=Count('id'),
+        revenue=Sum('amount'),
+        signed_revenue=Sum('amount', filter=Q(is_signed=True)),
+    ).order_by('sales_contact_id')
+    return [
+        {
+            'sales_contact': {'id': row['sales_contact_id'], 'username': row['sales_contact__username']},
+            'contracts': row['contracts'],
+            'revenue': row['revenue'] or 0,
+            'signed_revenue': row['signed_revenue'] or 0,
+        }
+        for row in rows
+    ]
+
+
+def unsigned_totals(contracts):
+    totals = contracts.filter(is_signed=False).aggregate(contracts=Count('id'), amount=Sum('amount'))
+    return {'contracts': totals['contracts'], 'amount': totals['amount'] or 0}
+
+
+def events_per_supporter(events):
+    rows = events.values('support_contact_id', 'support_contact__username', 'status').annotate(
+        events=Count('pk'),
+        attendees=Sum('attendees'),
+    ).order_by('support_contact_id', 'status')
+
+    supporters = {}
+    for row in rows:
+        supporter = supporters.setdefault(row['support_contact_id'], {
+            'support_contact': {'id': row['support_contact_id'], 'username': row['support_contact__username']},
+            'statuses': {},
+        })
+        supporter['statuses'][row['status']] = {'events': row['events'], 'attendees': row['attendees'] or 0}
+    return list(supporters.values())
+
+
+def revenue_by_period(contracts, period):
+    """Amount of the contracts by period of payment due."""
+    rows = contracts.annotate(period=PERIODS[period]('payment_due')).values('period').annotate(
+        contracts=Count('id'),
+        revenue=Sum('amount'),
+        signed_revenue=Sum('amount', filter=Q(is_signed=True)),
+    ).order_by('period')
+    return [
+        {
+            'period': row['period'],
+            'contracts': row['contracts'],
+            'revenue': row['revenue'] or 0,
+            'signed_revenue': row['signed_revenue'] or 0,
+        }
+        for row in rows
+    ]
+
+
+def events_by_period(events, period):
+    """Number of events and of attendees by period of event date."""
+    rows = events.annotate(period=PERIODS[period]('event_date')).values('period').annotate(
+        events=Count('pk'),
+        attendees=Sum('attendees'),
+    ).order_by('period')
+    return [
+        {'period': row['period'], 'events': row['events'], 'attendees': row['attendees'] or 0}
+        for row in rows
+    ]
+
+
+def get_cache_key(user, period, start=None, end=None):
+    scope = 'all' if is_superuser_or_manager(user) else user.pk
+    return ':'.join(str(part) for part in (
+        CACHE_PREFIX, scope, period, start.isoformat() if start else '', end.isoformat() if end else '',
+    ))
+
+
+def get_stats(user, contracts, events, period='month', start=None, end=None):
+    """Return the aggregates of `contracts` and `events` (the querysets visible by `user`), from the cache if
+    possible. `start` and `end` limit the payment due of the contracts and the date of the events.
+    """
+    key = get_cache_key(user, period, start, end)
+    stats = cache.get(key)
+    if stats is not None:
+        return stats
+
+    if start:
+        contracts = contracts.filter(payment_due__gte=start)
+        events = events.filter(event_date__gte=start)
+    if end:
+        contracts = contracts.filter(payment_due__lte=end)
+        events = events.filter(event_date__lte=end)
+
+    stats = {
+        'period': period,
+        'revenue_per_seller': revenue_per_seller(contracts),
+        'unsigned_contracts': unsigned_totals(contracts),
+        'events_per_supporter': events_per_supporter(events),
+        'revenue_by_period': revenue_by_period(contracts, period),
+        'events_by_period': events_by_period(events, period),
+    }
+    cache.set(key, stats, CACHE_TIMEOUT)
+    return stats
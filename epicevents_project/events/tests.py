@@ -1,3 +1,1469 @@
-from django.test import TestCase
+import asyncio
+import csv
+import gzip
+import json
+import os
+import re
+import tempfile
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import psycopg2
+from asgiref.sync import async_to_sync
+from asgiref.testing import ApplicationCommunicator
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIHandler, ASGIRequest
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.db.models import Q
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path, resolve
+from django.utils import timezone
+from django.utils.http import urlencode
+from django.utils.translation import gettext_lazy
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+
+from epicevents_project.db_backends.pooled_postgresql.pool import ConnectionPool
+from epicevents_project import compression, renderers
+from epicevents_project.compression import CompressionMiddleware, acompress_stream, gzip_compressor
+from epicevents_project.db_router import ReplicaRouter, ReplicaRoutingMiddleware
+from epicevents_project.instrumentation import AdaptiveSampler, registry, sampler
+from users.tokens import RoleRefreshToken
+
+from .access_index import CLIENT, CONTRACT, EVENT, accessible_ids, rebuild_access_index
+from .async_views import async_view
+from .benchmarks import DataGenerator
+from .changes import encode_cursor
+from .compiled import compile_serializer
+from .counts import EstimatedCountPaginator, get_count
+from .models import (
+    User,
+    AccessIndex,
+    Client,
+    Contract,
+    Event,
+    Tombstone
+)
+from .object_permissions import get_object_permissions
+from .pagination import EventPagination
+from .serializers import ClientSerializer, EventSerializer
+from .user_role import forget_user_roles, is_seller, is_supporter, is_superuser_or_manager
+from .views import ClientViewSet, ContractViewSet, EventViewSet
+
+
+class EventsTestCase(APITestCase):
+    """Create a manager, a seller and a supporter, and give some helpers to create clients, contracts and events."""
+
+    def setUp(self):
+        forget_user_roles()
+        cache.clear()
+        self.manager = self.create_user('manager', 'Managers')
+        self.seller = self.create_user('seller', 'Sellers')
+        self.supporter = self.create_user('supporter', 'Supporters')
+
+    @staticmethod
+    def create_user(username, group_name):
+        user = User.objects.create_user(username, f'{username}@epicevents.com', username, username, 'password')
+        user.groups.add(Group.objects.get(name=group_name))
+        return user
+
+    def create_events(self, count):
+        """Create `count` clients, each one having a contract and an event."""
+        events = []
+        for index in range(count):
+            client = Client.objects.create(
+                first_name=f'first{index}', last_name=f'last{index}', email=f'client{index}@company.com',
+                phone='0102030405', mobile='0602030405', company_name=f'company{index}',
+                main_sales_contact=self.seller,
+            )
+            contract = Contract.objects.create(
+                client=client, sales_contact=self.seller, amount=1000 + index,
+                payment_due=timezone.now() + timedelta(days=30),
+            )
+            events.append(Event.objects.create(
+                contract=contract, support_contact=self.supporter, attendees=10,
+                event_date=timezone.now() + timedelta(days=60), notes='notes',
+            ))
+        return events
+
+    def count_queries(self, user, url):
+        """Return the number of queries run by a GET request on `url`."""
+        self.client.force_authenticate(user=user)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+
+class ListQueryCountTests(EventsTestCase):
+    """The number of queries of a list call should not depend on the number of rows."""
+
+    def assert_constant_queries(self, url):
+        for user in (self.manager, self.seller, self.supporter):
+            # The first request of a user loads his roles in the role cache.
+            self.count_queries(user, url)
+            self.create_events(2)
+            few_rows = self.count_queries(user, url)
+            self.create_events(5)
+            more_rows = self.count_queries(user, url)
+            self.assertEqual(few_rows, more_rows, f'{url} for {user}')
+
+    def test_client_list(self):
+        self.assert_constant_queries('/clients/')
+
+    def test_contract_list(self):
+        self.assert_constant_queries('/contracts/')
+
+    def test_event_list(self):
+        self.assert_constant_queries('/events/')
+
+    def test_event_retrieve(self):
+        event = self.create_events(1)[0]
+        self.client.force_authenticate(user=self.manager)
+        response = self.client.get(f'/events/{event.pk}/')
+        self.assertEqual(response.data['contract']['client']['main_sales_contact']['username'], 'seller')
+        self.assertEqual(response.data['support_contact']['username'], 'supporter')
+
+
+class KeysetPaginationTests(EventsTestCase):
+    """Walk the pages of the list endpoints with the cursors."""
+
+    def walk(self, url):
+        """Return the pages read forwards then backwards from `url`."""
+        self.client.force_authenticate(user=self.manager)
+        forward, backward = [], []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            forward.append(response.data['results'])
+            url = response.data['next']
+        url = response.data['previous']
+        while url:
+            response = self.client.get(url)
+            backward.insert(0, response.data['results'])
+            url = response.data['previous']
+        return forward, backward
+
+    def test_pages_forwards_and_backwards(self):
+        events = self.create_events(7)
+        # Same event date for some events: the contract id breaks the ties.
+        Event.objects.filter(pk__in=[event.pk for event in events[:4]]).update(event_date=timezone.now())
+
+        forward, backward = self.walk('/events/?page_size=3')
+        self.assertEqual([len(page) for page in forward], [3, 3, 1])
+        self.assertEqual(backward, forward[:-1])
+        pks = [event['pk'] for page in forward for event in page]
+        self.assertEqual(sorted(pks), sorted(event.pk for event in events))
+
+    def test_pages_with_filter(self):
+        self.create_events(5)
+        forward, _ = self.walk('/clients/?page_size=2&email_contains=CLIENT')
+        self.assertEqual([len(page) for page in forward], [2, 2, 1])
+        forward, _ = self.walk('/contracts/?page_size=2&amount_min=1003')
+        self.assertEqual([contract['amount'] for page in forward for contract in page], [1003, 1004])
+
+    def test_search_filter(self):
+        self.create_events(3)
+        Client.objects.filter(first_name='first1').update(last_name='Durand')
+        self.client.force_authenticate(user=self.manager)
+        self.assertEqual(len(self.client.get('/clients/?search=duRAND').data['results']), 1)
+        self.assertEqual(len(self.client.get('/contracts/?search=client2@').data['results']), 1)
+        self.assertEqual(len(self.client.get('/events/?search=FIRST').data['results']), 3)
+
+    def test_position_filter_bounds_first_field(self):
+        # The database can start the index range scan at the position.
+        self.create_events(3)
+        self.client.force_authenticate(user=self.manager)
+        next_url = self.client.get('/events/?page_size=1').data['next']
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(len(self.client.get(next_url).data['results']), 1)
+        # event_date >= x AND (event_date > x OR (contract_id > y AND event_date = x))
+        bounded = re.compile(r'"events_event"\."event_date" >= (.+?) AND \("events_event"\."event_date" > \1 OR')
+        self.assertTrue(any(bounded.search(query['sql']) for query in context.captured_queries))
+
+        position = {'event_date': timezone.now(), 'contract_id': 5}
+        sql = str(Event.objects.filter(EventPagination().get_position_filter(position, reverse=True)).query)
+        self.assertIn('("events_event"."event_date" <= ', sql)
+
+    def test_invalid_cursor(self):
+        self.client.force_authenticate(user=self.manager)
+        response = self.client.get('/contracts/?cursor=invalid')
+        self.assertEqual(response.status_code, 404)
+
+
+class RoleCacheTests(EventsTestCase):
+    """The groups of a user are read once, then come from the role cache until they change."""
+
+    def test_roles_are_cached(self):
+        forget_user_roles()
+        seller = User.objects.get(pk=self.seller.pk)
+        with self.assertNumQueries(1):
+            self.assertTrue(is_seller(seller))
+            self.assertFalse(is_supporter(seller))
+            self.assertFalse(is_superuser_or_manager(seller))
+
+        # Another request loads another user object, the roles come from the LRU cache.
+        seller = User.objects.get(pk=self.seller.pk)
+        with self.assertNumQueries(0):
+            self.assertTrue(is_seller(seller))
+
+    def test_cache_invalidated_on_groups_change(self):
+        self.assertFalse(is_superuser_or_manager(self.seller))
+        self.seller.groups.add(Group.objects.get(name='Managers'))
+        self.assertTrue(is_superuser_or_manager(User.objects.get(pk=self.seller.pk)))
+
+        Group.objects.get(name='Managers').user_set.remove(self.seller)
+        self.assertFalse(is_superuser_or_manager(User.objects.get(pk=self.seller.pk)))
+
+    def test_update_permission_checks_without_queries(self):
+        event = self.create_events(1)[0]
+        self.client.force_authenticate(user=self.manager)
+        self.client.get('/events/')
+        with CaptureQueriesContext(connection) as context:
+            self.client.put(f'/events/{event.pk}/', {
+                'support_contact': {'id': self.supporter.pk}, 'attendees': 20,
+                'event_date': event.event_date.isoformat(), 'notes': 'new notes',
+            }, format='json')
+        self.assertFalse([query for query in context.captured_queries if 'auth_group' in query['sql']])
+
+
+class AccessIndexTests(EventsTestCase):
+    """The access index should give the same objects as the joins through contracts and events."""
+
+    def assert_index_matches_joins(self):
+        for user in User.objects.all():
+            self.assertEqual(
+                set(Client.objects.filter(pk__in=accessible_ids(user, CLIENT))),
+                set(Client.objects.filter(
+                    Q(main_sales_contact=user)
+                    | Q(contracts__sales_contact=user)
+                    | Q(contracts__event__support_contact=user)
+                )),
+            )
+            self.assertEqual(
+                set(Contract.objects.filter(pk__in=accessible_ids(user, CONTRACT))),
+                set(Contract.objects.filter(Q(sales_contact=user) | Q(client__main_sales_contact=user))),
+            )
+            self.assertEqual(
+                set(Event.objects.filter(pk__in=accessible_ids(user, EVENT))),
+                set(Event.objects.filter(
+                    Q(support_contact=user)
+                    | Q(contract__sales_contact=user)
+                    | Q(contract__client__main_sales_contact=user)
+                )),
+            )
+
+    def test_index_follows_changes(self):
+        other_seller = self.create_user('other_seller', 'Sellers')
+        other_supporter = self.create_user('other_supporter', 'Supporters')
+        events = self.create_events(4)
+        self.assert_index_matches_joins()
+
+        client = events[0].contract.client
+        client.main_sales_contact = other_seller
+        client.save()
+        self.assert_index_matches_joins()
+
+        contract = events[1].contract
+        contract.sales_contact = other_seller
+        contract.save()
+        events[1].support_contact = other_supporter
+        events[1].save()
+        self.assert_index_matches_joins()
+
+        events[2].delete()
+        events[3].contract.client.delete()
+        self.assert_index_matches_joins()
+
+        other_seller.delete()
+        self.assert_index_matches_joins()
+
+    def test_rebuild_command(self):
+        self.create_events(3)
+        rows = set(AccessIndex.objects.values_list('user_id', 'object_type', 'object_id', 'relation'))
+        AccessIndex.objects.all().delete()
+        call_command('rebuild_access_index', stdout=StringIO())
+        self.assertEqual(set(AccessIndex.objects.values_list('user_id', 'object_type', 'object_id', 'relation')), rows)
+        self.assert_index_matches_joins()
+
+    def test_rebuild_by_batches(self):
+        events = self.create_events(5)
+        rows = set(AccessIndex.objects.values_list('user_id', 'object_type', 'object_id', 'relation'))
+        # Rows of deleted objects, before and after the pks of the batches, and missing rows.
+        AccessIndex.objects.bulk_create([
+            AccessIndex(user=self.seller, object_type=CONTRACT, object_id=events[2].pk + 1000,
+                        relation=AccessIndex.Relation.SALES_CONTACT),
+            AccessIndex(user=self.seller, object_type=EVENT, object_id=0, relation=AccessIndex.Relation.SALES_CONTACT),
+        ])
+        AccessIndex.objects.filter(object_type=CLIENT, object_id=events[3].contract.client_id).delete()
+
+        self.assertEqual(rebuild_access_index(batch_size=2), len(rows))
+        self.assertEqual(set(AccessIndex.objects.values_list('user_id', 'object_type', 'object_id', 'relation')), rows)
+
+    def test_seller_list_uses_index(self):
+        self.create_events(2)
+        self.client.force_authenticate(user=self.seller)
+        self.assertEqual(len(self.client.get('/events/').data['results']), 2)
+        self.client.force_authenticate(user=self.create_user('other_seller', 'Sellers'))
+        self.assertEqual(len(self.client.get('/events/').data['results']), 0)
+
+
+class ObjectPermissionsTests(EventsTestCase):
+    """The batch evaluation of the permissions should agree with the rules of the admin configurations."""
+
+    def test_batch_permissions(self):
+        other_seller = self.create_user('other_seller', 'Sellers')
+        events = self.create_events(3)
+        contract = events[0].contract
+        contract.sales_contact = other_seller
+        contract.save()
+
+        is_seller(other_seller)
+        # One query for the primary keys of the queryset, one for the relations.
+        with self.assertNumQueries(2):
+            permissions = get_object_permissions(other_seller, Event.objects.all())
+        self.assertEqual(permissions[events[0].pk], {'view': True, 'change': True, 'delete': False})
+        self.assertEqual(permissions[events[1].pk], {'view': False, 'change': False, 'delete': False})
+
+        clients = list(Client.objects.all())
+        is_supporter(self.supporter)
+        with self.assertNumQueries(1):
+            permissions = get_object_permissions(self.supporter, clients)
+        self.assertTrue(all(permission == {'view': True, 'change': False, 'delete': False}
+                            for permission in permissions.values()))
+
+        is_superuser_or_manager(self.manager)
+        with self.assertNumQueries(0):
+            permissions = get_object_permissions(self.manager, clients)
+        self.assertTrue(all(all(permission.values()) for permission in permissions.values()))
+
+    def test_object_methods(self):
+        event = Event.objects.get(pk=self.create_events(1)[0].pk)
+        with self.assertNumQueries(1):
+            self.assertTrue(event.is_user_in_sales_contacts_of_event(self.seller))
+            self.assertTrue(event.is_user_in_main_sales_contacts_of_event(self.seller))
+            self.assertFalse(event.is_user_in_support_contacts_of_event(self.seller))
+        self.assertTrue(event.is_user_in_support_contacts_of_event(self.supporter))
+        client = event.contract.client
+        self.assertTrue(client.is_user_in_support_contacts_of_client(self.supporter))
+        self.assertFalse(client.is_user_in_sales_contacts_of_client(self.supporter))
+
+    def test_list_with_permissions(self):
+        self.create_events(2)
+        self.count_queries(self.supporter, '/events/')
+        few_rows = self.count_queries(self.supporter, '/events/?with_permissions=true')
+        self.create_events(3)
+        self.assertEqual(self.count_queries(self.supporter, '/events/?with_permissions=true'), few_rows)
+
+        response = self.client.get('/events/?with_permissions=true')
+        self.assertEqual(response.data['results'][0]['permissions'], {'view': True, 'change': True, 'delete': False})
+        self.assertNotIn('permissions', self.client.get('/events/').data['results'][0])
+
+    def test_admin_changelist(self):
+        self.create_events(2)
+        self.seller.is_staff = True
+        self.seller.save()
+        self.client.force_login(self.seller)
+        response = self.client.get('/admin/events/event/')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Can edit')
+
+
+class BulkTests(EventsTestCase):
+    """Bulk create and update on the /bulk/ endpoints."""
+
+    def client_data(self, index, **kwargs):
+        data = {
+            'first_name': f'bulk{index}', 'last_name': 'client', 'email': f'bulk{index}@company.com',
+            'phone': '0102030405', 'mobile': '0602030405', 'company_name': 'company',
+            'main_sales_contact': {'id': self.seller.pk},
+        }
+        data.update(kwargs)
+        return data
+
+    def test_bulk_create_clients(self):
+        self.client.force_authenticate(user=self.seller)
+        response = self.client.post('/clients/bulk/', [self.client_data(0), self.client_data(1)], format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([client['first_name'] for client in response.data], ['bulk0', 'bulk1'])
+        # The access index is up to date: the seller sees his new clients.
+        self.assertEqual(len(self.client.get('/clients/').data['results']), 2)
+
+    def test_bulk_create_errors(self):
+        self.client.force_authenticate(user=self.seller)
+        response = self.client.post('/clients/bulk/', [
+            self.client_data(0),
+            self.client_data(1, main_sales_contact={'id': 12345}),
+            self.client_data(2, email=''),
+        ], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['index'] for error in response.data['errors']], [1, 2])
+        self.assertIn('main_sales_contact', response.data['errors'][0]['errors'])
+        self.assertIn('email', response.data['errors'][1]['errors'])
+        self.assertFalse(Client.objects.exists())
+
+    def test_bulk_create_events(self):
+        contracts = [event.contract for event in self.create_events(6)]
+        Event.objects.all().delete()
+        self.client.force_authenticate(user=self.seller)
+
+        def post(contracts):
+            return self.client.post('/events/bulk/', [{
+                'contract': {'id': contract.pk}, 'support_contact': {'username': 'supporter'},
+                'attendees': 5, 'event_date': timezone.now().isoformat(), 'notes': 'notes',
+            } for contract in contracts], format='json')
+
+        self.client.get('/events/')
+        with CaptureQueriesContext(connection) as few:
+            self.assertEqual(post(contracts[:2]).status_code, 201)
+        with CaptureQueriesContext(connection) as more:
+            self.assertEqual(post(contracts[2:6]).status_code, 201)
+        self.assertEqual(len(few), len(more))
+        self.assertEqual(Event.objects.count(), 6)
+        self.assertEqual(Event.objects.filter(pk__in=accessible_ids(self.supporter, EVENT)).count(), 6)
+
+        response = post(contracts[:1])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('contract', response.data['errors'][0]['errors'])
+
+    def test_bulk_update(self):
+        other_seller = self.create_user('other_seller', 'Sellers')
+        events = self.create_events(3)
+        contract = events[2].contract
+        contract.sales_contact = other_seller
+        contract.client.main_sales_contact = other_seller
+        contract.client.save()
+        contract.save()
+
+        self.client.force_authenticate(user=self.seller)
+        data = [{'id': event.contract.pk, 'amount': 1, 'sales_contact': {'id': self.seller.pk}} for event in events]
+        response = self.client.patch('/contracts/bulk/', data, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['errors'][0]['index'], 2)
+
+        response = self.client.patch('/contracts/bulk/', data[:2], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(Contract.objects.filter(amount=1).values_list('pk', flat=True).order_by('pk')),
+                         [events[0].pk, events[1].pk])
+
+        self.client.force_authenticate(user=self.manager)
+        response = self.client.patch('/contracts/bulk/', data[2:], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(Contract.objects.filter(pk__in=accessible_ids(self.seller, CONTRACT), pk=events[2].pk))
+
+    def test_bulk_partial_update_unknown_reference(self):
+        event = self.create_events(1)[0]
+        self.client.force_authenticate(user=self.manager)
+        data = [{'pk': event.pk, 'support_contact': {'id': 0}}]
+        response = self.client.patch('/events/bulk/', data, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['errors'], [
+            {'index': 0, 'errors': {'support_contact': ['Support contact not found']}},
+        ])
+        self.assertEqual(Event.objects.get(pk=event.pk).support_contact, self.supporter)
+
+        # Leaving it out keeps it.
+        response = self.client.patch('/events/bulk/', [{'pk': event.pk, 'attendees': 20}], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['attendees'], 20)
+
+
+class ExportTests(EventsTestCase):
+    """Streaming export of contracts and events."""
+
+    def export(self, user, url):
+        self.client.force_authenticate(user=user)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_export_csv(self):
+        events = self.create_events(3)
+        rows = list(csv.reader(StringIO(self.export(self.manager, '/contracts/export/'))))
+        self.assertEqual(rows[0][:3], ['id', 'client_id', 'client_company_name'])
+        self.assertEqual([int(row[0]) for row in rows[1:]], [event.pk for event in events])
+        self.assertEqual(rows[1][2], 'company0')
+
+    def test_export_ndjson_filtered(self):
+        events = self.create_events(3)
+        lines = self.export(self.supporter, '/events/export/?output=ndjson')
+        rows = [json.loads(line) for line in lines.splitlines()]
+        self.assertEqual([row['contract_id'] for row in rows], [event.pk for event in events])
+        self.assertEqual(rows[0]['support_contact_username'], 'supporter')
+
+        lines = self.export(self.supporter, '/events/export/?output=ndjson&client__email=client1@company.com')
+        self.assertEqual([json.loads(line)['contract_id'] for line in lines.splitlines()], [events[1].pk])
+        other_supporter = self.create_user('other_supporter', 'Supporters')
+        self.assertEqual(self.export(other_supporter, '/events/export/?output=ndjson'), '')
+
+    def test_export_unknown_output(self):
+        self.client.force_authenticate(user=self.manager)
+        self.assertEqual(self.client.get('/contracts/export/?output=xml').status_code, 400)
+
+
+class StatsTests(EventsTestCase):
+    """Aggregates of the /stats/ endpoint."""
+
+    def get_stats(self, user, params=''):
+        self.client.force_authenticate(user=user)
+        response = self.client.get('/stats/' + params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_stats(self):
+        events = self.create_events(3)
+        Contract.objects.filter(pk=events[0].pk).update(is_signed=True)
+        stats = self.get_stats(self.manager, '?period=day')
+
+        self.assertEqual(stats['revenue_per_seller'], [{
+            'sales_contact': {'id': self.seller.pk, 'username': 'seller'},
+            'contracts': 3, 'revenue': 3003, 'signed_revenue': 1000,
+        }])
+        self.assertEqual(stats['unsigned_contracts'], {'contracts': 2, 'amount': 2003})
+        self.assertEqual(stats['events_per_supporter'][0]['statuses'], {
+            Event.StatusChoice.SCHEDULED: {'events': 3, 'attendees': 30},
+        })
+        self.assertEqual(len(stats['revenue_by_period']), 1)
+        self.assertEqual(stats['events_by_period'][0]['events'], 3)
+
+    def test_stats_visibility_and_cache(self):
+        self.create_events(2)
+        other_seller = self.create_user('other_seller', 'Sellers')
+        stats = self.get_stats(other_seller)
+        self.assertEqual(stats['revenue_per_seller'], [])
+        self.assertEqual(stats['unsigned_contracts'], {'contracts': 0, 'amount': 0})
+
+        self.assertEqual(self.get_stats(self.seller)['unsigned_contracts']['contracts'], 2)
+        # Cached: the same answer with no query on the contracts and events.
+        self.client.force_authenticate(user=self.seller)
+        with CaptureQueriesContext(connection) as context:
+            self.client.get('/stats/')
+        self.assertFalse([query for query in context.captured_queries if 'events_contract' in query['sql']])
+
+    def test_stats_invalid_parameters(self):
+        self.client.force_authenticate(user=self.manager)
+        self.assertEqual(self.client.get('/stats/?period=year').status_code, 400)
+        self.assertEqual(self.client.get('/stats/?start=yesterday').status_code, 400)
+
+
+class ResponseCacheTests(EventsTestCase):
+    """Cached responses of the list and detail endpoints, invalidated by the writes."""
+
+    def get(self, user, url, **headers):
+        self.client.force_authenticate(user=user)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, **headers)
+        return response, len(context.captured_queries)
+
+    def test_cached_detail_and_etag(self):
+        event = self.create_events(1)[0]
+        url = f'/clients/{event.contract.client_id}/'
+        response, _ = self.get(self.seller, url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        cached, queries = self.get(self.seller, url)
+        self.assertEqual(cached.data, response.data)
+        self.assertEqual(cached['ETag'], etag)
+        self.assertEqual(queries, 0)
+
+        not_modified, queries = self.get(self.seller, url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(queries, 0)
+
+        # Another user has his own visibility scope.
+        self.assertEqual(self.get(self.supporter, url, HTTP_IF_NONE_MATCH=etag)[0].status_code, 200)
+
+    def test_etag_of_expired_entry_follows_content(self):
+        # An entry read from a replica expires before the versions change: the replica may have caught up since.
+        event = self.create_events(1)[0]
+        url = f'/events/{event.pk}/'
+        with mock.patch.object(EventViewSet, 'response_cache_timeout', 0):
+            etag = self.get(self.supporter, url)[0]['ETag']
+            self.assertEqual(self.get(self.supporter, url, HTTP_IF_NONE_MATCH=etag)[0].status_code, 304)
+
+            # Changed without signal, as the rows replicated late.
+            Event.objects.filter(pk=event.pk).update(notes='replicated notes')
+            response, _ = self.get(self.supporter, url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['notes'], 'replicated notes')
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_invalidation_on_write(self):
+        event = self.create_events(1)[0]
+        url = f'/events/{event.pk}/'
+        etag = self.get(self.supporter, url)[0]['ETag']
+
+        event.notes = 'new notes'
+        event.save()
+        response, _ = self.get(self.supporter, url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['notes'], 'new notes')
+
+        self.client.force_authenticate(user=self.seller)
+        response = self.client.patch('/contracts/bulk/', [{'id': event.pk, 'amount': 7}], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get(self.supporter, url)[0].data['contract']['amount'], 7)
+
+    def test_invalidation_on_groups_change(self):
+        self.create_events(1)
+        other_seller = self.create_user('other_seller', 'Sellers')
+        self.assertEqual(len(self.get(other_seller, '/clients/')[0].data['results']), 0)
+
+        other_seller.groups.add(Group.objects.get(name='Managers'))
+        self.assertEqual(len(self.get(other_seller, '/clients/')[0].data['results']), 1)
+
+    def test_errors_not_cached(self):
+        event = self.create_events(1)[0]
+        other_supporter = self.create_user('other_supporter', 'Supporters')
+        url = f'/events/{event.pk}/'
+        self.assertEqual(self.get(other_supporter, url)[0].status_code, 404)
+        event.support_contact = other_supporter
+        event.save()
+        self.assertEqual(self.get(other_supporter, url)[0].status_code, 200)
+
+
+def slow_view(request):
+    start = time.monotonic()
+    time.sleep(0.3)
+    return HttpResponse(f'{start} {time.monotonic()}')
+
+
+# The urls of SlowASGIRequest.
+urlpatterns = [path('slow/', async_view(slow_view), name='slow')]
+
+
+class SlowASGIRequest(ASGIRequest):
+    urlconf = __name__
+
+
+class SlowASGIHandler(ASGIHandler):
+    request_class = SlowASGIRequest
+
+
+async def asgi_get(application, path, access=None, headers=()):
+    """Return the status and the body of a GET request on `path` served by the ASGI `application`."""
+    headers = [(b'host', b'127.0.0.1'), *headers]
+    if access is not None:
+        headers.append((b'authorization', f'Bearer {access}'.encode()))
+    communicator = ApplicationCommunicator(application, {
+        'type': 'http', 'method': 'GET', 'path': path, 'query_string': b'', 'root_path': '', 'headers': headers,
+    })
+    await communicator.send_input({'type': 'http.request', 'body': b''})
+    start = await communicator.receive_output(5)
+    body = b''
+    while True:
+        message = await communicator.receive_output(5)
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return start['status'], body
+
+
+class AsgiTests(TransactionTestCase):
+    """The API views run in the thread pool of the ASGI application."""
+
+    serialized_rollback = True
+
+    def test_pool_views(self):
+        def is_async(path):
+            return asyncio.iscoroutinefunction(resolve(path, urlconf='epicevents_project.asgi_urls').func)
+
+        self.assertTrue(is_async('/clients/'))
+        self.assertTrue(is_async('/events/1/'))
+        self.assertTrue(is_async('/login/'))
+        self.assertFalse(is_async('/contracts/export/'))
+        self.assertFalse(is_async('/admin/'))
+
+    def test_asgi_request(self):
+        from epicevents_project.asgi import application
+
+        user = User.objects.create_superuser('admin', 'admin@epicevents.com', 'first', 'last', 'password')
+        access = str(RoleRefreshToken.for_user(user).access_token)
+
+        status, body = async_to_sync(asgi_get)(application, '/clients/', access)
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body)['results'], [])
+
+    def test_asgi_export_compressed(self):
+        from epicevents_project.asgi import application
+
+        user = User.objects.create_superuser('admin', 'admin@epicevents.com', 'first', 'last', 'password')
+        client = Client.objects.create(
+            first_name='first', last_name='last', email='client@company.com', phone='0102030405',
+            mobile='0602030405', company_name='company', main_sales_contact=user,
+        )
+        contract = Contract.objects.create(client=client, sales_contact=user, amount=1000, payment_due=timezone.now())
+        Event.objects.create(contract=contract, support_contact=user, attendees=10, event_date=timezone.now())
+        access = str(RoleRefreshToken.for_user(user).access_token)
+
+        # Streamed from the database and compressed as it goes.
+        status, body = async_to_sync(asgi_get)(
+            application, '/events/export/', access, [(b'accept-encoding', b'gzip')]
+        )
+        self.assertEqual(status, 200)
+        rows = list(csv.reader(StringIO(gzip.decompress(body).decode())))
+        self.assertEqual(rows[0][0], 'contract_id')
+        self.assertEqual([row[0] for row in rows[1:]], [str(contract.pk)])
+
+    def test_asgi_request_measures(self):
+        from epicevents_project.asgi import application
+
+        registry.reset()
+        sampler.buckets.clear()
+        user = User.objects.create_superuser('admin', 'admin@epicevents.com', 'first', 'last', 'password')
+        access = str(RoleRefreshToken.for_user(user).access_token)
+        self.assertEqual(async_to_sync(asgi_get)(application, '/clients/', access)[0], 200)
+
+        requests, latency, sampled = registry.snapshot()
+        self.assertEqual(requests['clients-list', 'GET', 200], 1)
+        self.assertEqual(sum(latency['clients-list'][:-1]), 1)
+        # Measured in the thread of the view.
+        self.assertGreater(sampled['clients-list']['queries'], 0)
+        self.assertGreater(sampled['clients-list']['serializer'], 0)
+        self.assertGreater(sampled['clients-list']['permission'], 0)
+
+    def test_concurrent_requests(self):
+        # With all the middlewares of the settings: a sync-only one would serve the requests one at a time.
+        application = SlowASGIHandler()
+
+        async def get_all():
+            return await asyncio.gather(*[asgi_get(application, '/slow/') for _ in range(4)])
+
+        responses = async_to_sync(get_all)()
+        self.assertEqual([status for status, body in responses], [200] * 4)
+        times = [[float(value) for value in body.split()] for status, body in responses]
+        # All the views started before the first one ended.
+        self.assertLess(max(start for start, end in times), min(end for start, end in times))
+
+
+@skipUnless(connection.vendor == 'postgresql', 'The connection pool needs PostgreSQL')
+class ConnectionPoolTests(TestCase):
+    """Pool of PostgreSQL connections (see epicevents_project/db_backends/pooled_postgresql)."""
+
+    def setUp(self):
+        self.pool = ConnectionPool('test', connection.get_connection_params(), 1, 2, 0.1, 0)
+
+    def tearDown(self):
+        self.pool.closeall()
+
+    def test_reuse(self):
+        first = self.pool.getconn()
+        self.pool.putconn(first)
+        second = self.pool.getconn()
+        self.assertIs(second, first)
+        self.pool.putconn(second)
+        stats = self.pool.get_stats()
+        self.assertEqual((stats['checkouts'], stats['connections_opened'], stats['health_checks']), (2, 1, 1))
+
+    def test_exhausted(self):
+        connections = [self.pool.getconn(), self.pool.getconn()]
+        self.assertRaises(psycopg2.OperationalError, self.pool.getconn)
+        self.pool.putconn(connections.pop())
+        connections.append(self.pool.getconn())
+        for pooled in connections:
+            self.pool.putconn(pooled)
+        self.assertEqual(self.pool.get_stats()['timeouts'], 1)
+
+    def test_broken_connection_replaced(self):
+        pooled = self.pool.getconn()
+        with pooled.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        self.pool.putconn(pooled)
+        # Given back rolled back.
+        self.assertEqual(pooled.info.transaction_status, psycopg2.extensions.TRANSACTION_STATUS_IDLE)
+        pooled.close()
+        replacement = self.pool.getconn()
+        self.assertIsNot(replacement, pooled)
+        self.pool.putconn(replacement)
+        self.assertEqual(self.pool.get_stats()['connections_discarded'], 1)
+
+
+@override_settings(DATABASE_REPLICAS=['replica_1', 'replica_2'])
+class ReplicaRoutingTests(EventsTestCase):
+    """Reads of the safe requests sent to the replicas, with read-your-writes."""
+
+    def route(self, method, user=None, status=200, is_async=False):
+        """Pass a request through the middleware (its async path if `is_async`), return the database chosen for a
+        read in the view.
+        """
+        request = getattr(RequestFactory(), method)('/clients/')
+        routes = []
+
+        def view(request):
+            if user is not None:
+                # As DRF does once the token is checked.
+                request.user = user
+            routes.append(ReplicaRouter().db_for_read(Client))
+            return HttpResponse(status=status)
+
+        if is_async:
+            async def async_get_response(request):
+                return view(request)
+
+            async_to_sync(ReplicaRoutingMiddleware(async_get_response))(request)
+        else:
+            ReplicaRoutingMiddleware(view)(request)
+        return routes[0]
+
+    def test_safe_requests_read_replicas(self):
+        self.assertIn(self.route('get', self.seller), ['replica_1', 'replica_2'])
+        self.assertIn(self.route('head', self.seller), ['replica_1', 'replica_2'])
+        # Not authenticated yet, or out of a request.
+        self.assertEqual(self.route('get'), 'default')
+        self.assertEqual(ReplicaRouter().db_for_read(Client), 'default')
+
+    def test_read_your_writes(self):
+        self.assertEqual(self.route('post', self.seller, status=400), 'default')
+        self.assertIn(self.route('get', self.seller), ['replica_1', 'replica_2'])
+
+        self.assertEqual(self.route('patch', self.seller), 'default')
+        self.assertEqual(self.route('get', self.seller), 'default')
+        self.assertIn(self.route('get', self.supporter), ['replica_1', 'replica_2'])
+
+    def test_async_requests(self):
+        self.assertIn(self.route('get', self.seller, is_async=True), ['replica_1', 'replica_2'])
+        self.assertEqual(self.route('post', self.seller, is_async=True), 'default')
+        self.assertEqual(self.route('get', self.seller, is_async=True), 'default')
+        self.assertEqual(ReplicaRouter().db_for_read(Client), 'default')
+
+    def test_writes_and_migrations_on_primary(self):
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_write(Client), 'default')
+        self.assertTrue(router.allow_migrate('default', 'events'))
+        self.assertFalse(router.allow_migrate('replica_1', 'events'))
+
+
+@skipUnless('replica_1' in settings.DATABASES, 'No replica configured (DATABASE_REPLICA_HOSTS)')
+class ReplicaQueriesTests(EventsTestCase):
+    # Only the configured aliases: the system checks are run on all the databases of the test cases.
+    databases = {'default'} | {'replica_1'} & set(settings.DATABASES)
+
+    def test_list_reads_replica(self):
+        self.client.force_authenticate(user=self.seller)
+        with CaptureQueriesContext(connections['replica_1']) as context:
+            self.assertEqual(self.client.get('/clients/').status_code, 200)
+        self.assertTrue(context.captured_queries)
+
+
+class InstrumentationTests(EventsTestCase):
+
+    def setUp(self):
+        super(InstrumentationTests, self).setUp()
+        registry.reset()
+        sampler.buckets.clear()
+
+    def test_sampled_request_measures(self):
+        self.create_events(3)
+        self.client.force_authenticate(user=self.seller)
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.client.get('/clients/?with_permissions=true').status_code, 200)
+
+        requests, latency, sampled = registry.snapshot()
+        self.assertEqual(requests['clients-list', 'GET', 200], 1)
+        self.assertEqual(sum(latency['clients-list'][:-1]), 1)
+        sums = sampled['clients-list']
+        self.assertEqual(sums['count'], 1)
+        self.assertEqual(sums['queries'], len(context.captured_queries))
+        self.assertGreater(sums['query_time'], 0)
+        self.assertGreater(sums['serializer'], 0)
+        self.assertGreater(sums['permission'], 0)
+
+    def test_adaptive_sampling(self):
+        sampler = AdaptiveSampler(rate=1, burst=2)
+        self.assertEqual([sampler.sample('route') for _ in range(3)], [True, True, False])
+        # The other routes have their own budget.
+        self.assertTrue(sampler.sample('other'))
+
+    def test_unsampled_request_is_timed_only(self):
+        self.client.force_authenticate(user=self.seller)
+        sampler.buckets['clients-list'] = (0, float('inf'))
+        self.assertEqual(self.client.get('/clients/').status_code, 200)
+
+        requests, latency, sampled = registry.snapshot()
+        self.assertEqual(requests['clients-list', 'GET', 200], 1)
+        self.assertNotIn('clients-list', sampled)
+
+    def test_metrics_endpoint(self):
+        self.client.force_authenticate(user=self.seller)
+        self.client.get('/clients/')
+        self.client.get('/unknown/')
+
+        response = self.client.get('/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        text = response.content.decode()
+        self.assertIn('epicevents_http_requests_total{route="clients-list",method="GET",status="200"} 1', text)
+        self.assertIn('epicevents_http_requests_total{route="unmatched",method="GET",status="404"} 1', text)
+        self.assertIn('epicevents_http_request_duration_seconds_bucket{route="clients-list",le="+Inf"} 1', text)
+        self.assertIn('epicevents_db_queries_count{route="clients-list"} 1', text)
+
+        summary = self.client.get('/metrics/?format=json').json()
+        self.assertEqual(summary['clients-list']['requests'], 1)
+        self.assertGreater(summary['clients-list']['mean_queries'], 0)
+
+    def test_metrics_access(self):
+        self.assertEqual(self.client.get('/metrics/', REMOTE_ADDR='10.0.0.1').status_code, 403)
+        with override_settings(METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get('/metrics/').status_code, 403)
+            self.assertEqual(self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+
+
+class BenchmarkSuiteTests(TestCase):
+
+    def setUp(self):
+        # The roles cached by user id from the other tests.
+        forget_user_roles()
+
+    def test_generated_data(self):
+        counts = DataGenerator(seed=3).generate(users=10, clients=30)
+        self.assertEqual(counts['clients'], 30)
+        self.assertGreaterEqual(counts['contracts'], 30)
+        self.assertEqual(counts['events'], Event.objects.count())
+        self.assertEqual(User.objects.filter(groups__name='Managers', username__startswith='bench_').count(), 1)
+        self.assertEqual(User.objects.filter(groups__name='Sellers', username__startswith='bench_').count(), 4)
+        self.assertEqual(User.objects.filter(groups__name='Supporters', username__startswith='bench_').count(), 5)
+        # The access index is up to date.
+        seller = User.objects.get(username='bench_seller_0')
+        self.assertEqual(
+            set(accessible_ids(seller, CLIENT).values_list('object_id', flat=True)),
+            set(Client.objects.filter(
+                Q(main_sales_contact=seller) | Q(contracts__sales_contact=seller)
+            ).values_list('pk', flat=True)),
+        )
+
+        # Same data from the same seed, whatever the batches.
+        def get_data():
+            return list(Contract.objects.order_by('pk').values_list('client__email', 'amount', 'is_signed'))
+
+        first = get_data()
+        Contract.objects.all().delete()
+        Client.objects.all().delete()
+        DataGenerator(seed=3, batch_size=7).generate(users=10, clients=30)
+        self.assertEqual(get_data(), first)
+
+    def test_results_and_budgets(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'results.json')
+            call_command('benchmark_api', users=6, clients=20, repeat=1, output=output, stdout=StringIO())
+            with open(output) as file:
+                report = json.load(file)
+            self.assertEqual(len(report['results']), 3 * 3 * 5)
+            self.assertTrue(all(
+                result['queries'] <= result['budget'] for result in report['results'] if result['budget'] is not None
+            ))
+            # Measured, not checked: the supporters cannot create clients nor contracts.
+            refused = [result for result in report['results'] if result['status'] >= 400]
+            self.assertIn(('clients', 'create', 'supporter', 403),
+                          [(result['endpoint'], result['operation'], result['role'], result['status'])
+                           for result in refused])
+            self.assertTrue(all(result['budget'] is None for result in refused))
+
+            budgets = os.path.join(directory, 'budgets.json')
+            with open(budgets, 'w') as file:
+                json.dump({'clients list': 0}, file)
+            with self.assertRaisesMessage(CommandError, 'clients list as manager'):
+                call_command('benchmark_api', users=6, clients=20, repeat=1, budgets=budgets, stdout=StringIO())
+
+
+class StandaloneBenchmarkTests(TransactionTestCase):
+    """The benchmark run out of the transaction of a test, as from the command line."""
+
+    serialized_rollback = True
+
+    def setUp(self):
+        forget_user_roles()
+
+    def test_within_budgets(self):
+        # The BEGIN and ROLLBACK of the writes are not counted.
+        call_command('benchmark_api', users=6, clients=20, repeat=1, stdout=StringIO())
+
+
+class SeedDataTests(TestCase):
+
+    def setUp(self):
+        forget_user_roles()
+
+    def test_seed_data(self):
+        out = StringIO()
+        call_command('seed_data', clients=25, users=10, batch_size=10, stdout=out)
+        self.assertIn('rows/s', out.getvalue())
+        self.assertEqual(Client.objects.count(), 25)
+        self.assertEqual(User.objects.filter(username__startswith='bench_').count(), 10)
+        contracts = Contract.objects.count()
+        self.assertTrue(AccessIndex.objects.filter(object_type=EVENT).exists())
+        self.assertTrue(all(
+            contract.date_created < contract.payment_due for contract in Contract.objects.all()
+        ))
+
+        # Only the missing clients are added.
+        call_command('seed_data', clients=25, users=10, stdout=StringIO())
+        self.assertEqual(Contract.objects.count(), contracts)
+        call_command('seed_data', clients=30, users=10, stdout=StringIO())
+        self.assertEqual(Client.objects.count(), 30)
+
+    @skipUnless(connection.vendor == 'postgresql', 'COPY is specific to PostgreSQL')
+    def test_copy_same_as_bulk_create(self):
+        def get_data():
+            return list(Contract.objects.order_by('pk').values_list(
+                'client__email', 'sales_contact__username', 'amount', 'is_signed', 'event__status',
+            ))
+
+        DataGenerator(seed=5, use_copy=False).generate(users=10, clients=20)
+        bulk_data = get_data()
+        Contract.objects.all().delete()
+        Client.objects.all().delete()
+        DataGenerator(seed=5, use_copy=True).generate(users=10, clients=20)
+        self.assertEqual(get_data(), bulk_data)
+
+
+@override_settings(CHANGE_FEED_DELAY=0)
+class ChangeFeedTests(EventsTestCase):
+
+    def get_changes(self, user, url, cursor=None):
+        self.client.force_authenticate(user=user)
+        response = self.client.get(url, {'cursor': cursor} if cursor else {})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_updates_and_deletions(self):
+        events = self.create_events(3)
+        first = self.get_changes(self.manager, '/contracts/changes/')
+        self.assertEqual([row['id'] for row in first['results']], [event.pk for event in events])
+        self.assertEqual(first['deleted'], [])
+        seller_cursor = self.get_changes(self.seller, '/contracts/changes/')['cursor']
+
+        # Nothing changed since.
+        self.assertEqual(self.get_changes(self.manager, '/contracts/changes/', first['cursor'])['results'], [])
+
+        contract = events[1].contract
+        contract.amount = 5
+        contract.save()
+        events[2].contract.delete()
+        changes = self.get_changes(self.manager, '/contracts/changes/', first['cursor'])
+        self.assertEqual([row['id'] for row in changes['results']], [contract.pk])
+        self.assertEqual(changes['deleted'], [events[2].pk])
+        self.assertFalse(changes['has_more'])
+
+        seller_changes = self.get_changes(self.seller, '/contracts/changes/', seller_cursor)
+        self.assertEqual([row['id'] for row in seller_changes['results']], [contract.pk])
+        self.assertEqual(seller_changes['deleted'], [events[2].pk])
+
+        # The cascaded event is deleted from the feed of its supporter.
+        self.assertEqual(Tombstone.objects.filter(object_type=EVENT, user=self.supporter).count(), 1)
+
+    def test_visibility(self):
+        events = self.create_events(2)
+        other_supporter = self.create_user('other_supporter', 'Supporters')
+        cursor = self.get_changes(self.supporter, '/events/changes/')['cursor']
+        other_cursor = self.get_changes(other_supporter, '/events/changes/')['cursor']
+        self.assertEqual(self.get_changes(other_supporter, '/events/changes/')['results'], [])
+
+        event = events[0]
+        event.support_contact = other_supporter
+        event.save()
+        # No longer visible to the supporter, visible to the other one.
+        changes = self.get_changes(self.supporter, '/events/changes/', cursor)
+        self.assertEqual((changes['results'], changes['deleted']), ([], [event.pk]))
+        changes = self.get_changes(other_supporter, '/events/changes/', other_cursor)
+        self.assertEqual([row['contract']['id'] for row in changes['results']], [event.pk])
+        self.assertEqual(changes['deleted'], [])
+
+        # Visible again: its date_updated changes with its access, not only with its fields.
+        client = event.contract.client
+        new_seller = self.create_user('new_seller', 'Sellers')
+        cursor = self.get_changes(new_seller, '/contracts/changes/')['cursor']
+        client.main_sales_contact = new_seller
+        client.save()
+        changes = self.get_changes(new_seller, '/contracts/changes/', cursor)
+        self.assertEqual([row['id'] for row in changes['results']], [event.pk])
+
+    def test_pages_and_expired_cursor(self):
+        self.create_events(3)
+        self.client.force_authenticate(user=self.manager)
+        response = self.client.get('/contracts/changes/?page_size=2')
+        self.assertTrue(response.data['has_more'])
+        self.assertEqual(len(response.data['results']), 2)
+        response = self.client.get(response.data['next'])
+        self.assertFalse(response.data['has_more'])
+        self.assertEqual(len(response.data['results']), 1)
+
+        old = timezone.now() - timedelta(days=31)
+        response = self.client.get('/contracts/changes/', {'cursor': encode_cursor((old, 1), (old, 1))})
+        self.assertEqual(response.status_code, 410)
+        self.assertEqual(self.client.get('/contracts/changes/?cursor=bad').status_code, 404)
+
+    def test_cursor_without_deletions_does_not_expire(self):
+        self.create_events(1)
+        now = timezone.now()
+        cursor = self.get_changes(self.seller, '/contracts/changes/')['cursor']
+        # Polled regularly, never a deletion.
+        for days in (20, 40, 60):
+            with mock.patch('django.utils.timezone.now', return_value=now + timedelta(days=days)):
+                changes = self.get_changes(self.seller, '/contracts/changes/', cursor)
+            self.assertEqual((changes['results'], changes['deleted']), ([], []))
+            cursor = changes['cursor']
+
+    def test_cursor_bounds_first_field(self):
+        # Each poll starts the index range scans at the cursor.
+        self.create_events(2)
+        cursor = self.get_changes(self.manager, '/contracts/changes/')['cursor']
+        with CaptureQueriesContext(connection) as context:
+            self.get_changes(self.manager, '/contracts/changes/', cursor)
+        sql = '\n'.join(query['sql'] for query in context.captured_queries)
+        for table, field in (('events_contract', 'date_updated'), ('events_tombstone', 'date_deleted')):
+            column = re.escape(f'"{table}"."{field}"')
+            self.assertRegex(sql, rf'{column} >= (.+?) AND \({column} > \1 OR')
+
+    def test_prune_tombstones(self):
+        events = self.create_events(2)
+        for event in events:
+            event.contract.delete()
+        Tombstone.objects.filter(object_id=events[0].pk).update(date_deleted=timezone.now() - timedelta(days=31))
+        call_command('prune_tombstones', stdout=StringIO())
+        self.assertEqual(set(Tombstone.objects.values_list('object_id', flat=True)), {events[1].pk})
+
+
+class RenderingTests(EventsTestCase):
+    """Renderers selected by the Accept header, and compression of the large responses."""
+
+    @skipUnless(renderers.orjson is not None, 'orjson is not installed')
+    def test_orjson_same_output_as_json(self):
+        data = {
+            'date': timezone.now(), 'day': timezone.now().date(), 'amount': Decimal('12.50'),
+            'lazy': gettext_lazy('Invalid cursor'), 1: ['\u2028', 'é', None, 1.5, True], 'nested': [{'a': ()}],
+        }
+        for media_type in (None, 'application/json; indent=2', 'application/json; indent=4'):
+            self.assertEqual(
+                renderers.ORJSONRenderer().render(data, media_type), JSONRenderer().render(data, media_type)
+            )
+
+    @skipUnless(renderers.orjson is not None, 'orjson is not installed')
+    def test_orjson_renderer_by_default(self):
+        self.create_events(2)
+        self.client.force_authenticate(user=self.manager)
+        response = self.client.get('/events/')
+        self.assertIsInstance(response.accepted_renderer, renderers.ORJSONRenderer)
+        self.assertEqual(response.content, JSONRenderer().render(response.data))
+
+    @skipUnless(renderers.msgpack is not None, 'msgpack is not installed')
+    def test_msgpack_renderer(self):
+        self.create_events(2)
+        self.client.force_authenticate(user=self.manager)
+        response = self.client.get('/events/', HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(
+            renderers.msgpack.unpackb(response.content), json.loads(JSONRenderer().render(response.data))
+        )
+
+    @override_settings(COMPRESSION_MIN_SIZE=500)
+    def test_gzip_compression(self):
+        self.create_events(5)
+        self.client.force_authenticate(user=self.manager)
+        plain = self.client.get('/events/')
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertIn('Accept-Encoding', plain['Vary'])
+
+        response = self.client.get('/events/', HTTP_ACCEPT_ENCODING='gzip, br;q=0')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertEqual(response['ETag'], 'W/' + plain['ETag'])
+        # The weak ETag still matches.
+        response = self.client.get('/events/', HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        # Small responses are not compressed.
+        with self.settings(COMPRESSION_MIN_SIZE=len(plain.content) + 1):
+            response = self.client.get('/events/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotIn('Content-Encoding', response)
+
+    @skipUnless(compression.brotli is not None, 'brotli is not installed')
+    @override_settings(COMPRESSION_MIN_SIZE=500)
+    def test_brotli_compression(self):
+        self.create_events(5)
+        self.client.force_authenticate(user=self.manager)
+        plain = self.client.get('/events/')
+        response = self.client.get('/events/', HTTP_ACCEPT_ENCODING='gzip, deflate, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(compression.brotli.decompress(response.content), plain.content)
+
+    def test_streaming_compression(self):
+        self.create_events(3)
+        self.client.force_authenticate(user=self.manager)
+        plain = b''.join(self.client.get('/events/export/').streaming_content)
+        response = self.client.get('/events/export/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), plain)
+
+    def test_async_streaming_compression(self):
+        async def get_response(request):
+            return StreamingHttpResponse(iter([b'line\n'] * 1000))
+
+        middleware = CompressionMiddleware(get_response)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        request = RequestFactory().get('/events/export/', HTTP_ACCEPT_ENCODING='gzip')
+        response = async_to_sync(middleware)(request)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), b'line\n' * 1000)
+
+    def test_async_iterator_compression(self):
+        # The streaming content of Django 4.2+ may be an async iterator.
+        async def lines():
+            for _ in range(1000):
+                yield b'line\n'
+
+        async def read():
+            return b''.join([chunk async for chunk in acompress_stream(gzip_compressor, lines())])
+
+        self.assertEqual(gzip.decompress(async_to_sync(read)()), b'line\n' * 1000)
+
+    def test_benchmark_command(self):
+        output = StringIO()
+        call_command('benchmark_renderers', users=6, clients=20, events=10, repeat=1, stdout=output)
+        self.assertIn('gzip', output.getvalue())
+
+
+class CompiledReadTests(EventsTestCase):
+    """The compiled read path renders exactly what the serializers render."""
+
+    def get_content(self, user, url):
+        cache.clear()
+        self.client.force_authenticate(user=user)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.content
+
+    def test_golden_event(self):
+        event = self.create_events(1)[0]
+        date = timezone.datetime(2021, 8, 1, 9, 30, 15, 123456, tzinfo=timezone.utc)
+        Contract.objects.filter(pk=event.pk).update(date_created=date, payment_due=date, amount=1500.5)
+        Event.objects.filter(pk=event.pk).update(event_date=date)
+        client_id, seller_id, supporter_id = event.contract.client_id, self.seller.pk, self.supporter.pk
+        golden = (
+            f'{{"pk":{event.pk},"contract":{{"id":{event.pk},"client":{{"id":{client_id},"first_name":"first0",'
+            f'"last_name":"last0","email":"client0@company.com","phone":"0102030405","mobile":"0602030405",'
+            f'"company_name":"company0","is_official_client":false,"main_sales_contact":{{"id":{seller_id},'
+            f'"username":"seller"}}}},"sales_contact":{{"id":{seller_id},"username":"seller"}},"is_signed":false,'
+            f'"amount":1500.5,"payment_due":"2021-08-01T09:30:15.123456Z",'
+            f'"date_created":"2021-08-01T09:30:15.123456Z"}},"support_contact":{{"id":{supporter_id},'
+            f'"username":"supporter"}},"status":"SCHEDULED","attendees":10,"event_date":"2021-08-01T09:30:15.123456Z",'
+            f'"notes":"notes"}}'
+        ).encode()
+        self.assertEqual(self.get_content(self.manager, f'/events/{event.pk}/'), golden)
+        self.assertIn(golden, self.get_content(self.manager, '/events/'))
+
+    def test_same_output_as_serializers(self):
+        events = self.create_events(3)
+        # Null relations.
+        Client.objects.filter(pk=events[0].contract.client_id).update(main_sales_contact=None)
+        Contract.objects.filter(pk=events[1].pk).update(client=None)
+        Event.objects.filter(pk=events[2].pk).update(support_contact=None)
+
+        urls = [
+            '/clients/', f'/clients/{events[0].contract.client_id}/', '/clients/?page_size=2',
+            '/contracts/?with_permissions=true', f'/contracts/{events[1].pk}/',
+            '/events/', '/events/?page_size=1&with_permissions=true', f'/events/{events[2].pk}/',
+        ]
+        for url in urls:
+            compiled = self.get_content(self.manager, url)
+            with mock.patch.object(ClientViewSet, 'compiled_read', False), \
+                    mock.patch.object(ContractViewSet, 'compiled_read', False), \
+                    mock.patch.object(EventViewSet, 'compiled_read', False):
+                self.assertEqual(compiled, self.get_content(self.manager, url), url)
+
+        # Same cursors: the next page is the same with both read paths.
+        self.client.force_authenticate(user=self.manager)
+        cache.clear()
+        next_url = self.client.get('/events/?page_size=1').data['next']
+        self.assertEqual([row['pk'] for row in self.client.get(next_url).data['results']], [events[1].pk])
+
+    def test_not_compiled_serializer(self):
+        class DisplayedClientSerializer(ClientSerializer):
+            display_name = serializers.SerializerMethodField()
+
+            class Meta(ClientSerializer.Meta):
+                fields = ClientSerializer.Meta.fields + ['display_name']
+
+            def get_display_name(self, client):
+                return f'{client.first_name} {client.last_name}'
+
+        self.assertIsNone(compile_serializer(DisplayedClientSerializer))
+        self.assertIsNotNone(compile_serializer(EventSerializer))
+
+    def test_benchmark_command(self):
+        output = StringIO()
+        call_command('benchmark_serializers', users=6, clients=20, rows=10, repeat=1, stdout=output)
+        self.assertIn('speedup', output.getvalue())
+
+
+class SparseFieldsetTests(EventsTestCase):
+    """?fields= and ?expand= on the list and detail endpoints."""
+
+    def get(self, url):
+        cache.clear()
+        self.client.force_authenticate(user=self.manager)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        return response, [query['sql'] for query in context.captured_queries]
+
+    def test_fields(self):
+        event = self.create_events(2)[0]
+        response, queries = self.get('/events/?fields=pk,status,event_date')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.data['results'][0]), ['pk', 'status', 'event_date'])
+        self.assertNotIn('notes', queries[-1])
+        self.assertNotIn('JOIN', queries[-1])
+
+        response, _ = self.get(f'/events/{event.pk}/?fields=pk,notes')
+        self.assertEqual(response.data, {'pk': event.pk, 'notes': 'notes'})
+
+    def test_relations_as_primary_keys(self):
+        event = self.create_events(1)[0]
+        response, queries = self.get('/contracts/?fields=id,client,sales_contact')
+        self.assertEqual(response.data['results'], [
+            {'id': event.pk, 'client': event.contract.client_id, 'sales_contact': self.seller.pk},
+        ])
+        self.assertNotIn('JOIN', queries[-1])
+
+        # Expanded: the relations of the relation stay primary keys unless expanded too.
+        response, _ = self.get('/contracts/?expand=client')
+        row = response.data['results'][0]
+        self.assertEqual(row['client']['company_name'], 'company0')
+        self.assertEqual(row['client']['main_sales_contact'], self.seller.pk)
+        self.assertEqual(row['sales_contact'], self.seller.pk)
+
+        response, _ = self.get('/events/?fields=pk,contract.amount,contract.client.company_name')
+        self.assertEqual(response.data['results'], [
+            {'pk': event.pk, 'contract': {'amount': 1000.0, 'client': {'company_name': 'company0'}}},
+        ])
+        response, _ = self.get('/events/?expand=contract.client.main_sales_contact&fields=contract')
+        self.assertEqual(response.data['results'][0]['contract']['client']['main_sales_contact']['username'], 'seller')
+
+    def test_same_output_without_compilation(self):
+        self.create_events(2)
+        for url in ('/events/?fields=pk,status,contract.client', '/contracts/?expand=client,sales_contact'):
+            compiled = self.get(url)[0].content
+            with mock.patch.object(EventViewSet, 'compiled_read', False), \
+                    mock.patch.object(ContractViewSet, 'compiled_read', False):
+                self.assertEqual(self.get(url)[0].content, compiled)
+
+    def test_invalid_names(self):
+        response, _ = self.get('/events/?fields=pk,unknown&expand=status')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.data), {'fields', 'expand'})
+
+    def test_default_unchanged(self):
+        self.create_events(1)
+        response, _ = self.get('/events/?fields=&expand=')
+        self.assertEqual(response.data['results'][0]['contract']['client']['main_sales_contact']['username'], 'seller')
+
+
+class AdminChangelistTests(EventsTestCase):
+    """The changelists of the admin run a constant number of queries per page."""
+
+    def setUp(self):
+        super(AdminChangelistTests, self).setUp()
+        for user in (self.manager, self.seller):
+            user.is_staff = True
+            user.save()
+
+    def get(self, user, url):
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(context.captured_queries)
+
+    def test_constant_queries(self):
+        self.create_events(2)
+        urls = ('/admin/events/client/', '/admin/events/contract/', '/admin/events/event/')
+        # The roles of the users are cached by their first request.
+        self.get(self.manager, urls[0])
+        self.get(self.seller, urls[0])
+        few_rows = {(user, url): self.get(user, url)[1] for user in (self.manager, self.seller) for url in urls}
+        self.create_events(5)
+        for (user, url), queries in few_rows.items():
+            self.assertEqual(self.get(user, url)[1], queries, url)
+
+    def test_search_and_date_filter(self):
+        events = self.create_events(3)
+        response, _ = self.get(self.manager, '/admin/events/event/?q=last1')
+        self.assertEqual([event.pk for event in response.context['cl'].result_list], [events[1].pk])
+        self.assertEqual(self.get(self.manager, '/admin/events/contract/?q=ast1')[0].context['cl'].result_count, 0)
+
+        Event.objects.filter(pk=events[0].pk).update(event_date=timezone.now() - timedelta(days=400))
+        since, until = timezone.now() - timedelta(days=7), timezone.now() + timedelta(days=90)
+        response, _ = self.get(self.manager, '/admin/events/event/?' + urlencode({
+            'event_date__gte': since.isoformat(), 'event_date__lt': until.isoformat(),
+        }))
+        self.assertEqual(response.context['cl'].result_count, 2)
+        self.assertFalse(response.context['cl'].show_full_result_count)
+
+
+class CountTests(EventsTestCase):
+    """Exact counts below COUNT_EXACT_THRESHOLD, estimated above."""
+
+    def test_exact_below_threshold(self):
+        self.create_events(3)
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(get_count(Event.objects.all(), threshold=5), (3, True))
+        self.assertIn('LIMIT 6', context.captured_queries[0]['sql'])
+
+    def test_estimated_above_threshold(self):
+        self.create_events(3)
+        with mock.patch('events.counts.estimate_count', return_value=2) as estimate_count:
+            # Never less than what was counted.
+            self.assertEqual(get_count(Event.objects.all(), threshold=2), (3, False))
+            estimate_count.return_value = 500000
+            self.assertEqual(get_count(Event.objects.all(), threshold=2), (500000, False))
+        if connection.vendor != 'postgresql':
+            # No estimate: counted.
+            self.assertEqual(get_count(Event.objects.all(), threshold=2), (3, True))
+
+    @skipUnless(connection.vendor == 'postgresql', 'Estimates of PostgreSQL')
+    def test_postgresql_estimates(self):
+        self.create_events(5)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE events_event')
+        count, exact = get_count(Event.objects.all(), threshold=2)
+        self.assertFalse(exact)
+        self.assertGreaterEqual(count, 3)
+        count, exact = get_count(Event.objects.filter(status='SCHEDULED'), threshold=2)
+        self.assertFalse(exact)
+        self.assertGreaterEqual(count, 3)
+
+    def test_api_count(self):
+        self.create_events(3)
+        self.client.force_authenticate(user=self.supporter)
+        response = self.client.get('/events/?page_size=2&with_count=true')
+        self.assertEqual(response.data['count'], 3)
+        self.assertTrue(response.data['count_is_exact'])
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertNotIn('count', self.client.get('/events/').data)
+
+        self.client.force_authenticate(user=self.seller)
+        with override_settings(COUNT_EXACT_THRESHOLD=1), \
+                mock.patch('events.counts.estimate_count', return_value=1000):
+            response = self.client.get('/contracts/?with_count=true&fields=id')
+        self.assertEqual((response.data['count'], response.data['count_is_exact']), (1000, False))
+
+    def test_admin_paginator(self):
+        self.create_events(3)
+        self.manager.is_staff = True
+        self.manager.save()
+        self.client.force_login(self.manager)
+        with override_settings(COUNT_EXACT_THRESHOLD=2), \
+                mock.patch('events.counts.estimate_count', return_value=1000):
+            response = self.client.get('/admin/events/event/')
+        self.assertIsInstance(response.context['cl'].paginator, EstimatedCountPaginator)
+        self.assertEqual(response.context['cl'].result_count, 1000)
+        self.assertFalse(response.context['cl'].paginator.count_is_exact)
@@ -4,6 +4,7 @@ from .views import (
     ClientViewSet,
     ContractViewSet,
     EventViewSet,
+    StatsView,
 )
 
 # See: https://github.com/alanjds/drf-nested-routers
@@ -27,4 +28,5 @@ urlpatterns = [
     path('', include(router.urls)),
     path('', include(clients_router.urls)),
     path('', include(contracts_router.urls)),
+    path('stats/', StatsView.as_view(), name='stats'),
 ]
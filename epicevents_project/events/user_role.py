@@ -1,17 +1,135 @@
-"""Define some 'shortcut' to ask the role of a user."""
+"""Define some 'shortcut' to ask the role of a user.
+
+The group names of a user are loaded with one query, then memoized on the user object (which lives as long as the
+request) and kept across requests in a process-local LRU cache. The cache entries are invalidated when the groups of
+a user change (see signals.py) and expire after ROLE_CACHE_TIMEOUT seconds, so that the other worker processes also
+see the changes.
+
+The roles version of a user is a fingerprint of his roles, embedded in his access tokens (see users/tokens.py) and
+compared to the current one, kept in a cache of the same kind, to reject the tokens issued before a change.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+
+MANAGERS = 'Managers'
+SELLERS = 'Sellers'
+SUPPORTERS = 'Supporters'
+
+
+class RoleCache:
+    """Thread-safe LRU cache of the group names of the users, by user id."""
+
+    def __init__(self, maxsize, timeout):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            roles, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return roles
+
+    def set(self, user_id, roles):
+        with self._lock:
+            self._entries[user_id] = (roles, time.monotonic() + self.timeout)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_ids=None):
+        """Forget the roles of the given users, or of all the users if `user_ids` is None."""
+        with self._lock:
+            if user_ids is None:
+                self._entries.clear()
+                return
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+
+
+role_cache = RoleCache(
+    maxsize=getattr(settings, 'ROLE_CACHE_SIZE', 1024),
+    timeout=getattr(settings, 'ROLE_CACHE_TIMEOUT', 60),
+)
+
+version_cache = RoleCache(
+    maxsize=getattr(settings, 'ROLE_CACHE_SIZE', 1024),
+    timeout=getattr(settings, 'ROLE_CACHE_TIMEOUT', 60),
+)
+
+
+def get_user_roles(user):
+    """Return the names of the groups of a user as a frozenset."""
+    if not user.is_authenticated:
+        return frozenset()
+
+    roles = getattr(user, '_roles', None)
+    if roles is None:
+        roles = role_cache.get(user.pk)
+        if roles is None:
+            roles = frozenset(user.groups.values_list('name', flat=True))
+            role_cache.set(user.pk, roles)
+        user._roles = roles
+    return roles
+
+
+def forget_user_roles(user_ids=None):
+    """Invalidate the cached roles of the given users (all the users if `user_ids` is None)."""
+    role_cache.invalidate(user_ids)
+    version_cache.invalidate(user_ids)
+
+
+def get_roles_fingerprint(roles, is_superuser, is_active):
+    value = repr((sorted(roles), bool(is_superuser), bool(is_active)))
+    return hashlib.sha1(value.encode()).hexdigest()[:16]
+
+
+def load_membership(user_id):
+    """Read the roles of a user from the database, with one query, and refresh the caches.
+    Return (roles, is_superuser, is_active), or None if the user does not exist.
+    """
+    rows = list(get_user_model().objects.filter(pk=user_id).values_list('is_superuser', 'is_active', 'groups__name'))
+    if not rows:
+        return None
+
+    roles = frozenset(name for _, _, name in rows if name is not None)
+    is_superuser, is_active = rows[0][:2]
+    role_cache.set(user_id, roles)
+    version_cache.set(user_id, get_roles_fingerprint(roles, is_superuser, is_active))
+    return roles, is_superuser, is_active
+
+
+def get_roles_version(user_id):
+    """Return the current roles version of a user, None if the user does not exist."""
+    version = version_cache.get(user_id)
+    if version is None and load_membership(user_id) is not None:
+        version = version_cache.get(user_id)
+    return version
 
 
 def is_seller(user):
-    return user.groups.filter(name='Sellers').exists()
+    return SELLERS in get_user_roles(user)
 
 
 def is_supporter(user):
-    return user.groups.filter(name='Supporters').exists()
+    return SUPPORTERS in get_user_roles(user)
 
 
 def is_superuser_or_manager(user):
-    if user.is_superuser or user.groups.filter(name__in=['Managers']).exists():
-        return True
+    return user.is_superuser or MANAGERS in get_user_roles(user)
 
 
 def superuser_or_manager_permission(func):
@@ -1,9 +1,15 @@
 """API Views for different requests about user, project, issue and comment.
 """
 from rest_framework import viewsets
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework_extensions.mixins import NestedViewSetMixin
 from django.db import IntegrityError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from epicevents_project.instrumentation import InstrumentedViewMixin
 
 from .models import (
     User,
@@ -20,18 +26,32 @@ from .exceptions import UniqueConstraint, get_object_or_404_error
 from .permissions import ClientPermission, ContractPermission, EventPermission
 from .admin import ClientAdminConfig, ContractAdminConfig, EventAdminConfig
 from .filters import ClientFilter, ContractFilter, EventFilter
-
-
-class ClientViewSet(NestedViewSetMixin, viewsets.ModelViewSet):
+from .querysets import QuerysetShapingMixin
+from .object_permissions import ObjectPermissionsListMixin
+from .compiled import CompiledReadMixin
+from .bulk import BulkViewSetMixin
+from .response_cache import ResponseCacheMixin
+from .export import ExportViewSetMixin
+from .changes import ChangeFeedMixin
+from .access_index import CONTRACT, EVENT
+from .pagination import ClientPagination, ContractPagination, EventPagination
+from .stats import PERIODS, get_stats
+
+
+class ClientViewSet(InstrumentedViewMixin, ResponseCacheMixin, BulkViewSetMixin, CompiledReadMixin,
+                    ObjectPermissionsListMixin, QuerysetShapingMixin, NestedViewSetMixin, viewsets.ModelViewSet):
     """A viewset for viewing and editing client instances."""
 
     serializer_class = ClientSerializer
     permission_classes = [ClientPermission]
     filterset_class = ClientFilter
+    pagination_class = ClientPagination
+    select_related_fields = ('main_sales_contact',)
+    bulk_references = {'main_sales_contact': (User, 'Main sales contact not found')}
 
     def get_queryset(self):
         """Define a set of clients that the authenticated user can access."""
-        return ClientAdminConfig.get_queryset(self, self.request)
+        return self.shape_queryset(ClientAdminConfig.get_queryset(self, self.request))
 
     def create(self, request, *args, **kwargs):
         """Create a client."""
@@ -72,16 +92,39 @@ class ClientViewSet(NestedViewSetMixin, viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class ContractViewSet(NestedViewSetMixin, viewsets.ModelViewSet):
+class ContractViewSet(InstrumentedViewMixin, ResponseCacheMixin, ExportViewSetMixin, ChangeFeedMixin,
+                      BulkViewSetMixin, CompiledReadMixin, ObjectPermissionsListMixin, QuerysetShapingMixin,
+                      NestedViewSetMixin, viewsets.ModelViewSet):
     """ A viewset for viewing and editing contract instances."""
 
     serializer_class = ContractSerializer
     permission_classes = [ContractPermission]
     filterset_class = ContractFilter
+    pagination_class = ContractPagination
+    select_related_fields = ('client__main_sales_contact', 'sales_contact')
+    bulk_references = {
+        'client': (Client, 'Client not found'),
+        'sales_contact': (User, 'Sales contact not found'),
+    }
+    # A contract is predetermined to belong to a unique client.
+    bulk_immutable_fields = ('client',)
+    changes_object_type = CONTRACT
+    export_columns = (
+        ('id', 'id'),
+        ('client_id', 'client_id'),
+        ('client_company_name', 'client__company_name'),
+        ('client_email', 'client__email'),
+        ('sales_contact_id', 'sales_contact_id'),
+        ('sales_contact_username', 'sales_contact__username'),
+        ('is_signed', 'is_signed'),
+        ('amount', 'amount'),
+        ('payment_due', 'payment_due'),
+        ('date_created', 'date_created'),
+    )
 
     def get_queryset(self):
         """Define a set of contracts that the authenticated user can access."""
-        return ContractAdminConfig.get_queryset(self, self.request)
+        return self.shape_queryset(ContractAdminConfig.get_queryset(self, self.request))
 
     def create(self, request, *args, **kwargs):
         """Create a contract."""
@@ -134,16 +177,49 @@ class ContractViewSet(NestedViewSetMixin, viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class EventViewSet(viewsets.ModelViewSet):
+class EventViewSet(InstrumentedViewMixin, ResponseCacheMixin, ExportViewSetMixin, ChangeFeedMixin,
+                   BulkViewSetMixin, CompiledReadMixin, ObjectPermissionsListMixin, QuerysetShapingMixin,
+                   viewsets.ModelViewSet):
     """A viewset for viewing and editing event instances."""
 
     serializer_class = EventSerializer
     permission_classes = [EventPermission]
     filterset_class = EventFilter
+    pagination_class = EventPagination
+    select_related_fields = ('contract__client__main_sales_contact', 'contract__sales_contact', 'support_contact')
+    bulk_references = {
+        'contract': (Contract, 'Contract not found'),
+        'support_contact': (User, 'Support contact not found'),
+    }
+    # The contract signed is determined before making an event.
+    bulk_immutable_fields = ('contract',)
+    changes_object_type = EVENT
+    export_columns = (
+        ('contract_id', 'contract_id'),
+        ('client_id', 'contract__client_id'),
+        ('client_company_name', 'contract__client__company_name'),
+        ('support_contact_id', 'support_contact_id'),
+        ('support_contact_username', 'support_contact__username'),
+        ('status', 'status'),
+        ('attendees', 'attendees'),
+        ('event_date', 'event_date'),
+        ('notes', 'notes'),
+    )
 
     def get_queryset(self):
         """Define a set of events that the authenticated user can access."""
-        return EventAdminConfig.get_queryset(self, self.request)
+        return self.shape_queryset(EventAdminConfig.get_queryset(self, self.request))
+
+    def get_bulk_create_errors(self, objects):
+        """An event is unique for a contract."""
+        contract_ids = [event.contract_id for event in objects]
+        existing = set(Event.objects.filter(pk__in=contract_ids).values_list('pk', flat=True))
+        errors, seen = {}, set()
+        for index, contract_id in enumerate(contract_ids):
+            if contract_id in existing or contract_id in seen:
+                errors[index] = {'contract': ['Unique constraint. An event is already created for this contract.']}
+            seen.add(contract_id)
+        return errors
 
     def create(self, request, *args, **kwargs):
         """Create an event."""
@@ -200,3 +276,36 @@ class EventViewSet(viewsets.ModelViewSet):
         serializer.save(support_contact=support_contact)
 
         return Response(serializer.data)
+
+
+class StatsView(InstrumentedViewMixin, APIView):
+    """Revenue of the contracts and load of the events, aggregated over what the authenticated user can see.
+
+    Query parameters: period (day, week or month), start and end (ISO datetimes).
+    """
+
+    def get(self, request, *args, **kwargs):
+        period = request.query_params.get('period', 'month')
+        if period not in PERIODS:
+            raise ValidationError({'period': [f'Expected one of: {", ".join(PERIODS)}.']})
+
+        bounds = {}
+        for name in ('start', 'end'):
+            value = request.query_params.get(name)
+            try:
+                bounds[name] = parse_datetime(value) if value else None
+            except ValueError:
+                bounds[name] = None
+            if value and bounds[name] is None:
+                raise ValidationError({name: ['Enter a valid date/time.']})
+            if bounds[name] and timezone.is_naive(bounds[name]):
+                bounds[name] = timezone.make_aware(bounds[name])
+
+        stats = get_stats(
+            request.user,
+            ContractAdminConfig.get_queryset(self, request),
+            EventAdminConfig.get_queryset(self, request),
+            period=period,
+            **bounds,
+        )
+        return Response(stats)
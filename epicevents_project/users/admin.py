@@ -5,6 +5,7 @@ from django.forms import Textarea
 from django.contrib import admin
 from django.contrib.auth.backends import ModelBackend
 
+from events.user_role import is_superuser_or_manager
 from .models import User
 
 
@@ -38,7 +39,7 @@ class UserAdminConfig(UserAdmin, ModelBackend):
     )
 
     def has_module_permission(self, request):
-        if request.user.is_superuser or request.user.groups.filter(name__in=['Managers']).exists():
+        if is_superuser_or_manager(request.user):
             return True
         return False
 
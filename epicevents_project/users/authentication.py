@@ -0,0 +1,74 @@
+"""Authentication of the API calls by a JWT access token, without loading the user from the database.
+
+The access tokens issued by the login (see tokens.py) carry the roles of the user and their version. The version is
+compared to the current one, read from a process-local cache (see events/user_role.py), so that the tokens issued
+before a change of the groups of the user (or of is_superuser, is_active) are rejected: the client gets a new access
+token from /token/refresh/, which carries the new roles. The tokens without roles are authenticated as before.
+"""
+
+from django.contrib.auth import get_user_model
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from events.user_role import get_roles_version
+
+
+class LazyTokenUser:
+    """A user built from the claims of a token. The user model is loaded only when an attribute which is not in the
+    token is needed. Equal to any user with the same pk.
+    """
+
+    is_active = True
+    is_anonymous = False
+    is_authenticated = True
+
+    def __init__(self, token):
+        self.token = token
+        self.pk = self.id = token[api_settings.USER_ID_CLAIM]
+        self.username = token['username']
+        self.is_superuser = token['is_superuser']
+        # Memoized roles of events.user_role.get_user_roles().
+        self._roles = frozenset(token['roles'])
+
+    def __getattr__(self, name):
+        if name.startswith('__') or name == '_user':
+            raise AttributeError(name)
+        if '_user' not in self.__dict__:
+            self._user = get_user_model().objects.get(pk=self.pk)
+        return getattr(self._user, name)
+
+    def __eq__(self, other):
+        return getattr(other, 'pk', None) == self.pk and (
+            isinstance(other, (LazyTokenUser, get_user_model()))
+        )
+
+    def __hash__(self):
+        return hash(self.pk)
+
+    def __str__(self):
+        return self.username
+
+    def get_username(self):
+        return self.username
+
+
+class RoleJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication returning a LazyTokenUser for the tokens carrying the roles of the user."""
+
+    def get_user(self, validated_token):
+        if 'roles_version' not in validated_token:
+            return super(RoleJWTAuthentication, self).get_user(validated_token)
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        version = get_roles_version(user_id)
+        if version is None:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        if version != validated_token['roles_version']:
+            raise InvalidToken(_('The roles of the user changed, the token must be refreshed'))
+        return LazyTokenUser(validated_token)
@@ -0,0 +1,16 @@
+"""Password hashers.
+
+TunedArgon2PasswordHasher is Django's Argon2 hasher with its cost parameters taken from the settings
+(ARGON2_TIME_COST, ARGON2_MEMORY_COST in KiB, ARGON2_PARALLELISM). It is the preferred hasher when the argon2-cffi
+package is installed (see settings.py): the PBKDF2 hashes are upgraded at the next login of each user, and the Argon2
+hashes are upgraded when the parameters change.
+"""
+
+from django.conf import settings
+from django.contrib.auth.hashers import Argon2PasswordHasher
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    time_cost = getattr(settings, 'ARGON2_TIME_COST', Argon2PasswordHasher.time_cost)
+    memory_cost = getattr(settings, 'ARGON2_MEMORY_COST', Argon2PasswordHasher.memory_cost)
+    parallelism = getattr(settings, 'ARGON2_PARALLELISM', Argon2PasswordHasher.parallelism)
@@ -0,0 +1,93 @@
+"""Coalesced writes of the last login date of the users.
+
+A login records the date in a process-local buffer instead of updating the user row. The buffer is written with one
+bulk UPDATE LAST_LOGIN_FLUSH_INTERVAL seconds after the previous write (by a timer, even if no other login comes),
+when it holds LAST_LOGIN_BUFFER_SIZE users, and when the process exits. So a process killed without exiting loses at
+most the last LAST_LOGIN_FLUSH_INTERVAL seconds of dates. With LAST_LOGIN_FLUSH_INTERVAL = 0, each login writes its
+date at once, as update_last_login() does.
+"""
+
+import atexit
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.utils import timezone
+
+from .models import User
+
+
+class LastLoginBuffer:
+    """Thread-safe buffer of the last login dates, by user id."""
+
+    def __init__(self, flush_interval, max_size):
+        self.flush_interval = flush_interval
+        self.max_size = max_size
+        self._dates = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        # Armed by the first login recorded after a flush.
+        self._timer = None
+
+    def record(self, user):
+        """Record a login of `user` now. The date is set on the object at once, written later."""
+        user.last_login = timezone.now()
+        with self._lock:
+            self._dates[user.pk] = user.last_login
+            remaining = self.flush_interval - (time.monotonic() - self._last_flush)
+            due = len(self._dates) >= self.max_size or remaining <= 0
+            if not due and self._timer is None:
+                self._timer = threading.Timer(remaining, self.flush_on_timer)
+                self._timer.daemon = True
+                self._timer.start()
+        if due:
+            self.flush()
+
+    def flush_on_timer(self):
+        try:
+            self.flush()
+        except DatabaseError:
+            # Best effort, as at exit: the next login arms a new timer.
+            pass
+        finally:
+            # The connection of the timer thread.
+            connections.close_all()
+
+    def flush(self):
+        """Write the buffered dates with one bulk UPDATE. Return the number of users updated."""
+        with self._lock:
+            dates, self._dates = self._dates, {}
+            self._last_flush = time.monotonic()
+            if self._timer is not None:
+                # No-op when called by the timer itself.
+                self._timer.cancel()
+                self._timer = None
+        if not dates:
+            return 0
+
+        # bulk_update() sends no post_save signal: a login changes nothing that the caches depend on.
+        User.objects.bulk_update(
+            [User(pk=user_id, last_login=last_login) for user_id, last_login in dates.items()],
+            ['last_login'],
+            batch_size=500,
+        )
+        return len(dates)
+
+    def __len__(self):
+        return len(self._dates)
+
+
+last_login_buffer = LastLoginBuffer(
+    flush_interval=getattr(settings, 'LAST_LOGIN_FLUSH_INTERVAL', 30),
+    max_size=getattr(settings, 'LAST_LOGIN_BUFFER_SIZE', 500),
+)
+
+
+@atexit.register
+def flush_on_exit():
+    try:
+        last_login_buffer.flush()
+    except DatabaseError:
+        # Best effort: the database may already be gone when the process stops.
+        pass
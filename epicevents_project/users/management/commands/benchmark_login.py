@@ -0,0 +1,94 @@
+"""Measure the login throughput: time of each step of a login (password check, tokens), then logins per second with
+one or several worker processes. Example:
+    python manage.py benchmark_login --logins 500 --workers 4
+"""
+
+import multiprocessing
+import os
+import time
+
+from django.contrib.auth.hashers import get_hasher
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from events.benchmarks import call_view, time_calls
+from users.last_login import last_login_buffer
+from users.models import User
+from users.tokens import RoleRefreshToken
+from users.views import UserLoginView
+
+BENCHMARK_DOMAIN = '@bench.example'
+PASSWORD = 'bench-password-1234'
+
+
+def login(username):
+    response = call_view(UserLoginView.as_view(), None, '/login/', method='post', data={
+        'username': username, 'password': PASSWORD,
+    })
+    assert response.status_code == 200, response.data
+
+
+def run_logins(usernames):
+    """Log in each user in turn, return the elapsed time in seconds."""
+    start = time.perf_counter()
+    for username in usernames:
+        login(username)
+    elapsed = time.perf_counter() - start
+    last_login_buffer.flush()
+    return elapsed
+
+
+class Command(BaseCommand):
+    help = 'Time the steps of a login and measure the logins per second per core.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20, help='Number of benchmark users.')
+        parser.add_argument('--logins', type=int, default=200, help='Number of logins, over all the workers.')
+        parser.add_argument('--workers', type=int, default=1, help='Number of worker processes.')
+        parser.add_argument('--repeat', type=int, default=20, help='Number of calls to time each step.')
+
+    def handle(self, *args, **options):
+        users = self.get_users(options['users'])
+        user = users[0]
+        self.stdout.write(f'Password hasher: {get_hasher().algorithm} ({user.password.split("$", 2)[1]})')
+
+        steps = [
+            ('check password', lambda: user.check_password(PASSWORD)),
+            ('issue tokens', lambda: str(RoleRefreshToken.for_user(user).access_token)),
+            ('login view', lambda: login(user.username)),
+        ]
+        self.stdout.write(f'{"step":<20} {"median ms":>10} {"p95 ms":>10}')
+        for name, func in steps:
+            stats = time_calls(func, options['repeat'])
+            self.stdout.write(f'{name:<20} {stats["median"]:>10.1f} {stats["p95"]:>10.1f}')
+
+        workers = options['workers']
+        usernames = [users[index % len(users)].username for index in range(options['logins'])]
+        chunks = [usernames[index::workers] for index in range(workers)]
+        start = time.perf_counter()
+        if workers == 1:
+            run_logins(chunks[0])
+        else:
+            # The children must not share the connections of the parent.
+            connections.close_all()
+            with multiprocessing.get_context('fork').Pool(workers) as pool:
+                pool.map(run_logins, chunks)
+        elapsed = time.perf_counter() - start
+
+        rate = len(usernames) / elapsed
+        cores = min(workers, os.cpu_count() or 1)
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(usernames)} logins in {elapsed:.2f}s with {workers} worker(s): {rate:.1f} logins/s, '
+            f'{rate / cores:.1f} logins/s per core'
+        ))
+
+    @staticmethod
+    def get_users(count):
+        """Create the missing benchmark users, hashed with the preferred hasher. Return them."""
+        users = list(User.objects.filter(username__startswith='bench_login_').order_by('pk')[:count])
+        for index in range(len(users), count):
+            username = f'bench_login_{index}'
+            users.append(User.objects.create_user(
+                username, username + BENCHMARK_DOMAIN, 'Bench', 'Login', PASSWORD,
+            ))
+        return users
@@ -0,0 +1,41 @@
+"""Delete the expired refresh tokens from the outstanding and blacklisted token tables, by batches.
+
+A token expires REFRESH_TOKEN_LIFETIME after its creation: the tokens created before that (also the ones whose expiry
+date was set with a longer lifetime) are deleted. To run periodically, e.g. every hour from cron:
+    python manage.py prune_tokens
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+from rest_framework_simplejwt.utils import aware_utcnow
+
+
+class Command(BaseCommand):
+    help = 'Delete the expired outstanding and blacklisted refresh tokens.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='Number of tokens deleted per query.')
+
+    def handle(self, *args, **options):
+        now = aware_utcnow()
+        expired = OutstandingToken.objects.filter(
+            Q(expires_at__lte=now) | Q(created_at__lte=now - api_settings.REFRESH_TOKEN_LIFETIME)
+        )
+
+        start = time.perf_counter()
+        count = 0
+        while True:
+            # Short transactions: the blacklisted tokens go with their outstanding token (on delete cascade).
+            ids = list(expired.values_list('id', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            OutstandingToken.objects.filter(id__in=ids).delete()
+            count += len(ids)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{count} expired tokens deleted in {time.perf_counter() - start:.1f}s.'
+        ))
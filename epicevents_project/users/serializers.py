@@ -1,15 +1,20 @@
 """Serializers for user model in users app."""
 
 from django.contrib.auth import authenticate
-from django.contrib.auth.models import update_last_login
 
 from rest_framework import serializers
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
 
+from epicevents_project.instrumentation import InstrumentedSerializerMixin
+
+from .last_login import last_login_buffer
 from .models import User
+from .tokens import RoleRefreshToken, set_role_claims
 
 
-class UserLoginSerializer(serializers.Serializer):
+class UserLoginSerializer(InstrumentedSerializerMixin, serializers.Serializer):
     """Serializer is used for login step."""
 
     username = serializers.CharField()
@@ -26,11 +31,11 @@ class UserLoginSerializer(serializers.Serializer):
             raise serializers.ValidationError("Invalid login credentials")
 
         try:
-            refresh = RefreshToken.for_user(user)
+            refresh = RoleRefreshToken.for_user(user)
             refresh_token = str(refresh)
             access_token = str(refresh.access_token)
 
-            update_last_login(None, user)
+            last_login_buffer.record(user)
 
             validation = {
                 'access': access_token,
@@ -41,3 +46,39 @@ class UserLoginSerializer(serializers.Serializer):
             return validation
         except User.DoesNotExist:
             raise serializers.ValidationError("Invalid login credentials")
+
+
+class RoleTokenObtainPairSerializer(InstrumentedSerializerMixin, TokenObtainPairSerializer):
+    """Serializer of /token/obtain/: the tokens carry the roles of the user."""
+
+    @classmethod
+    def get_token(cls, user):
+        return RoleRefreshToken.for_user(user)
+
+
+class RoleTokenRefreshSerializer(InstrumentedSerializerMixin, TokenRefreshSerializer):
+    """Serializer of /token/refresh/: the roles of the user are read again for the new tokens."""
+
+    def validate(self, attrs):
+        refresh = RoleRefreshToken(attrs['refresh'])
+
+        user = User.objects.filter(pk=refresh[api_settings.USER_ID_CLAIM], is_active=True).first()
+        if user is None or not set_role_claims(refresh, user):
+            raise InvalidToken('User not found or inactive')
+
+        data = {'access': str(refresh.access_token)}
+
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                try:
+                    # Attempt to blacklist the given refresh token (the blacklist app may not be installed).
+                    refresh.blacklist()
+                except AttributeError:
+                    pass
+
+            refresh.set_jti()
+            refresh.set_exp()
+
+            data['refresh'] = str(refresh)
+
+        return data
@@ -1,3 +1,200 @@
-from django.test import TestCase
+import importlib.util
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import skipUnless
 
-# Create your tests here.
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group
+from django.core.management import call_command
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from events.user_role import forget_user_roles
+from .authentication import LazyTokenUser
+from .last_login import LastLoginBuffer, last_login_buffer
+from .models import User
+from .token_blacklist import blacklist_cache
+
+
+class RoleTokenTests(APITestCase):
+    """Access tokens carrying the roles of the user."""
+
+    def setUp(self):
+        forget_user_roles()
+        self.user = User.objects.create_user('seller', 'seller@epicevents.com', 'seller', 'seller', 'password')
+        self.user.groups.add(Group.objects.get(name='Sellers'))
+
+    def login(self):
+        response = self.client.post('/login/', {'username': 'seller', 'password': 'password'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def get_clients(self, access):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/clients/')
+        return response, context.captured_queries
+
+    def test_no_user_query(self):
+        access = self.login()['access']
+        response, queries = self.get_clients(access)
+        self.assertEqual(response.status_code, 200)
+        # Only the list of the clients: no query for the user nor for his groups.
+        self.assertEqual(len(queries), 1)
+        self.assertIsInstance(response.wsgi_request.user, LazyTokenUser)
+
+    def test_token_obtain(self):
+        response = self.client.post('/token/obtain/', {'username': 'seller', 'password': 'password'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get_clients(response.data['access'])[0].status_code, 200)
+
+    def test_roles_change_rejects_token(self):
+        tokens = self.login()
+        self.user.groups.add(Group.objects.get(name='Managers'))
+        self.assertEqual(self.get_clients(tokens['access'])[0].status_code, 401)
+
+        self.client.credentials()
+        response = self.client.post('/token/refresh/', {'refresh': tokens['refresh']}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get_clients(response.data['access'])[0].status_code, 200)
+
+    def test_inactive_user(self):
+        tokens = self.login()
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.get_clients(tokens['access'])[0].status_code, 401)
+
+        self.client.credentials()
+        response = self.client.post('/token/refresh/', {'refresh': tokens['refresh']}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_token_without_roles(self):
+        access = str(RefreshToken.for_user(self.user).access_token)
+        response, _ = self.get_clients(access)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsInstance(response.wsgi_request.user, User)
+
+    def test_lazy_user(self):
+        self.login()
+        response = self.client.post('/token/obtain/', {'username': 'seller', 'password': 'password'}, format='json')
+        self.get_clients(response.data['access'])
+        user = LazyTokenUser(RefreshToken(response.data['refresh']))
+        self.assertEqual(user, self.user)
+        self.assertEqual(self.user, user)
+        with self.assertNumQueries(1):
+            self.assertEqual(user.email, 'seller@epicevents.com')
+            self.assertEqual(user.last_name, 'seller')
+
+
+class LastLoginTests(APITestCase):
+    """Coalesced writes of the last login dates."""
+
+    def setUp(self):
+        self.users = [
+            User.objects.create_user(f'user{index}', f'user{index}@epicevents.com', 'first', 'last', 'password')
+            for index in range(3)
+        ]
+        self.buffer = LastLoginBuffer(flush_interval=3600, max_size=3)
+
+    def test_coalesced_writes(self):
+        with self.assertNumQueries(0):
+            self.buffer.record(self.users[0])
+            self.buffer.record(self.users[1])
+            self.buffer.record(self.users[0])
+        self.assertIsNotNone(self.users[0].last_login)
+        self.assertFalse(User.objects.filter(last_login__isnull=False).exists())
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(User.objects.get(pk=self.users[0].pk).last_login, self.users[0].last_login)
+
+    def test_flush_when_full(self):
+        for user in self.users:
+            self.buffer.record(user)
+        self.assertEqual(len(self.buffer), 0)
+        self.assertEqual(User.objects.filter(last_login__isnull=False).count(), 3)
+
+    def test_login_records_last_login(self):
+        response = self.client.post('/login/', {'username': 'user0', 'password': 'password'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        last_login_buffer.flush()
+        self.assertIsNotNone(User.objects.get(pk=self.users[0].pk).last_login)
+
+
+class LastLoginTimerTests(TransactionTestCase):
+    """The buffer is written by its timer, without other login."""
+
+    serialized_rollback = True
+
+    def test_idle_buffer_flushed(self):
+        user = User.objects.create_user('user', 'user@epicevents.com', 'first', 'last', 'password')
+        buffer = LastLoginBuffer(flush_interval=0.2, max_size=10)
+        buffer.record(user)
+        self.assertEqual(len(buffer), 1)
+
+        deadline = time.monotonic() + 5
+        while User.objects.get(pk=user.pk).last_login is None and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(User.objects.get(pk=user.pk).last_login, user.last_login)
+        self.assertEqual(len(buffer), 0)
+
+
+@skipUnless(importlib.util.find_spec('argon2'), 'argon2-cffi is not installed')
+class TunedArgon2Tests(APITestCase):
+
+    @override_settings(PASSWORD_HASHERS=[
+        'users.hashers.TunedArgon2PasswordHasher', 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    ])
+    def test_pbkdf2_hash_upgraded_at_login(self):
+        user = User.objects.create_user('user', 'user@epicevents.com', 'first', 'last', 'password')
+        user.password = make_password('password', hasher='pbkdf2_sha256')
+        user.save()
+
+        response = self.client.post('/login/', {'username': 'user', 'password': 'password'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(User.objects.get(pk=user.pk).password.startswith('argon2'))
+
+
+class TokenBlacklistTests(APITestCase):
+    """Blacklist of the rotated refresh tokens."""
+
+    def setUp(self):
+        blacklist_cache.clear()
+        User.objects.create_user('user', 'user@epicevents.com', 'first', 'last', 'password')
+
+    def refresh(self, refresh):
+        return self.client.post('/token/refresh/', {'refresh': refresh}, format='json')
+
+    def test_rotated_token_rejected(self):
+        login = self.client.post('/login/', {'username': 'user', 'password': 'password'}, format='json')
+        refresh = login.data['refresh']
+        response = self.refresh(refresh)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.refresh(response.data['refresh']).status_code, 200)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.refresh(refresh).status_code, 401)
+
+        # Blacklisted by another process: found in the database, then remembered.
+        blacklist_cache.clear()
+        self.assertEqual(self.refresh(refresh).status_code, 401)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.refresh(refresh).status_code, 401)
+
+    def test_prune_tokens(self):
+        self.client.post('/login/', {'username': 'user', 'password': 'password'}, format='json')
+        self.client.post('/login/', {'username': 'user', 'password': 'password'}, format='json')
+        expired = OutstandingToken.objects.order_by('pk').first()
+        expired.expires_at = timezone.now() - timedelta(seconds=1)
+        expired.save()
+        BlacklistedToken.objects.create(token=expired)
+
+        call_command('prune_tokens', stdout=StringIO())
+        self.assertEqual(OutstandingToken.objects.count(), 1)
+        self.assertFalse(BlacklistedToken.objects.exists())
@@ -0,0 +1,48 @@
+"""Process-local cache of the blacklisted refresh tokens (see RoleRefreshToken in tokens.py).
+
+A refresh token is blacklisted once rotated (BLACKLIST_AFTER_ROTATION), for good, so the JTIs known to be blacklisted
+can be kept in memory until the token expires: a replayed token is rejected without any query. A JTI which is not in
+the cache is still looked up in the database, since another process may have blacklisted it. The tables stay small
+with the "prune_tokens" management command.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+class BlacklistCache:
+    """Thread-safe LRU set of JTIs, each one kept until the expiry time of its token."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._expiries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, jti, expires_at):
+        """Remember that the token `jti`, valid until the timestamp `expires_at`, is blacklisted."""
+        with self._lock:
+            self._expiries[jti] = expires_at
+            self._expiries.move_to_end(jti)
+            while len(self._expiries) > self.maxsize:
+                self._expiries.popitem(last=False)
+
+    def __contains__(self, jti):
+        with self._lock:
+            expires_at = self._expiries.get(jti)
+            if expires_at is None:
+                return False
+            if expires_at < time.time():
+                del self._expiries[jti]
+                return False
+            self._expiries.move_to_end(jti)
+            return True
+
+    def clear(self):
+        with self._lock:
+            self._expiries.clear()
+
+
+blacklist_cache = BlacklistCache(maxsize=getattr(settings, 'TOKEN_BLACKLIST_CACHE_SIZE', 10000))
@@ -0,0 +1,57 @@
+"""JWT tokens carrying the roles of the user, so that an API call needs no query to know who is calling.
+
+Claims added to the refresh token, and copied to its access tokens:
+- username, is_superuser, roles (the names of the groups of the user),
+- roles_version: a fingerprint of these roles, checked by the authentication (see authentication.py).
+
+The blacklisted refresh tokens are also remembered in memory (see token_blacklist.py).
+"""
+
+from django.conf import settings
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from events.user_role import get_roles_fingerprint, load_membership
+from .token_blacklist import blacklist_cache
+
+
+def set_role_claims(token, user):
+    """Write the current roles of `user` in the claims of `token`. Return False if the user no longer exists."""
+    membership = load_membership(user.pk)
+    if membership is None:
+        return False
+
+    roles, is_superuser, is_active = membership
+    token['username'] = user.username
+    token['is_superuser'] = is_superuser
+    token['roles'] = sorted(roles)
+    token['roles_version'] = get_roles_fingerprint(roles, is_superuser, is_active)
+    return True
+
+
+class RoleRefreshToken(RefreshToken):
+    """Refresh token whose access tokens carry the roles of the user."""
+
+    @classmethod
+    def for_user(cls, user):
+        token = super(RoleRefreshToken, cls).for_user(user)
+        set_role_claims(token, user)
+        return token
+
+    if 'rest_framework_simplejwt.token_blacklist' in settings.INSTALLED_APPS:
+        def check_blacklist(self):
+            """Reject at once a token known to be blacklisted, else look it up in the database."""
+            jti = self.payload[api_settings.JTI_CLAIM]
+            if jti in blacklist_cache:
+                raise TokenError('Token is blacklisted')
+            try:
+                super(RoleRefreshToken, self).check_blacklist()
+            except TokenError:
+                blacklist_cache.add(jti, self.payload['exp'])
+                raise
+
+        def blacklist(self):
+            result = super(RoleRefreshToken, self).blacklist()
+            blacklist_cache.add(self.payload[api_settings.JTI_CLAIM], self.payload['exp'])
+            return result
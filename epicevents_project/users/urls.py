@@ -7,6 +7,7 @@ from rest_auth.views import (
     PasswordResetView, PasswordResetConfirmView
 )
 
+from .serializers import RoleTokenObtainPairSerializer, RoleTokenRefreshSerializer
 from .views import (
     UserLoginView
 )
@@ -15,7 +16,9 @@ app_name = "users"
 
 
 urlpatterns = [
-    path('token/obtain/', jwt_views.TokenObtainPairView.as_view(), name='token_create'),
-    path('token/refresh/', jwt_views.TokenRefreshView.as_view(), name='token_refresh'),
+    path('token/obtain/', jwt_views.TokenObtainPairView.as_view(serializer_class=RoleTokenObtainPairSerializer),
+         name='token_create'),
+    path('token/refresh/', jwt_views.TokenRefreshView.as_view(serializer_class=RoleTokenRefreshSerializer),
+         name='token_refresh'),
     path('login/', UserLoginView.as_view(), name='login'),
 ]
@@ -6,12 +6,14 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
 
+from epicevents_project.instrumentation import InstrumentedViewMixin
+
 from .serializers import (
     UserLoginSerializer,
 )
 
 
-class UserLoginView(GenericAPIView):
+class UserLoginView(InstrumentedViewMixin, GenericAPIView):
     """Views for login process."""
 
     serializer_class = UserLoginSerializer